@@ -0,0 +1,213 @@
+/*
+ * Stand-alone experiments for design of emitted C code for lists of tuples,
+ * comparing the memory layouts that the C emitter can lower them to:
+ * - AoS linked list : tuple_0_t structs, linked through their next pointer
+ * - AoS array       : tuple_0_t structs, stored contiguously
+ * - SoA             : one array per element of the tuples ("columns")
+ * the lists are scanned by matchers that only read elem_0.
+ * build with e.g. make APP=layouts OPT=3
+ * author: Christophe VG
+ */
+
+#include <stdlib.h>
+#include <stdio.h>
+#include <stdint.h>
+#include <assert.h>
+#include <time.h>
+
+#include "bool.h"
+
+typedef struct tuple_0_t {
+  int elem_0;
+  uint8_t* elem_1;
+  struct tuple_0_t* next;       // only used by the linked list
+} tuple_0_t;
+
+// AoS linked list
+
+void list_of_tuple_0_ts_push(tuple_0_t** list, int elem_0, uint8_t* elem_1) {
+  tuple_0_t* item = malloc(sizeof(tuple_0_t));
+  item->elem_0 = elem_0;
+  item->elem_1 = elem_1;
+  item->next   = *list;
+  *list        = item;
+}
+
+bool list_of_tuple_0_ts_contains_match_gt_value(tuple_0_t* iter, int value) {
+  while(iter != NULL) {
+    if(iter->elem_0 > value) { return TRUE; }
+    iter = iter->next;
+  }
+  return FALSE;
+}
+
+int list_of_tuple_0_ts_remove_match_eq_value(tuple_0_t** list, int value) {
+  int removed = 0;
+  tuple_0_t* iter = *list;
+  tuple_0_t* prev = NULL;
+  while(iter != NULL) {
+    tuple_0_t* next = iter->next;
+    if(iter->elem_0 == value) {
+      if(prev == NULL) { *list = next; } else { prev->next = next; }
+      free(iter);
+      removed++;
+    } else {
+      prev = iter;
+    }
+    iter = next;
+  }
+  return removed;
+}
+
+// AoS array
+
+typedef struct tuple_0_array_t {
+  tuple_0_t* data;
+  int size;
+  int capacity;
+} tuple_0_array_t;
+
+void array_of_tuple_0_ts_push(tuple_0_array_t* list, int elem_0, uint8_t* elem_1) {
+  if(list->size == list->capacity) {
+    list->capacity = list->capacity * 2 + 4;
+    list->data = realloc(list->data, list->capacity * sizeof(tuple_0_t));
+  }
+  tuple_0_t* item = &list->data[list->size];
+  item->elem_0 = elem_0;
+  item->elem_1 = elem_1;
+  list->size++;
+}
+
+bool array_of_tuple_0_ts_contains_match_gt_value(tuple_0_array_t* list, int value) {
+  for(int index = 0; index < list->size; index++) {
+    tuple_0_t* iter = &list->data[index];
+    if(iter->elem_0 > value) { return TRUE; }
+  }
+  return FALSE;
+}
+
+int array_of_tuple_0_ts_remove_match_eq_value(tuple_0_array_t* list, int value) {
+  int removed = 0;
+  int kept    = 0;
+  for(int index = 0; index < list->size; index++) {
+    tuple_0_t* iter = &list->data[index];
+    if(iter->elem_0 == value) {
+      removed++;
+    } else {
+      list->data[kept] = *iter;
+      kept++;
+    }
+  }
+  list->size = kept;
+  return removed;
+}
+
+// SoA
+
+typedef struct tuple_0_soa_t {
+  int* elem_0;
+  uint8_t** elem_1;
+  int size;
+  int capacity;
+} tuple_0_soa_t;
+
+void columns_of_tuple_0_ts_push(tuple_0_soa_t* list, int elem_0, uint8_t* elem_1) {
+  if(list->size == list->capacity) {
+    list->capacity = list->capacity * 2 + 4;
+    list->elem_0 = realloc(list->elem_0, list->capacity * sizeof(*list->elem_0));
+    list->elem_1 = realloc(list->elem_1, list->capacity * sizeof(*list->elem_1));
+  }
+  list->elem_0[list->size] = elem_0;
+  list->elem_1[list->size] = elem_1;
+  list->size++;
+}
+
+bool columns_of_tuple_0_ts_contains_match_gt_value(tuple_0_soa_t* list, int value) {
+  int* elem_0 = list->elem_0;   // only the column that is read is loaded
+  for(int index = 0; index < list->size; index++) {
+    if(elem_0[index] > value) { return TRUE; }
+  }
+  return FALSE;
+}
+
+int columns_of_tuple_0_ts_remove_match_eq_value(tuple_0_soa_t* list, int value) {
+  int* elem_0 = list->elem_0;
+  int removed = 0;
+  int kept    = 0;
+  for(int index = 0; index < list->size; index++) {
+    if(elem_0[index] == value) {
+      removed++;
+    } else {
+      list->elem_0[kept] = list->elem_0[index];
+      list->elem_1[kept] = list->elem_1[index];
+      kept++;
+    }
+  }
+  list->size = kept;
+  return removed;
+}
+
+#define occurences 1000
+#define iterations 3
+#define loops      100000
+
+// the result of every scan is accumulated, to keep the compiler from
+// optimizing the scans away
+volatile int found = 0;
+
+#define measure(label, scan)                                                   \
+  tic = clock();                                                               \
+  for(i=0;i<loops;i++) { found += scan; }                                      \
+  toc = clock();                                                               \
+  printf(label ": %f seconds\n", (double)(toc - tic) / CLOCKS_PER_SEC);
+
+int main(void) {
+  tuple_0_t*      linked  = NULL;
+  tuple_0_array_t array   = { NULL, 0, 0 };
+  tuple_0_soa_t   columns = { NULL, NULL, 0, 0 };
+  uint8_t         payload[4] = { 123, 124, 125, '\0' };
+
+  int c;
+  for(c=0; c<occurences; c++) {
+    list_of_tuple_0_ts_push(&linked, c % 100, payload);
+    array_of_tuple_0_ts_push(&array, c % 100, payload);
+    columns_of_tuple_0_ts_push(&columns, c % 100, payload);
+  }
+
+  // all layouts agree
+  assert(list_of_tuple_0_ts_contains_match_gt_value(linked, 98));
+  assert(array_of_tuple_0_ts_contains_match_gt_value(&array, 98));
+  assert(columns_of_tuple_0_ts_contains_match_gt_value(&columns, 98));
+  assert(list_of_tuple_0_ts_contains_match_gt_value(linked, 99) == FALSE);
+  assert(array_of_tuple_0_ts_contains_match_gt_value(&array, 99) == FALSE);
+  assert(columns_of_tuple_0_ts_contains_match_gt_value(&columns, 99) == FALSE);
+
+  // measure time of full scans (no match) of the different layouts
+  int  l;
+  long i;
+  clock_t tic, toc;
+
+  printf("performing %d iterations of %d scans of %d tuples\n",
+         iterations, loops, occurences);
+
+  for(l=0; l<iterations; l++) {
+    printf("iteration %d:\n", l);
+    measure("AoS linked list",
+            list_of_tuple_0_ts_contains_match_gt_value(linked, 99));
+    measure("AoS array      ",
+            array_of_tuple_0_ts_contains_match_gt_value(&array, 99));
+    measure("SoA            ",
+            columns_of_tuple_0_ts_contains_match_gt_value(&columns, 99));
+    printf("\n");
+  }
+
+  // removal compacts arrays and keeps the order of the remaining tuples
+  assert(list_of_tuple_0_ts_remove_match_eq_value(&linked, 5) == occurences / 100);
+  assert(array_of_tuple_0_ts_remove_match_eq_value(&array, 5) == occurences / 100);
+  assert(columns_of_tuple_0_ts_remove_match_eq_value(&columns, 5) == occurences / 100);
+  assert(array.size   == occurences - occurences / 100);
+  assert(columns.size == occurences - occurences / 100);
+  assert(array.data[5].elem_0 == 6 && columns.elem_0[5] == 6);
+
+  return EXIT_SUCCESS;
+}
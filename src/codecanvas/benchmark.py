@@ -0,0 +1,328 @@
+# benchmark.py
+# micro-benchmarks of the C code that is emitted for lists of tuples
+# author: Christophe VG
+
+# usage: python -m codecanvas.benchmark [--baseline file.json] [--update] ...
+#
+# For every case in a matrix of tuple shapes, list sizes, matchers, layouts and
+# optimization levels, a unit with a list and functions to push, find, remove
+# and clear tuples is emitted, wrapped in a timing harness, compiled with the
+# local gcc and run. Results are reported in nanoseconds per operation and can
+# be compared against, or recorded to, a JSON baseline.
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import argparse
+import subprocess
+
+from codecanvas.structure import Unit, Module
+
+import codecanvas.instructions as code
+import codecanvas.languages.C  as C
+
+TYPES = {
+  "byte": code.ByteType,
+  "int" : code.IntegerType,
+  "long": code.LongType
+}
+
+# the matrix: the first element of every shape is the key that is matched
+SHAPES    = [ ("int", "int"),
+              ("int", "byte", "byte", "byte"),
+              ("int", "long", "long", "long", "long") ]
+SIZES     = [ 16, 256, 4096 ]
+OPERATORS = [ "==", "<", ">" ]
+LAYOUTS   = [ "linked", "array", "columns", "hashed", "sorted" ]
+LEVELS    = [ "0", "s", "3" ]
+
+# per operator: the key of the tuple that is pushed and removed again, and the
+# target that matches it, but none of the keys (0..SIZE-1) filling the list
+TARGETS = {
+  "==": ("-1",   "-1"      ),
+  "<" : ("-1",   "0"       ),
+  ">" : ("SIZE", "SIZE - 1")
+}
+
+METRICS = [ "fill", "contains", "update" ]
+
+class Platform(C.Generic):
+  def __init__(self, layout="linked"):
+    super(Platform, self).__init__()
+    self.lists   = layout if layout in [ "linked", "array", "columns" ] \
+                          else "linked"
+    self.hashing = layout == "hashed"
+    self.sorting = layout == "sorted"
+
+# stand-ins for the foo-lib headers that emitted code includes
+STUBS = {
+  "time.h"   : "#include <stdint.h>\n"   + \
+               "typedef uint8_t bool;\n" + \
+               "#define TRUE  1\n"       + \
+               "#define FALSE 0\n"       + \
+               "int target(void);\n",
+  "payload.h": ""
+}
+
+HARNESS = """
+#include <stdio.h>
+#include <stdlib.h>
+#include <time.h>
+
+#include "bench.h"
+
+#define SIZE    %(size)d
+#define MINIMUM %(minimum)f
+
+int key = 0;
+int target(void) { return key; }
+
+// repeats an operation in growing batches, until it ran for at least MINIMUM
+// seconds, and reports the time per operation in nanoseconds
+#define measure(label, operation, count)                                       \\
+  {                                                                            \\
+    long runs = 0, batch = 1, run;                                             \\
+    double spent;                                                              \\
+    clock_t start = clock();                                                   \\
+    do {                                                                       \\
+      for(run=0; run<batch; run++) { operation; }                              \\
+      runs += batch;                                                           \\
+      batch *= 2;                                                              \\
+      spent = (double)(clock() - start) / CLOCKS_PER_SEC;                      \\
+    } while(spent < MINIMUM);                                                  \\
+    printf("%%s\\"%%s\\": %%f", first ? "" : ", ", label,                        \\
+           spent * 1e9 / ((double)runs * count));                             \\
+    first = 0;                                                                 \\
+  }
+
+void fill(void) {
+  int index;
+  for(index=0; index<SIZE; index++) { bench_push((index * 7919) %% SIZE); }
+}
+
+void fail(const char* message) {
+  fprintf(stderr, "%%s\\n", message);
+  exit(EXIT_FAILURE);
+}
+
+int main(void) {
+  int first = 1;
+  printf("{");
+  measure("fill", fill(); bench_clear(), SIZE);
+  fill();
+  key = %(target)s;
+  measure("contains", if(bench_contains()) { fail("unexpected match"); }, 1);
+  measure("update",
+          key = %(key)s;
+          bench_push(key);
+          key = %(target)s;
+          if(bench_remove() != 1) { fail("unexpected removal"); },
+          1);
+  printf("}\\n");
+  bench_clear();
+  return EXIT_SUCCESS;
+}
+"""
+
+class Case(object):
+  """
+  A single benchmark: a list of tuples of a shape, filled with size tuples,
+  matched on its first element using operator, lowered to a layout and
+  compiled at an optimization level.
+  """
+  def __init__(self, shape, size, operator, layout, level):
+    self.shape    = tuple(shape)
+    self.size     = size
+    self.operator = operator
+    self.layout   = layout
+    self.level    = level
+
+  def __str__(self):
+    return "/".join([ ",".join(self.shape), str(self.size), self.operator,
+                      self.layout, "-O" + self.level ])
+
+  def supported(self):
+    """
+    Hash tables only support equality, sorted lists only ranges.
+    """
+    if self.layout == "hashed": return self.operator == "=="
+    if self.layout == "sorted": return self.operator != "=="
+    return True
+
+  def platform(self):
+    return Platform(self.layout)
+
+  def unit(self):
+    """
+    Returns a unit with a bench module, containing a list and the functions
+    that manipulate it: bench_push(key), bench_contains(), bench_remove() and
+    bench_clear().
+    """
+    unit = Unit()
+    unit.append(Module("includes"))
+    module = unit.append(Module("bench"))
+    module.select("dec").append(code.Import("includes")).tag("requires-tuples")
+    type = code.ManyType(code.TupleType([ TYPES[name]() for name in self.shape ]))
+    module.select("dec").append(code.VariableDecl("list", type))
+    list = code.Object("list", type)
+
+    def matchers():
+      matcher = code.Match(self.operator,
+                           code.FunctionCall("target", type=code.IntegerType()))
+      return code.ListLiteral().contains(
+        matcher, *[ code.Match("*") for name in self.shape[1:] ]
+      )
+
+    def function(name, body, type=None, params=[]):
+      module.select("dec").append(
+        code.Function(name, type=type, params=params)
+      ).contains(body)
+
+    function("bench_push",
+      code.MethodCall(list, "push", [ code.ListLiteral().contains(
+        *[ code.SimpleVariable("key") for name in self.shape ]
+      ) ]),
+      params=[code.Parameter("key", code.IntegerType())]
+    )
+    function("bench_contains",
+      code.Return(code.MethodCall(list, "contains", [matchers()],
+                                  type=code.BooleanType())),
+      type=code.BooleanType()
+    )
+    function("bench_remove",
+      code.Return(code.MethodCall(list, "remove", [matchers()],
+                                  type=code.IntegerType())),
+      type=code.IntegerType()
+    )
+    function("bench_clear", code.MethodCall(list, "clear"))
+    return unit
+
+  def harness(self, minimum=0.05):
+    [key, target] = TARGETS[self.operator]
+    return HARNESS.lstrip() % { "size"   : self.size,
+                                "minimum": minimum,
+                                "key"    : key,
+                                "target" : target }
+
+def cases(shapes=SHAPES, sizes=SIZES, operators=OPERATORS, layouts=LAYOUTS,
+          levels=LEVELS):
+  """
+  Returns all supported cases of the matrix.
+  """
+  all = [ Case(shape, size, operator, layout, level)
+          for shape    in shapes
+          for size     in sizes
+          for operator in operators
+          for layout   in layouts
+          for level    in levels ]
+  return [ case for case in all if case.supported() ]
+
+class Runner(object):
+  """
+  Emits, compiles and runs cases, in a temporary directory per case.
+  """
+  def __init__(self, compiler="gcc", minimum=0.05, keep=False):
+    self.compiler = compiler
+    self.minimum  = minimum
+    self.keep     = keep
+
+  def build(self, case, directory):
+    C.Emitter(platform=case.platform()).output_to(directory).emit(case.unit())
+    os.makedirs(os.path.join(directory, "foo-lib"))
+    for name, content in STUBS.items():
+      self.write(os.path.join(directory, "foo-lib", name), content)
+    self.write(os.path.join(directory, "harness.c"), case.harness(self.minimum))
+    sources = sorted([ name for name in os.listdir(directory)
+                            if name.endswith(".c") ])
+    subprocess.check_output(
+      [ self.compiler, "-std=gnu99", "-O" + case.level, "-o", "bench" ] + sources,
+      cwd=directory, stderr=subprocess.STDOUT
+    )
+    return os.path.join(directory, "bench")
+
+  def write(self, name, content):
+    file = open(name, "w")
+    file.write(content)
+    file.close()
+
+  def run(self, case):
+    """
+    Returns the nanoseconds per operation, for each of the METRICS.
+    """
+    directory = tempfile.mkdtemp(prefix="codecanvas-bench-")
+    try:
+      return json.loads(subprocess.check_output([self.build(case, directory)]))
+    finally:
+      if not self.keep: shutil.rmtree(directory)
+
+def compare(results, baseline, tolerance=0.25):
+  """
+  Returns (case, metric, before, after) for every metric that is more than
+  tolerance slower than in the baseline. Cases that aren't in the baseline are
+  ignored.
+  """
+  regressions = []
+  for case in sorted(results):
+    if not case in baseline: continue
+    for metric in METRICS:
+      if not metric in results[case] or not metric in baseline[case]: continue
+      [before, after] = [ baseline[case][metric], results[case][metric] ]
+      if after > before * (1 + tolerance):
+        regressions.append((case, metric, before, after))
+  return regressions
+
+def load(name):
+  if not os.path.exists(name): return {}
+  file = open(name)
+  try:     return json.load(file)
+  finally: file.close()
+
+def save(results, name):
+  file = open(name, "w")
+  try:     json.dump(results, file, indent=2, sort_keys=True)
+  finally: file.close()
+
+def main(arguments=None):
+  parser = argparse.ArgumentParser(
+    description="benchmark C code that is emitted for lists of tuples"
+  )
+  parser.add_argument("--baseline", help="JSON file with baseline results")
+  parser.add_argument("--update", action="store_true",
+                      help="record the results to the baseline")
+  parser.add_argument("--tolerance", type=float, default=0.25,
+                      help="relative slowdown that is reported as regression")
+  parser.add_argument("--sizes",     type=int, nargs="+", default=SIZES)
+  parser.add_argument("--operators", nargs="+", default=OPERATORS)
+  parser.add_argument("--layouts",   nargs="+", default=LAYOUTS)
+  parser.add_argument("--levels",    nargs="+", default=LEVELS)
+  parser.add_argument("--minimum",   type=float, default=0.05,
+                      help="minimal seconds to measure every operation")
+  parser.add_argument("--compiler",  default="gcc")
+  parser.add_argument("--keep", action="store_true",
+                      help="keep the generated code of every case")
+  args = parser.parse_args(arguments)
+
+  runner  = Runner(args.compiler, args.minimum, args.keep)
+  results = {}
+  for case in cases(sizes=args.sizes, operators=args.operators,
+                    layouts=args.layouts, levels=args.levels):
+    results[str(case)] = runner.run(case)
+    print "%-44s" % str(case) + \
+          "".join([ "%10s %10.1f" % (metric, results[str(case)][metric])
+                    for metric in METRICS ])
+
+  if not args.baseline: return 0
+  if args.update:
+    baseline = load(args.baseline)
+    baseline.update(results)
+    save(baseline, args.baseline)
+    return 0
+  regressions = compare(results, load(args.baseline), args.tolerance)
+  for (case, metric, before, after) in regressions:
+    print "REGRESSION %-44s %-10s %10.1f -> %10.1f" % (case, metric, before, after)
+  return 1 if regressions else 0
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -181,6 +181,10 @@ class Return(Statement):
   def ends(self):
     return True
 
+class Block(Statement):
+  def __init__(self):
+    super(Block, self).__init__({})
+
 @novisiting
 class CondLoop(Statement):
   def __init__(self, condition):
@@ -304,6 +308,12 @@ class ShiftLeft(Expression):
     self.amount = amount
     super(ShiftLeft, self).__init__({"var": var, "amount": amount})
 
+class ShiftRight(Expression):
+  def __init__(self, var, amount):
+    self.var  = var
+    self.amount = amount
+    super(ShiftRight, self).__init__({"var": var, "amount": amount})
+
 @novisiting
 class BinOp(Expression):
   def __init__(self, left, right):
@@ -326,6 +336,8 @@ class Minus(BinOp): pass
 class Mult(BinOp): pass
 class Div(BinOp): pass
 class Modulo(BinOp): pass
+class BitAnd(BinOp): pass
+class BitXor(BinOp): pass
 
 class Call(Expression):
   def __init__(self, info, arguments=[]):
@@ -344,8 +356,16 @@ class FunctionCall(Call):
     super(FunctionCall, self).__init__({"function": function}, arguments)
     self.function  = function
     self.type      = type
+    self.pure      = False
   def as_label(self):
     return self.function.name
+  def mark_pure(self, pure=True):
+    """
+    Marks the call as free of side effects, returning the same value each time
+    it is called with the same arguments (within e.g. a loop).
+    """
+    self.pure = pure
+    return self
 
 class MethodCall(Call):
   def __init__(self, obj, method, arguments=[], type=None):
@@ -475,7 +495,18 @@ class ByteType(Type):
   def __repr__(self): return "byte"
 
 class IntegerType(Type):
-  def __repr__(self): return "int"
+  def __init__(self, range=None):
+    assert range is None or (len(range) == 2 and range[0] <= range[1])
+    super(IntegerType, self).__init__()
+    self.range = range    # (minimum, maximum) of its values, if known
+  def __repr__(self): return "int" + ranged(self.range)
+
+class UnsignedIntegerType(IntegerType):
+  def __repr__(self): return "unsigned int" + ranged(self.range)
+
+def ranged(range):
+  if range is None: return ""
+  return "[" + str(range[0]) + ".." + str(range[1]) + "]"
 
 class BooleanType(Type):
   def __repr__(self): return "bool"
@@ -486,6 +517,9 @@ class FloatType(Type):
 class LongType(Type):
   def __repr__(self): return "long"
 
+class UnsignedLongType(LongType):
+  def __repr__(self): return "unsigned long"
+
 class UnionType(Type):
   def __init__(self, name, properties=[]):
     if isstring(name): name = Identifier(name)
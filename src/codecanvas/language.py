@@ -82,10 +82,12 @@ class Visitor(instructions.Visitor):
   
   def visit_VoidType(self, code): pass
   def visit_IntegerType(self, code): pass
+  def visit_UnsignedIntegerType(self, code): pass
   def visit_ByteType(self, code): pass
   def visit_FloatType(self, code): pass
   def visit_BooleanType(self, code): pass
   def visit_LongType(self, type): pass
+  def visit_UnsignedLongType(self, type): pass
   
   @stacked
   def visit_TupleType(self, code): pass
@@ -106,6 +108,7 @@ class Visitor(instructions.Visitor):
   
   @stacked
   def visit_WhileDo(self, code):
+    code.condition = self.accept(code.condition)
     for index, child in enumerate(code):
       self.child = index
       code.update_child(index, self.accept(child))
@@ -115,7 +118,17 @@ class Visitor(instructions.Visitor):
     for index, child in enumerate(code):
       self.child = index
       code.update_child(index, self.accept(child))
-    
+    code.condition = self.accept(code.condition)
+
+  @stacked
+  def visit_For(self, code):
+    code.init   = self.accept(code.init)
+    code.check  = self.accept(code.check)
+    code.change = self.accept(code.change)
+    for index, child in enumerate(code):
+      self.child = index
+      code.update_child(index, self.accept(child))
+
   # calls
 
   @stacked
@@ -157,6 +170,7 @@ class Visitor(instructions.Visitor):
 
   @stacked
   def visit_CaseStatement(self, case):
+    case.expression = self.accept(case.expression)
     for index, stmt in enumerate(case.cases):
       self.child = index
       case.cases[index] = self.accept(stmt)
@@ -164,9 +178,20 @@ class Visitor(instructions.Visitor):
       for index, stmt in enumerate(consequence):
         self.child = index
         consequence[index] = self.accept(stmt)
+    if isinstance(case.case_else, list):
+      for index, stmt in enumerate(case.case_else):
+        self.child = index
+        case.case_else[index] = self.accept(stmt)
+    elif not case.case_else is None:
+      case.case_else = self.accept(case.case_else)
 
   @stacked
-  def visit_ShiftLeft(self, stmt): pass
+  def visit_ShiftLeft(self, exp):
+    exp.var = self.accept(exp.var)
+
+  @stacked
+  def visit_ShiftRight(self, exp):
+    exp.var = self.accept(exp.var)
 
   @stacked
   def visit_Assign(self, stmt):  self.visit_VarExpOp(stmt)
@@ -275,6 +300,12 @@ class Visitor(instructions.Visitor):
   @stacked
   def visit_Modulo(self, op):    self.visit_BinOp(op)
 
+  @stacked
+  def visit_BitAnd(self, op):    self.visit_BinOp(op)
+
+  @stacked
+  def visit_BitXor(self, op):    self.visit_BinOp(op)
+
   @stacked
   def visit_Plus(self, op):      self.visit_BinOp(op)
 
@@ -300,7 +331,10 @@ class Visitor(instructions.Visitor):
   def visit_Comparator(self, comp): pass
   def visit_Anything(self, comp): pass
 
-  def visit_Return(self, op): pass
+  @stacked
+  def visit_Return(self, op):
+    if not op.expression is None:
+      op.expression = self.accept(op.expression)
   
   def visit_VariableDecl(self, var):
     var.id.accept(self)
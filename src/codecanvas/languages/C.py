@@ -2,15 +2,26 @@
 # language emitter implementation
 # author: Christophe VG
 
+import os
+import re
+import copy
+import zlib
+import threading
+
 from util.visitor  import stacked
 from util.check    import isstring
 
 import codecanvas.language     as language
 import codecanvas.instructions as code
 import codecanvas.structure    as structure
+import codecanvas.passes       as passes
+import codecanvas.rewrite      as rewrite
 
 from codecanvas.platform import Platform
 
+from codecanvas.optimizations.inlining import nodes
+from codecanvas.optimizations.strength import type_of
+
 # a few additional Code classes for C-specific things
 class RefType(code.Type):
   def __init__(self, type):
@@ -31,10 +42,441 @@ class Cast(code.Expression):
     self.to         = to
     self.expression = expression
 
+class AtomConstant(code.Literal):
+  """
+  An atom, referring to its constant in the generated enumeration of atoms.
+  """
+  def __init__(self, name):
+    super(AtomConstant, self).__init__({"name": name})
+    self.name = name
+  def as_label(self): return self.name
+
+class AtomType(code.Type):
+  """
+  The type of atoms, as defined along with their enumeration.
+  """
+  def __repr__(self): return "atom"
+
+class Atoms(code.Statement):
+  """
+  Enumeration of all atoms, along with the type that stores them.
+  """
+  def __init__(self, type):
+    super(Atoms, self).__init__({})
+    self.type  = type
+    self.atoms = []
+
+class Switch(code.Statement):
+  def __init__(self, expression, cases, consequences, default=[]):
+    super(Switch, self).__init__({"expression": expression})
+    self.expression   = expression
+    self.cases        = cases
+    self.consequences = consequences
+    self.default      = default
+
+class Table(code.Statement):
+  """
+  A static, constant lookup array, local to the function that declares it.
+  """
+  def __init__(self, name, type, values):
+    super(Table, self).__init__({"name": name})
+    self.name   = name
+    self.type   = type
+    self.values = values
+
+class ArrayLiteral(code.Literal):
+  """
+  An anonymous, constant array with values, local to its enclosing block.
+  """
+  def __init__(self, type, values):
+    super(ArrayLiteral, self).__init__({})
+    self.type   = type
+    self.values = values
+
+class Statements(code.Statement):
+  """
+  A sequence of statements, replacing a single one during lowering.
+  """
+  def __init__(self, *statements):
+    super(Statements, self).__init__({})
+    self.contains(*statements)
+
+def flatten(statements, parent=None):
+  """
+  Returns a list of statements with the children of Statements in their place.
+  """
+  flat = []
+  for statement in statements:
+    if isinstance(statement, Statements):
+      flat.extend(flatten(statement.children, parent))
+    else:
+      if not parent is None: statement._parent = parent
+      flat.append(statement)
+  return flat
+
+def splice(node):
+  """
+  Replaces all Statements below node by their children, in the enclosing block,
+  clause or case.
+  """
+  if isinstance(node, code.IfStatement):
+    node.true_clause  = flatten(node.true_clause)
+    node.false_clause = flatten(node.false_clause)
+    nested = node.true_clause + node.false_clause
+  elif isinstance(node, Switch):
+    node.consequences = [ flatten(consequence)
+                          for consequence in node.consequences ]
+    node.default      = flatten(node.default)
+    nested = [ statement for consequence in node.consequences
+                         for statement in consequence ] + node.default
+  elif isinstance(node, code.Code):
+    node.sticking["top"]    = flatten(node.sticking["top"],    node)
+    node.floating           = flatten(node.floating,           node)
+    node.sticking["bottom"] = flatten(node.sticking["bottom"], node)
+    nested = list(node)
+  else:
+    return
+  for statement in nested: splice(statement)
+
+def signature(node):
+  """
+  Returns a hashable, structural representation of a node and its descendants,
+  independent of its identity and position in a tree.
+  """
+  if isinstance(node, code.Identifier): return node.name
+  if isinstance(node, code.Code):
+    return (node.__class__.__name__,) + \
+           tuple([ (key, signature(value))
+                   for key, value in sorted(vars(node).items())
+                   if not key in [ "_parent", "data", "tags", "stick_to" ] ])
+  if isinstance(node, list) or isinstance(node, tuple):
+    return tuple([ signature(item) for item in node ])
+  if isinstance(node, dict):
+    return tuple(sorted([ (key, signature(value))
+                          for key, value in node.items() ]))
+  return node
+
+def literal_of(item):
+  """
+  Returns the literal of a case: the case itself, or the expression of an ==
+  match.
+  """
+  if isinstance(item, code.Match) and not wildcard(item) and \
+     item.comp.operator == "==":
+    item = item.expression
+  if isinstance(item, (code.IntegerLiteral, code.ByteLiteral)): return item
+  return None
+
+def clause(statement):
+  """
+  Returns a clause with the statement, or an empty one for no Statements.
+  """
+  if isinstance(statement, Statements) and len(statement) < 1: return []
+  return [ statement ]
+
+def case_value(item):
+  literal = literal_of(item)
+  return None if literal is None else literal.value
+
+LAYOUTS = [ "linked", "array", "columns", "hashed", "sorted" ]
+
+def layout(type, platform):
+  """
+  Returns the layout of a list (ManyType): "linked" for singly linked lists,
+  "array" for growable, contiguous arrays, "columns" for a structure of arrays,
+  with one array per element of its tuples, "hashed" for hash tables or "sorted"
+  for arrays that are sorted on one of their elements. Lists can be tagged with
+  their layout, else the platform's default layout is used.
+  """
+  for tag in LAYOUTS:
+    if tag in type.tags: return tag
+  return platform.lists
+
+def tagged_layout(type):
+  return any([ tag in type.tags for tag in LAYOUTS ])
+
+def list_name(obj):
+  """
+  Returns the name that identifies a list, given the Object or ObjectProperty
+  that refers to it.
+  """
+  if isinstance(obj, code.ObjectProperty): return obj.prop.name
+  return obj.name
+
+def wildcard(matcher):
+  return isinstance(matcher.comp, code.Anything) or matcher.comp.operator == "*"
+
+OWNERSHIPS = [ "borrowed", "owned", "moved" ]
+
+def ownership(node):
+  """
+  Returns the ownership that a Parameter or argument is tagged with: "borrowed"
+  (the default, the value remains owned by the caller), "owned" (a parameter
+  takes ownership of the value) or "moved" (the caller hands the value over).
+  """
+  for tag in OWNERSHIPS:
+    if tag in node.tags: return tag
+  return "borrowed"
+
+def take(param):
+  """
+  Returns the value of a parameter to store: objects are copied, unless the
+  parameter takes ownership of them.
+  """
+  value = code.SimpleVariable(param.name)
+  if isinstance(param.type, code.ObjectType) and ownership(param) != "owned":
+    return code.FunctionCall("copy_" + str(param.type.name), [value],
+                             type=param.type)
+  return value
+
+class Usage(object):
+  """
+  Analysis of the use of lists in a unit. Lists are identified by their name.
+  For every list, the types that declare it are collected, along with the
+  matchers of all queries (contains and remove) on it. Lists that are used in
+  any other way than through their methods are opaque.
+  """
+  queries = [ "contains", "remove" ]
+  updates = [ "push", "clear" ]
+
+  def __init__(self, unit, matchers):
+    self.types   = {}
+    self.matches = {}
+    self.opaque  = set()
+    calls = [ node for node in nodes(unit)
+                   if isinstance(node, code.MethodCall) and \
+                      isinstance(node.obj.type, code.ManyType) ]
+    for call in calls:
+      name = list_name(call.obj)
+      self.declare(name, call.obj.type)
+      if call.method.name in self.queries:
+        self.matches.setdefault(name, []).append(matchers(call)[0])
+      elif not call.method.name in self.updates:
+        self.opaque.add(name)
+    objects = [ call.obj for call in calls ]
+    for node in nodes(unit):
+      if isinstance(node, code.VariableDecl) or \
+         isinstance(node, code.Parameter)    or \
+         isinstance(node, code.Property):
+        if isinstance(node.type, code.ManyType):
+          name = node.name if isstring(node.name) else node.name.name
+          self.declare(name, node.type)
+      elif isinstance(node, code.Object) or \
+           isinstance(node, code.ObjectProperty):
+        if isinstance(node.type, code.ManyType) and \
+           not any([ node is obj for obj in objects ]):
+          self.opaque.add(list_name(node))
+
+  def declare(self, name, type):
+    types = self.types.setdefault(name, [])
+    if not any([ type is known for known in types ]): types.append(type)
+
+  def equalities(self, name):
+    """
+    Returns the positions of the elements that all queries on a list compare for
+    equality, or None if the list isn't only queried for equality on the same
+    elements.
+    """
+    if name in self.opaque or not name in self.matches: return None
+    keys = None
+    for matchers in self.matches[name]:
+      positions = []
+      for index, matcher in enumerate(matchers):
+        if matcher is None or matcher.comp.operator == "==":
+          positions.append(index)
+        elif not wildcard(matcher):
+          return None
+      if keys is None: keys = positions
+      if positions != keys: return None
+    return keys if len(keys) > 0 else None
+
+  RANGES = [ "<", "<=", ">", ">=" ]
+
+  def ranges(self, name):
+    """
+    Returns the position of the element that all queries on a list compare
+    with a range (as a list, like equalities), or None if the list is queried
+    in any other way. Queries that match anything are compatible.
+    """
+    if name in self.opaque or not name in self.matches: return None
+    key = None
+    for matchers in self.matches[name]:
+      positions = [ index for index, matcher in enumerate(matchers)
+                          if matcher is None or not wildcard(matcher) ]
+      if len(positions) == 0: continue
+      if len(positions) > 1 or matchers[positions[0]] is None or \
+         not matchers[positions[0]].comp.operator in self.RANGES: return None
+      if key is None: key = positions[0]
+      if positions[0] != key: return None
+    return None if key is None else [ key ]
+
+def array_of(type_name):
+  """
+  Returns the name of the structured type for arrays of a (named) type.
+  """
+  if type_name.endswith("_t"): type_name = type_name[:-2]
+  return type_name + "_array"
+
+def hash_of(type_name):
+  """
+  Returns the name of the structured type for hash tables of a (named) type.
+  """
+  if type_name.endswith("_t"): type_name = type_name[:-2]
+  return type_name + "_hash"
+
+def columns_of(type_name):
+  """
+  Returns the name of the structured type for columns of a (named) tuple type.
+  """
+  if type_name.endswith("_t"): type_name = type_name[:-2]
+  return type_name + "_soa"
+
+class Context(object):
+  """
+  Registries that are built while lowering units: the names of the structured
+  types that implement tuples, the indices of atoms and the names of the
+  specialized list functions. Access is synchronized, allowing a context to be
+  shared deliberately by Emitters that lower units concurrently, e.g. to keep
+  atom indices consistent across units.
+  """
+  def __init__(self):
+    self.lock = threading.RLock()
+    self.reset()
+
+  def reset(self):
+    with self.lock:
+      self.tuples          = {}
+      self.atoms           = []
+      self.indices         = {}
+      self.specializations = {}
+      self.arities         = {}
+      self.hits            = 0
+      self.misses          = 0
+    return self
+
+  def tuple(self, signature):
+    """
+    Returns the name of the structured type for a tuple with a given signature.
+    """
+    with self.lock:
+      try:
+        return self.tuples[signature]
+      except KeyError:
+        # TODO: create nicer/functional names ;-)
+        name = self.tuples[signature] = "tuple_" + str(len(self.tuples))
+        return name
+
+  def atom(self, name):
+    """
+    Returns the (1-based) index of an atom.
+    """
+    with self.lock:
+      try:
+        return self.indices[name]
+      except KeyError:
+        self.atoms.append(name)
+        index = self.indices[name] = len(self.atoms)
+        return index
+
+  def specialization(self, key, name):
+    """
+    Returns the name of the function that specializes a method for a key, e.g.
+    (element type, method, matcher signature). New specializations get the
+    given name, unless it is already used for another key.
+    """
+    with self.lock:
+      try:
+        return self.specializations[key]
+      except KeyError:
+        used   = set(self.specializations.values())
+        unique = name
+        suffix = len(used)
+        while unique in used:
+          unique  = name + "_" + str(suffix)
+          suffix += 1
+        self.specializations[key] = unique
+        return unique
+
+  def arity(self, function, sizes):
+    """
+    Returns the name of the fixed-arity specialization of a function, for the
+    sizes of its ListLiteral arguments, and records it as being used.
+    """
+    name = "_".join([function] + [ str(size) for size in sizes ])
+    with self.lock:
+      self.arities.setdefault(function, set()).add(name)
+    return name
+
+  def count(self, hit):
+    with self.lock:
+      if hit: self.hits   += 1
+      else:   self.misses += 1
+
+  def report(self):
+    return str(self.misses) + " specialization(s) generated, " + \
+           str(self.hits) + " reused"
+
+class Symbols(object):
+  """
+  Table of the nodes of a unit that are looked up while lowering it: Modules by
+  name, top-level declarations (Functions and StructuredTypes) by name and nodes
+  by tag. It is built with a single walk of the unit and kept up to date by the
+  Transformer as it adds generated modules and declarations.
+  """
+  def __init__(self, unit):
+    self.unit         = unit
+    self.modules      = {}
+    self.declarations = {}
+    self.tags         = {}
+    for module in unit:
+      if isinstance(module, structure.Module): self.add_module(module)
+    self.index(unit)
+
+  def index(self, node):
+    for tag in node.tags:
+      if not tag in self.tags: self.tags[tag] = node
+    for child in node:
+      if isinstance(child, code.Code): self.index(child)
+
+  def add_module(self, module):
+    self.modules[module.name] = module
+    for section in module:
+      for child in section: self.declare(child)
+    return module
+
+  def module(self, name):
+    return self.modules.get(name, None)
+
+  def declare(self, declaration):
+    if isinstance(declaration, code.Prototype): return declaration
+    if isinstance(declaration, code.Function):
+      self.declarations[declaration.name] = declaration
+    elif isinstance(declaration, code.StructuredType):
+      self.declarations[declaration.name.name] = declaration
+    return declaration
+
+  def declared(self, name):
+    return self.declarations.get(name, None)
+
+  def tagged(self, tag):
+    return self.tags.get(tag, None)
+
 class Emitter(object):
-  def __init__(self, platform=None):
-    self.output = None
+  """
+  Emits units using a lowering Context. Without a given context, the Emitter
+  creates its own, which is reset for every unit that is emitted.
+  """
+  def __init__(self, platform=None, context=None):
+    self.output   = None
+    self.unity    = None
+    self.sharding = None
     self.platform = platform
+    self.shared   = not context is None
+    self.context  = context if self.shared else Context()
+    self.passes   = passes.Manager(
+      passes.VisitorPass(lambda: Transformer(self.context, self.platform),
+                         "transform")
+    )
 
   def __str__(self): return "C Emitter"
 
@@ -42,13 +484,43 @@ class Emitter(object):
     self.output = output
     return self
 
+  def amalgamate(self, name="unity", exported=["main"]):
+    """
+    Besides a file per module, also writes a single translation unit with all
+    modules, in which only the exported functions have external linkage.
+    """
+    self.unity = (name, exported)
+    return self
+
+  def shard(self, budget, by="functions"):
+    """
+    Splits the declarations of modules that exceed a budget of functions or
+    lines into multiple files, that can be compiled in parallel.
+    """
+    self.sharding = Sharding(budget, by)
+    return self
+
+  def add_pass(self, *additional):
+    """
+    Adds passes to the pipeline, to be run on the unit before it is dumped.
+    """
+    self.passes.add(*additional)
+    return self
+
   def emit(self, unit):
-    # two phases, two visitations: first to transform the code according to
+    if not self.shared: self.context.reset()
+    # two phases: first the passes, transforming the code according to
     # platform and language "limitations", ...
-    unit.accept(Transformer())
+    unit = self.passes.run(unit)
     # next to dump it to files
-    if self.output: unit.accept(Builder(self.output, platform=self.platform))
-    else:           return unit.accept(Dumper(platform=self.platform))
+    if self.output:
+      unit.accept(Builder(self.output, platform=self.platform,
+                          sharding=self.sharding))
+      if self.unity:
+        [name, exported] = self.unity
+        unit.accept(Amalgamation(self.output, name, exported, self.platform))
+    else:
+      return unit.accept(Dumper(platform=self.platform))
 
 class Null(code.Expression): pass
 
@@ -57,8 +529,98 @@ class Transformer(language.Visitor):
   Visitor for CodeCanvas-based ASTs to add/remove code automagically. Allows
   for transforming constructs that are not supported by C into comparative
   solutions that are.
+  Node-local lowering is expressed using rewrite rules, which are applied to
+  every node, once its children have been transformed.
   """
 
+  lowering = rewrite.Rules()
+
+  def __init__(self, context=None, platform=None):
+    super(Transformer, self).__init__()
+    self.context  = context  if not context  is None else Context()
+    self.platform = platform if not platform is None else Generic()
+    self._symbols = None
+    self.keys     = {}
+    self.cases    = 0
+    self.literals = 0
+
+  def get_symbols(self):
+    if self._symbols is None or not self._symbols.unit is self.stack[0]:
+      self._symbols = Symbols(self.stack[0])
+    return self._symbols
+  symbols = property(get_symbols)
+
+  def visit_Unit(self, unit):
+    """
+    Before lowering, the use of lists is analysed to select specialized layouts.
+    After lowering, Statements are spliced into their enclosing blocks, since
+    other passes only expect single statements in them.
+    """
+    if self.platform.hashing or self.platform.sorting:
+      usage = Usage(unit, self.matchers_of)
+      if self.platform.hashing: self.select(usage, "hashed", usage.equalities,
+                                            self.HASHABLE)
+      if self.platform.sorting: self.select(usage, "sorted", usage.ranges,
+                                            self.ORDERED)
+    super(Transformer, self).visit_Unit(unit)
+    splice(unit)
+    self.import_stdint(unit)
+    self.enumerate_atoms(unit)
+
+  def enumerate_atoms(self, unit):
+    """
+    Once all atoms of the unit are known, they are enumerated in order of their
+    index, which also includes those of other units with a shared Context. Every
+    module that uses them, also the ones with generated functions, imports them.
+    """
+    atoms = Symbols(unit).module("atoms")
+    if atoms is None: return
+    with self.context.lock:
+      atoms.select("def", "atoms").atoms = list(self.context.atoms)
+    for module in unit:
+      if module is atoms: continue
+      if any([ isinstance(node, AtomConstant) for node in nodes(list(module)) ]):
+        module.select("dec").append(code.Import("atoms")).stick_top()
+
+  def import_stdint(self, unit):
+    """
+    Integers with a known range are emitted using stdint types, which requires
+    <stdint.h> in every section that uses them.
+    """
+    for module in unit:
+      for section in module:
+        if any([ isinstance(child, code.Import) and child.imported == "<stdint.h>"
+                 for child in section ]): continue
+        if any([ isinstance(node, code.IntegerType) and not node.range is None
+                 for node in nodes(list(section)) ]):
+          section.append(code.Import("<stdint.h>")).stick_top()
+
+  HASHABLE = (code.ByteType, code.IntegerType, code.LongType, code.BooleanType,
+              code.ObjectType)
+  ORDERED  = (code.ByteType, code.IntegerType, code.LongType, code.FloatType)
+
+  def select(self, usage, layout, keys_of, supported):
+    """
+    Lists of tuples for which the usage analysis finds keys (e.g. elements that
+    are only compared for equality), of supported types, are tagged to be
+    lowered to a specialized layout, unless their layout is explicit.
+    """
+    for name, types in usage.types.items():
+      keys = keys_of(name)
+      if keys is None or any([ tagged_layout(type) for type in types ]): continue
+      if not all([ isinstance(type.type, code.TupleType) and \
+                   all([ key < len(type.type.types) and \
+                         isinstance(type.type.types[key], supported)
+                         for key in keys ])
+                   for type in types ]): continue
+      for type in types: type.tag(layout)
+      self.keys[name] = keys
+
+  def accept(self, target):
+    update  = super(Transformer, self).accept(target)
+    lowered = Transformer.lowering.apply(update, self)
+    return update if lowered is None else lowered
+
   @stacked
   def visit_Print(self, printer):
     """
@@ -70,89 +632,46 @@ class Transformer(language.Visitor):
                           .stick_top() \
                           .tag("import_stdio")
 
-  tuples = {}
-  tuple_index = 0
   @stacked
   def visit_TupleType(self, tuple):
     """
     Tuples are implemented using structured types.
     """
-    try:
-      named_type = Transformer.tuples[repr(tuple)]
-    except:
-      # TODO: create nicer/functional names ;-)
-      name = "tuple_" + str(Transformer.tuple_index)
+    name = self.context.tuple(repr(tuple))
+    unit = self.stack[0]
+    if self.symbols.declared(name) is None:
       struct = code.StructuredType(name)
       for index, type in enumerate(tuple.types):
         struct.append(code.Property("elem_"+str(index), type))
       # add a self-referencing pointer for use in linked lists
       struct.append(code.Property("next", RefType(code.NamedType(
-                      "struct tuple_" + str(Transformer.tuple_index) + "_t"
+                      "struct " + name + "_t"
                     ))))
-      Transformer.tuple_index += 1
-
-      unit = self.stack[0]
 
       # initialize module
-      if unit.find("tuples") == None:
-        module = unit.append(structure.Module("tuples"))
+      module = self.symbols.module("tuples")
+      if module is None:
+        module = self.symbols.add_module(unit.append(structure.Module("tuples")))
         module.select("dec").append(code.Import("tuples"))
         # imports
         module.select("def").append(code.Import("<stdint.h>"))
         module.select("def").append(code.Import("<stdlib.h>"))
         module.select("def").append(code.Import("foo-lib/payload"))
         # required import
-        anchor = unit.find("requires-tuples")
+        anchor = self.symbols.tagged("requires-tuples")
         code.Import("tuples").insert_before(anchor)
 
       # add this tuple
-      unit.select("tuples", "def").append(struct)
+      module.select("def").append(self.symbols.declare(struct))
+      self.prepare_allocator(module, name)
 
       # add constructor
-      params = []
-      for index, type in enumerate(tuple.types):
-        params.append(code.Parameter("elem_"+str(index), type))
-      constructor = code.Function("make_" + name + "_t", type=RefType(code.NamedType(name+"_t")), params=params)
-      unit.select("tuples", "def").append(
-        code.Prototype( "make_" + name + "_t",
-                        type=RefType(code.NamedType(name+"_t")),
-                        params=params)
-      )
-      constructor.append(
-        # tuple_0_t* tuple = malloc(sizeof(tuple_0_t))
-        code.Assign(
-          code.VariableDecl("tuple", RefType(code.NamedType(name+"_t"))),
-          code.FunctionCall("malloc", type=type, arguments=[
-            code.FunctionCall("sizeof", type=code.IntegerType(),
-                              arguments=[code.SimpleVariable(name+"_t")])
-          ]))
-      )
-      # tuple->elem_0 = elem_0
-      # tuple->elem_1 = elem_1
-      for index, type in enumerate(tuple.types):
-        if isinstance(type, code.ObjectType):
-          constructor.append(
-            code.Assign(
-              code.ObjectProperty("tuple", "elem_" + str(index)),
-              code.FunctionCall("copy_" + str(type.name), type=type, arguments=[
-                code.SimpleVariable("elem_"+str(index))
-              ])
-            )
-          )
-        else:
-          constructor.append(
-            code.Assign(
-              code.ObjectProperty("tuple", "elem_" + str(index)),
-              code.SimpleVariable("elem_"+str(index))
-            )
-          )
-      constructor.append(code.Return(code.SimpleVariable("tuple")))
-      unit.select("tuples", "dec").append(constructor)
+      self.create_constructor(module, name, tuple.types)
 
       # add (destructor) free
       params = [code.Parameter("tuple", RefType(code.NamedType(name+"_t")))]
       destructor = code.Function("free_" + name + "_t", params=params)
-      unit.select("tuples", "def").append(
+      module.select("def").append(
         code.Prototype( "free_" + name + "_t", params=params )
       )
       for index, type in enumerate(tuple.types):
@@ -163,18 +682,14 @@ class Transformer(language.Visitor):
                 code.ObjectProperty("tuple", "elem_"+str(index))
               ])
           )
-      destructor.append(
-        code.FunctionCall("free", arguments=[
-          code.SimpleVariable("tuple")
-        ])
-      )
-      unit.select("tuples", "dec").append(destructor)
+      for statement in self.release(name): destructor.append(statement)
+      module.select("dec").append(self.symbols.declare(destructor))
 
       # add copy (-constructor)
       params = [code.Parameter("source", RefType(code.NamedType(name+"_t")))]
       copyconstructor = code.Function("copy_" + name + "_t", params=params,
                                        type=RefType(code.NamedType(name+"_t")))
-      unit.select("tuples", "def").append(
+      module.select("def").append(
         code.Prototype("copy_" + name + "_t", params=params,
                        type=RefType(code.NamedType(name+"_t")))
       )
@@ -182,10 +697,7 @@ class Transformer(language.Visitor):
         # tuple_0_t* tuple = malloc(sizeof(tuple_0_t))
         code.Assign(
           code.VariableDecl("tuple", RefType(code.NamedType(name+"_t"))),
-          code.FunctionCall("malloc", type=type, arguments=[
-            code.FunctionCall("sizeof", type=code.IntegerType(),
-                              arguments=[code.SimpleVariable(name+"_t")])
-          ]))
+          self.allocate(name))
       )
       for index, type in enumerate(tuple.types):
         if isinstance(type, code.ObjectType):
@@ -205,52 +717,341 @@ class Transformer(language.Visitor):
             )
           )
       copyconstructor.append(code.Return(code.SimpleVariable("tuple")))
-      unit.select("tuples", "dec").append(copyconstructor)
-
-      named_type = code.NamedType(name+"_t")
+      module.select("dec").append(self.symbols.declare(copyconstructor))
 
     # replace tuple type by a NamedType
-    Transformer.tuples[repr(tuple)] = named_type
-    return named_type
+    return code.NamedType(name+"_t")
+
+  # allocation of tuples is configured by the platform: "malloc" uses the heap,
+  # "pool" uses a fixed-size pool per tuple type, with a free list threaded
+  # through the next pointers of released tuples, and "arena" uses a single
+  # region, that is released as a whole using reset_arena().
+
+  def prepare_allocator(self, module, name):
+    allocator = self.platform.allocator
+    if allocator == "pool":
+      self.prepare_pool(module, name)
+    elif allocator == "arena":
+      self.prepare_arena(module)
+    else:
+      assert allocator == "malloc", "Unknown allocator: " + allocator
+
+  def prepare_pool(self, module, name):
+    size  = self.platform.pools.get(name, self.platform.pool_size)
+    tuple = RefType(code.NamedType(name + "_t"))
+    pool  = code.SimpleVariable(name + "_pool")
+    free  = code.SimpleVariable(name + "_free")
+    used  = code.SimpleVariable(name + "_used")
+    # tuple_0_t tuple_0_pool[32]; tuple_0_t* tuple_0_free; int tuple_0_used;
+    module.select("dec").append(
+      code.VariableDecl(name + "_pool",
+                        code.AmountType(code.NamedType(name + "_t"), size)),
+      code.VariableDecl(name + "_free", tuple),
+      code.VariableDecl(name + "_used", code.IntegerType())
+    )
 
-  @stacked
-  def visit_ListLiteral(self, list):
+    # reuse released tuples first, next take unused ones from the pool
+    allocate = code.Function("alloc_" + name + "_t", type=tuple)
+    allocate.append(
+      code.Assign(code.VariableDecl("tuple", tuple), Null()),
+      code.IfStatement(code.NotEquals(free, Null()), [
+        code.Assign(code.SimpleVariable("tuple"), free),
+        code.Assign(free, code.ObjectProperty("tuple", "next"))
+      ], [
+        code.IfStatement(code.LT(used, code.IntegerLiteral(size)), [
+          code.Assign(code.SimpleVariable("tuple"),
+                      AddressOf(code.ListVariable(name + "_pool", used))),
+          code.Inc(used)
+        ])
+      ]),
+      code.Return(code.SimpleVariable("tuple"))
+    )
+    params  = [ code.Parameter("tuple", tuple) ]
+    release = code.Function("release_" + name + "_t", params=params)
+    release.append(
+      code.Assign(code.ObjectProperty("tuple", "next"), free),
+      code.Assign(free, code.SimpleVariable("tuple"))
+    )
+    module.select("def").append(
+      code.Prototype(allocate.name, type=tuple),
+      code.Prototype(release.name, params=params)
+    )
+    module.select("dec").append(self.symbols.declare(allocate),
+                                self.symbols.declare(release))
+
+  def prepare_arena(self, module):
+    if not self.symbols.declared("alloc_from_arena") is None: return
+    size = self.platform.arena_size
+    used = code.SimpleVariable("arena_used")
+    # char arena[4096]; int arena_used;
+    module.select("dec").append(
+      code.VariableDecl("arena", code.AmountType(code.ByteType(), size)),
+      code.VariableDecl("arena_used", code.IntegerType())
+    )
+
+    # blocks are rounded up to multiples of 8 bytes to keep them aligned
+    params   = [ code.Parameter("size", code.IntegerType()) ]
+    allocate = code.Function("alloc_from_arena", type=RefType(code.VoidType()),
+                             params=params)
+    allocate.append(
+      code.Assign(code.VariableDecl("block", RefType(code.VoidType())), Null()),
+      code.Assign(code.SimpleVariable("size"),
+                  code.Mult(code.Div(code.Plus(code.SimpleVariable("size"),
+                                               code.IntegerLiteral(7)),
+                                     code.IntegerLiteral(8)),
+                            code.IntegerLiteral(8))),
+      code.IfStatement(code.LTEQ(code.Plus(used, code.SimpleVariable("size")),
+                                 code.IntegerLiteral(size)), [
+        code.Assign(code.SimpleVariable("block"),
+                    AddressOf(code.ListVariable("arena", used))),
+        code.Assign(used, code.Plus(used, code.SimpleVariable("size")))
+      ]),
+      code.Return(code.SimpleVariable("block"))
+    )
+    reset = code.Function("reset_arena")
+    reset.append(code.Assign(used, code.IntegerLiteral(0)))
+    module.select("def").append(
+      code.Prototype(allocate.name, type=allocate.type, params=params),
+      code.Prototype(reset.name)
+    )
+    module.select("dec").append(self.symbols.declare(allocate),
+                                self.symbols.declare(reset))
+
+  def allocate(self, name):
     """
-    If one of out items is a ListLiteral, import it, they will be collapsed
-    anyway and then we don't have issues with arg counts.
-    ISSUE: this is caused by the conversion of Atoms to ListLiterals :-(
+    Returns an expression allocating memory for a tuple.
     """
-    super(Transformer, self).visit_ListLiteral(list)
-    
-    children = []
-    for item in list.children:
-      if isinstance(item, code.ListLiteral):
-        for subitem in item.children:
-          children.append(subitem)
+    tuple  = RefType(code.NamedType(name + "_t"))
+    size   = code.FunctionCall("sizeof", type=code.IntegerType(),
+                               arguments=[code.SimpleVariable(name + "_t")])
+    return {
+      "malloc": lambda: code.FunctionCall("malloc", [size], type=tuple),
+      "pool"  : lambda: code.FunctionCall("alloc_" + name + "_t", type=tuple),
+      "arena" : lambda: code.FunctionCall("alloc_from_arena", [size], type=tuple)
+    }[self.platform.allocator]()
+
+  def release(self, name):
+    """
+    Returns the statements releasing the memory of a tuple. Tuples in an arena
+    are only released as a whole.
+    """
+    tuple = code.SimpleVariable("tuple")
+    return {
+      "malloc": lambda: [ code.FunctionCall("free", [tuple]) ],
+      "pool"  : lambda: [ code.FunctionCall("release_" + name + "_t", [tuple]) ],
+      "arena" : lambda: []
+    }[self.platform.allocator]()
+
+
+  @lowering.rule(code.AtomLiteral)
+  def lower_AtomLiteral(self, atom):
+    """
+    Atoms are constants of an enumeration in a shared atoms module, which is
+    imported by every module that uses them. They are passed as a single value,
+    also in variable argument lists, and stored in an atom_t.
+    """
+    self.context.atom(atom.name)
+    module = self.symbols.module("atoms")
+    if module is None:
+      module = self.symbols.add_module(
+        self.stack[0].append(structure.Module("atoms"))
+      )
+      module.select("def").append(code.Import("<stdint.h>"))
+      module.select("def").append(Atoms(self.atom_type())).tag("atoms")
+    return AtomConstant("atom_" + atom.name)
+
+  @lowering.rule(code.FunctionCall)
+  def lower_FunctionCall(self, call):
+    """
+    ListLiterals are passed as varargs, preceded by their size, which callees
+    collect at runtime. Platforms can opt for calls to fixed-arity
+    specializations, or for passing the size and a constant array.
+    """
+    if self.platform.arguments == "varargs": return None
+    if not any([ isinstance(arg, code.ListLiteral) for arg in call.arguments ]):
+      return None
+    if self.platform.arguments == "fixed":
+      arguments = []
+      for arg in call.arguments:
+        if isinstance(arg, code.ListLiteral): arguments.extend(arg.children)
+        else:                                 arguments.append(arg)
+      sizes = [ len(arg.children) for arg in call.arguments
+                                  if isinstance(arg, code.ListLiteral) ]
+      return code.FunctionCall(self.context.arity(call.function.name, sizes),
+                               arguments, type=call.type)
+    arguments = []
+    for arg in call.arguments:
+      if isinstance(arg, code.ListLiteral):
+        arguments.extend([ code.IntegerLiteral(len(arg.children)),
+                           self.array_of(arg.children) ])
       else:
-        children.append(item)
-    
-    # FIXME: this is too intrusive ;-(
-    list.floating = children
+        arguments.append(arg)
+    return code.FunctionCall(call.function.name, arguments, type=call.type)
 
-  atoms = []
-  @stacked
-  def visit_AtomLiteral(self, atom):
+  def array_of(self, items):
+    """
+    Returns an expression for a constant array with items: a static table in the
+    enclosing function if all items are constants, else an anonymous array.
+    """
+    if len(items) == 0: return code.SimpleVariable("NULL")
+    types = [ AtomType() if isinstance(item, AtomConstant) else type_of(item)
+              for item in items ]
+    if any([ type is None or repr(type) != repr(types[0]) for type in types ]):
+      type = code.IntegerType()         # varargs are promoted to int as well
+    else:
+      type = types[0]
+    function = self.enclosing_function()
+    if function is None or \
+       not all([ isinstance(item, self.CONSTANTS + (AtomConstant,))
+                 for item in items ]):
+      return ArrayLiteral(type, items)
+    name = "arguments_" + str(self.literals)
+    self.literals += 1
+    function.append(Table(name, type, items)).stick_top()
+    return code.SimpleVariable(name)
+
+  def atom_type(self):
+    """
+    Atoms are stored in a single byte, or in a word, which is cheaper to access
+    on some platforms.
+    """
+    if self.platform.atoms == "word":
+      return code.IntegerType((0, 2 ** (self.platform.word_size * 8) - 1))
+    return code.IntegerType((0, 255))
+
+  # CaseStatements with literal cases (or == matches of literals) are lowered to
+  # a lookup table, a switch or a tree of comparisons. Others are lowered to a
+  # chain of IfStatements, testing the cases in order.
+
+  CONSTANTS = (code.IntegerLiteral, code.ByteLiteral, code.BooleanLiteral,
+               code.FloatLiteral)
+
+  @lowering.rule(code.CaseStatement)
+  def lower_CaseStatement(self, case):
     """
-    Atoms are constructed using two consecutive ByteLiterals. It is assumed that
-    atoms will be used primarily in lists that are emitted to variable argument
-    list accepting functions.
+    Consequences that only return a constant become a lookup table, dense cases
+    a switch, which gcc compiles to a jump table, and sparse ones a sorted tree
+    of comparisons.
     """
-    # TODO: make this scheme more robust
-    try:
-      index = Transformer.atoms.index(atom.name) + 1
-    except:
-      Transformer.atoms.append(atom.name)
-      index = len(Transformer.atoms)
+    otherwise = case.case_else or []
+    if not isinstance(otherwise, list): otherwise = [otherwise]
+    [value, declaration] = self.case_value(case.expression)
+    values = [ case_value(item) for item in case.cases ]
+    if None in values or len(set(values)) < len(values):
+      lowered = self.case_chain(value, case.cases, case.consequences, otherwise)
+    else:
+      span   = max(values) - min(values) + 1
+      dense  = len(values) >= self.platform.switch_minimum and \
+               float(len(values)) / span >= self.platform.switch_density
+      table  = self.case_table(value, values, case.consequences, otherwise)
+      if dense and not table is None:
+        lowered = table
+      elif dense or len(otherwise) > 1:   # avoid copies of otherwise in a tree
+        lowered = Switch(value, case.cases, case.consequences, otherwise)
+      else:
+        pairs   = sorted(zip(values, case.cases, case.consequences))
+        lowered = self.case_tree(value, pairs, otherwise)
+    if declaration is None: return lowered
+    return Statements(declaration, lowered)
 
-    # replace the atom with a ListLiteral of 0x00 and 0x.. <- sequence
-    return code.ListLiteral().contains(code.ByteLiteral(0),
-                                       code.ByteLiteral(index))
+  def case_value(self, expression):
+    """
+    Returns an expression to access the value of the CaseStatement, along with
+    the declaration of a variable that holds it, if it's computed.
+    """
+    if isinstance(expression, (code.SimpleVariable, code.Literal)):
+      return (expression, None)
+    name = "case_value_" + str(self.next_case())
+    type = type_of(expression) or code.IntegerType()
+    return (code.SimpleVariable(name),
+            code.Assign(code.VariableDecl(name, type), expression))
+
+  def next_case(self):
+    self.cases += 1
+    return self.cases - 1
+
+  def enclosing_function(self):
+    for node in reversed(self.stack):
+      if isinstance(node, code.Function): return node
+    return None
+
+  def case_condition(self, value, item):
+    if not isinstance(item, code.Match):
+      return code.Equals(copy.deepcopy(value), item)
+    if wildcard(item): return code.BooleanLiteral(True)
+    return {
+      "<"  : code.LT,
+      ">"  : code.GT,
+      "<=" : code.LTEQ,
+      ">=" : code.GTEQ,
+      "==" : code.Equals,
+      "!=" : code.NotEquals
+    }[item.comp.operator](copy.deepcopy(value), item.expression)
+
+  def case_chain(self, value, cases, consequences, otherwise):
+    if len(cases) < 1: return Statements(*otherwise)
+    if isinstance(cases[0], code.Match) and wildcard(cases[0]):
+      return Statements(*consequences[0])
+    return code.IfStatement(self.case_condition(value, cases[0]),
+                            consequences[0],
+                            clause(self.case_chain(value, cases[1:],
+                                                   consequences[1:], otherwise)))
+
+  def case_tree(self, value, pairs, otherwise):
+    """
+    Returns a binary tree of comparisons for (value, case, consequence) pairs,
+    sorted on their value. Every leaf runs (a copy of) otherwise.
+    """
+    if len(pairs) < 1: return Statements(*copy.deepcopy(otherwise))
+    middle = len(pairs) // 2
+    [number, item, consequence] = pairs[middle]
+    literal = literal_of(item)
+    test = code.IfStatement(
+      code.Equals(copy.deepcopy(value), copy.deepcopy(literal)),
+      consequence,
+      clause(self.case_tree(value, pairs[middle+1:], otherwise))
+    )
+    if middle < 1: return test
+    return code.IfStatement(
+      code.LT(copy.deepcopy(value), copy.deepcopy(literal)),
+      [ self.case_tree(value, pairs[:middle], otherwise) ],
+      [ test ]
+    )
+
+  def case_table(self, value, values, consequences, otherwise):
+    """
+    Returns a lookup table and its use, if all consequences return a constant
+    and otherwise can fill the gaps between the cases, or None.
+    """
+    function = self.enclosing_function()
+    if function is None or isinstance(function.type, code.VoidType): return None
+    returns = lambda statements: len(statements) == 1 and \
+                                 isinstance(statements[0], code.Return) and \
+                                 isinstance(statements[0].expression,
+                                            self.CONSTANTS)
+    if not all([ returns(consequence) for consequence in consequences ]):
+      return None
+    [low, high] = [ min(values), max(values) ]
+    constants   = dict([ (number, consequence[0].expression)
+                         for number, consequence in zip(values, consequences) ])
+    if len(values) < high - low + 1:
+      if not returns(otherwise): return None
+      gap = otherwise[0].expression
+    else:
+      gap = None
+    name  = "case_table_" + str(self.next_case())
+    index = copy.deepcopy(value)
+    if low != 0: index = code.Minus(index, code.IntegerLiteral(low))
+    return Statements(
+      Table(name, function.type, [ constants.get(number, gap)
+                                   for number in range(low, high + 1) ]),
+      code.IfStatement(
+        code.And(code.GTEQ(copy.deepcopy(value), code.IntegerLiteral(low)),
+                 code.LTEQ(copy.deepcopy(value), code.IntegerLiteral(high))),
+        [ code.Return(code.ListVariable(name, index)) ]
+      ),
+      *otherwise
+    )
 
   @stacked
   def visit_Function(self, function):
@@ -268,22 +1069,16 @@ class Transformer(language.Visitor):
   
     super(Transformer, self).visit_Function(function)
 
-  @stacked
-  def visit_MethodCall(self, call):
-    """
-    MethodCalls are transformed into FunctionCalls. If the object on which the
-    method is invoked is ManyType, the prefix is set to "list", else to the name
-    of the (Object)Type in plural.
-    """
-    # first let the standard visitor visit all lower-level dependencies
-    super(Transformer, self).visit_MethodCall(call)
-
-    if isinstance(call.obj.type, code.ManyType): return self.visit_ListCall(call)
+  # MethodCalls are transformed into FunctionCalls. If the object on which the
+  # method is invoked is ManyType, the prefix is set to "list", else to the name
+  # of the (Object)Type in plural.
 
-    # non-list methodcalls are turned into 
-    if not isinstance(call.obj.type, code.ObjectType):
-      raise NotImplementedError, "only list- and object-types are supported"
+  @lowering.rule(code.MethodCall, obj=rewrite.Pattern(type=code.ManyType))
+  def lower_ListCall(self, call):
+    return self.visit_ListCall(call)
 
+  @lowering.rule(code.MethodCall, obj=rewrite.Pattern(type=code.ObjectType))
+  def lower_ObjectCall(self, call):
     name = call.obj.type.name + "_" + call.method.name
     # create FunctionCall with object as first argument
     function = code.FunctionCall(name, arguments=[call.obj], type=call.type)
@@ -293,43 +1088,67 @@ class Transformer(language.Visitor):
     # replace methodcall by functioncall, by returning it
     return function
 
-  def visit_ListCall(self, call):
-    # arguments to the original methodcall can be matchers, those should be 
-    # inlined, remaining arguments are normally literals that should be
-    # converted to matchers
-    # TODO: make this generic ;-(
+  @lowering.rule(code.MethodCall)
+  def lower_MethodCall(self, call):
+    raise NotImplementedError, "only list- and object-types are supported"
+
+  # arguments to the original methodcall can be matchers, those should be
+  # inlined, remaining arguments are normally literals that should be converted
+  # to matchers. other arguments are matched against the list's items. each
+  # rule returns a tuple of matchers (None for arguments) and arguments.
+
+  matching = rewrite.Rules()
+
+  @matching.rule(code.Match)
+  def match_Match(self, match):
+    return ([match], [])
+
+  @matching.rule(code.ListLiteral)
+  def match_ListLiteral(self, literal):
+    matchers  = []
+    arguments = []
+    for item in literal:
+      [more_matchers, more_arguments] = Transformer.matching.apply(item, self)
+      matchers.extend(more_matchers)
+      arguments.extend(more_arguments)
+    return (matchers, arguments)
+
+  @matching.rule(code.Literal)
+  def match_Literal(self, literal):
+    return ([code.Match("==", literal)], [])
+
+  @matching.rule()
+  def match_argument(self, argument):
+    return ([None], [argument])         # placeholder to match argument
+
+  def matchers_of(self, call):
     matchers  = []
     arguments = []
     for arg in call.arguments:
-      if isinstance(arg, code.ListLiteral):
-        for subarg in arg:
-          if isinstance(subarg, code.ListLiteral):
-            for subsubarg in subarg:
-              if isinstance(subsubarg, code.Match):
-                matchers.append(subsubarg)
-              elif isinstance(subsubarg, code.Literal):
-                matchers.append(code.Match("==", subsubarg))
-              else:
-                matchers.append(None)     # placeholder to match argument
-                arguments.push(subsubarg)
-
-          else :
-            if isinstance(subarg, code.Match):
-              matchers.append(subarg)
-            elif isinstance(subarg, code.Literal):
-              matchers.append(code.Match("==", subarg))
-            else:
-              matchers.append(None)       # placeholder to match argument
-              arguments.append(subarg)
-          
+      [more_matchers, more_arguments] = Transformer.matching.apply(arg, self)
+      matchers.extend(more_matchers)
+      arguments.extend(more_arguments)
+    return (matchers, arguments)
+
+  def pushed_values(self, matchers, arguments):
+    """
+    Returns the values of all elements of a pushed tuple: its arguments and its
+    literals, which were turned into matchers.
+    """
+    values = []
+    args   = 0
+    for matcher in matchers:
+      if matcher is None:
+        values.append(arguments[args])
+        args += 1
       else:
-        if isinstance(arg, code.Match):
-          matchers.append(arg)
-        elif isinstance(arg, code.Literal):
-          matchers.append(code.Match("==", arg))
-        else:
-          matchers.append(None)           # placeholder to match argument
-          arguments.append(arg)
+        assert not wildcard(matcher) and matcher.comp.operator == "==", \
+               "can't push " + matcher.as_label()
+        values.append(matcher.expression)
+    return values
+
+  def visit_ListCall(self, call):
+    [matchers, arguments] = self.matchers_of(call)
 
     # determine type of list
     type_name = {
@@ -337,18 +1156,36 @@ class Transformer(language.Visitor):
     }[str(call.obj.type.type.__class__.__name__)]()
 
     # create list manipulating customized function
+    kind = layout(call.obj.type, self.platform)
+    keys = None
+    if kind in [ "hashed", "sorted" ]:
+      keys = self.keys.get(list_name(call.obj), None)
+      assert not keys is None, \
+             "list " + list_name(call.obj) + " can't be lowered to " + kind
+    method = call.method.name
+    if method == "push":
+      # push functions only depend on the type of the tuple
+      [matchers, arguments] = [ [], self.pushed_values(matchers, arguments) ]
+      if self.moves(type_name, arguments):
+        method = "adopt"                    # objects are handed over
     [function, byref] = \
-      self.create_list_manipulator(call.obj.type, type_name, call.method.name,
-                                   matchers, arguments)
+      self.create_list_manipulator(call.obj.type, type_name, method,
+                                   matchers, arguments, kind, keys)
+    if method == "adopt": arguments = self.hand_over(type_name, arguments)
 
     if byref: obj = AddressOf(call.obj)
     else:     obj = call.obj
 
     new_arguments = [obj]
     if call.method.name != "remove" and len(arguments) > 0:
-      new_arguments.append(
-       code.FunctionCall("make_" + type_name, arguments, type=call.obj.type)
-      )
+      if kind in [ "array", "columns", "sorted" ] or \
+         (kind == "hashed" and call.method.name == "contains"):
+        new_arguments.extend(arguments)     # stored in place or matched
+      else:
+        new_arguments.append(code.FunctionCall(
+          ("adopt_" if method == "adopt" else "make_") + type_name, arguments,
+          type=call.obj.type
+        ))
     else:
       for arg in arguments:
         new_arguments.append(arg)
@@ -357,75 +1194,223 @@ class Transformer(language.Visitor):
     # and replace methodcall by functioncall
     return code.FunctionCall(function.name, new_arguments, type=function.type)
 
-  def create_list_manipulator(self, type, type_name, method, matchers, arguments):
+  def create_list_manipulator(self, type, type_name, method, matchers, arguments,
+                                    kind="linked", keys=None):
     """
-    Dispatcher for the creation of list-manipulating functions.
+    Dispatcher for the creation of list-manipulating functions. Functions are
+    specialized for the layout (and keys) and type of the list, the method and
+    the matchers, and each specialization is created once.
     """
     self.prepare_lists_module()
+    if kind == "sorted" and method == "clear":    # same struct as arrays
+      [kind, keys] = [ "array", None ]
+    if kind in [ "linked", "hashed" ] and method == "adopt":
+      self.prepare_adopt(type_name)               # tuples are adopted by caller
+      method = "push"
+    key = (kind, tuple(keys or []), type_name, method,
+           self.matcher_signature(matchers, arguments))
+    self.mark_hot(type_name, matchers)
+    if kind == "hashed":
+      return {
+        "contains": self.create_hash_contains,
+        "push"    : self.create_hash_push,
+        "remove"  : self.create_hash_remove,
+        "clear"   : self.create_hash_clear
+      }[method](type, type_name, matchers, arguments, key, keys)
+    if kind == "sorted":
+      return {
+        "contains": self.create_sorted_contains,
+        "push"    : self.create_sorted_push,
+        "adopt"   : lambda *args: self.create_sorted_push(*args, owned=True),
+        "remove"  : self.create_sorted_remove
+      }[method](type, type_name, matchers, arguments, key, keys)
     return {
-      "contains": self.create_list_contains,
-      "push"    : self.create_list_push,
-      "remove"  : self.create_list_remove
-    }[method](type, type_name, matchers, arguments)
+      "linked" : {
+        "contains": self.create_list_contains,
+        "push"    : self.create_list_push,
+        "remove"  : self.create_list_remove,
+        "clear"   : self.create_list_clear
+      },
+      "array"  : {
+        "contains": self.create_array_contains,
+        "push"    : self.create_array_push,
+        "adopt"   : lambda *args: self.create_array_push(*args, owned=True),
+        "remove"  : self.create_array_remove,
+        "clear"   : self.create_array_clear
+      },
+      "columns": {
+        "contains": self.create_columns_contains,
+        "push"    : self.create_columns_push,
+        "adopt"   : lambda *args: self.create_columns_push(*args, owned=True),
+        "remove"  : self.create_columns_remove,
+        "clear"   : self.create_columns_clear
+      }
+    }[kind][method](type, type_name, matchers, arguments, key)
+
+  def matcher_signature(self, matchers, arguments):
+    """
+    Normalizes matchers: placeholders for arguments are identified by the type of
+    the argument, matchers that match anything are all alike.
+    """
+    normalized = []
+    args       = 0
+    for matcher in matchers:
+      if matcher is None:
+        normalized.append(("argument", signature(arguments[args].info)))
+        args += 1
+      elif wildcard(matcher):
+        normalized.append("*")
+      else:
+        normalized.append(signature(matcher))
+    return tuple(normalized)
+
+  def specialized(self, key, name):
+    """
+    Returns the name of the specialization for key and the existing function,
+    or None if it still needs to be created.
+    """
+    name     = self.context.specialization(key, name)
+    function = self.symbols.declared(name)
+    self.context.count(not function is None)
+    return (name, function)
+
+  def mark_hot(self, type_name, matchers):
+    """
+    Properties of tuples that are read by matchers are tagged hot, allowing a
+    layout pass to keep them together.
+    """
+    struct = self.symbols.declared(type_name[:-2])
+    if not isinstance(struct, code.StructuredType): return
+    for index, matcher in enumerate(matchers):
+      if not matcher is None and wildcard(matcher): continue
+      for prop in struct:
+        if prop.name.name == "elem_" + str(index): prop.tag("hot")
+
+  def create_constructor(self, module, name, types, owned=False):
+    """
+    Adds a constructor for tuples: make_<tuple>, copying the objects that are
+    passed to it, or adopt_<tuple>, taking ownership of them. In both cases the
+    tuple owns its objects, which are freed along with it by free_<tuple>.
+    """
+    params = [ code.Parameter("elem_" + str(index), type)
+                 .tag("owned" if owned else "borrowed")
+               for index, type in enumerate(types) ]
+    prefix = "adopt_" if owned else "make_"
+    constructor = code.Function(prefix + name + "_t",
+                                type=RefType(code.NamedType(name+"_t")),
+                                params=params)
+    module.select("def").append(
+      code.Prototype(prefix + name + "_t",
+                     type=RefType(code.NamedType(name+"_t")),
+                     params=params)
+    )
+    constructor.append(
+      # tuple_0_t* tuple = malloc(sizeof(tuple_0_t))
+      code.Assign(
+        code.VariableDecl("tuple", RefType(code.NamedType(name+"_t"))),
+        self.allocate(name))
+    )
+    # tuple->elem_0 = elem_0
+    # tuple->elem_1 = copy_payload(elem_1)
+    for param in params:
+      constructor.append(
+        code.Assign(code.ObjectProperty("tuple", param.name), take(param))
+      )
+    constructor.append(code.Return(code.SimpleVariable("tuple")))
+    module.select("dec").append(self.symbols.declare(constructor))
+    return constructor
+
+  def moves(self, type_name, arguments):
+    """
+    Returns True if any of the objects to store a tuple with is moved. The
+    arguments hold the values of all elements, including literals.
+    """
+    types = [ prop.type for prop in self.array_elements(type_name) ]
+    assert len(types) == len(arguments), "can't match ownership to elements"
+    return any([ isinstance(type, code.ObjectType) and \
+                 ownership(argument) == "moved"
+                 for type, argument in zip(types, arguments) ])
+
+  def hand_over(self, type_name, arguments):
+    """
+    Returns the arguments to hand over all objects of a tuple with, copying the
+    ones that aren't moved by the caller.
+    """
+    types  = [ prop.type for prop in self.array_elements(type_name) ]
+    assert len(types) == len(arguments), "can't match ownership to elements"
+    handed = []
+    for type, argument in zip(types, arguments):
+      if isinstance(type, code.ObjectType) and ownership(argument) != "moved":
+        argument = code.FunctionCall("copy_" + str(type.name), [argument],
+                                     type=type)
+      handed.append(argument)
+    return handed
+
+  def prepare_adopt(self, type_name):
+    name = type_name[:-2]
+    if self.symbols.declared("adopt_" + type_name) is None:
+      self.create_constructor(self.symbols.module("tuples"), name,
+        [ prop.type for prop in self.array_elements(type_name) ], owned=True)
 
   def prepare_lists_module(self):
     unit = self.stack[0]
     # make sure that the listing module exists, else create it
-    if unit.find("lists") == None:
-      module = unit.append(structure.Module("lists"))
+    if self.symbols.module("lists") is None:
+      module = self.symbols.add_module(unit.append(structure.Module("lists")))
       module.select("dec").append(code.Import("lists"))
       module.select("def").append(code.Import("<stdlib.h>"))
       module.select("def").append(code.Import("tuples"))
       module.select("def").append(code.Import("foo-lib/time"))
       # add to includes
-      unit.select("includes", "def").append(code.Import("lists"))
+      self.symbols.module("includes").select("def").append(code.Import("lists"))
+    return self.symbols.module("lists")
 
-  def create_list_contains(self, type, type_name, matchers, arguments):
-    name     = "list_of_" + type_name + "s_contains"
-    function = self.stack[0].find(name)
-    if not function is None: return function
+  def add_list_function(self, function):
+    """
+    Adds a generated list function and its Prototype to the lists module.
+    """
+    module = self.symbols.module("lists")
+    module.select("def").append(
+      code.Prototype(function.name, type=function.type, params=function.params)
+    )
+    return module.select("dec").append(self.symbols.declare(function))
+
+  def create_list_contains(self, type, type_name, matchers, arguments, key):
+    # turn matchers into list of conditions
+    [condition, suffix] = self.transform_matchers_into_condition(matchers, arguments)
+    [name, function] = self.specialized(key,
+                                        "list_of_" + type_name + "s_contains" + suffix)
+    if not function is None: return (function, False)
 
     params = [ code.Parameter("iter", type) ]
 
     # construct loop body
     body = code.WhileDo(code.NotEquals(code.SimpleVariable("iter"), Null()))
-
-    # turn matchers into list of conditions
-    [condition, suffix] = self.transform_matchers_into_condition(matchers, arguments)
-    name += suffix
     body.append(code.IfStatement(condition,
                   [ code.Return(code.BooleanLiteral(True)) ]
                 ),
                 code.Assign("iter",
                             code.ObjectProperty("iter", "next"))
     )
-    # provide a prototype
-    self.stack[0].find("lists").select("def").append(
-      code.Prototype(name, type=code.BooleanType(), params=params)
-    )
-    # create function and return it
-    return (self.stack[0].find("lists").select("dec").append(
+    # create function (and its prototype) and return it
+    return (self.add_list_function(
       code.Function(name, type=code.BooleanType(), params=params)
           .contains(body,
                     code.Return(code.BooleanLiteral(False))
           ).tag(name)
     ), False)
 
-  def create_list_push(self, type, type_name, matchers, arguments):
-    name     = "list_of_" + type_name + "s_push"
-    function = self.stack[0].find(name)
-    if not function is None: return function
+  def create_list_push(self, type, type_name, matchers, arguments, key):
+    [name, function] = self.specialized(key, "list_of_" + type_name + "s_push")
+    if not function is None: return (function, True)
     
     # pushing accepts the type of the list's content as parameter(d)
     params = [ code.Parameter("list", RefType(type)),
                code.Parameter("item", RefType(type.type))
              ]
 
-    # provide a prototype
-    self.stack[0].find("lists").select("def").append(
-      code.Prototype(name, type=code.VoidType(), params=params)
-    )
-    return (self.stack[0].find("lists").select("dec").append(
+    # create function (and its prototype) and return it
+    return (self.add_list_function(
       code.Function(name, type=code.VoidType(), params=params)
           .contains(
             code.Assign(code.ObjectProperty("item", "next"),
@@ -435,10 +1420,12 @@ class Transformer(language.Visitor):
           ).tag(name)
     ), True)
 
-  def create_list_remove(self, type, type_name, matchers, arguments):
-    name   = "list_of_" + type_name + "s_remove"
-    function = self.stack[0].find(name)
-    if not function is None: return function
+  def create_list_remove(self, type, type_name, matchers, arguments, key):
+    # turn matchers into list of conditions
+    [condition, suffix] = self.transform_matchers_into_condition(matchers, arguments)
+    [name, function] = self.specialized(key,
+                                        "list_of_" + type_name + "s_remove" + suffix)
+    if not function is None: return (function, True)
 
     params = [ code.Parameter("list", RefType(type)) ]
 
@@ -453,37 +1440,33 @@ class Transformer(language.Visitor):
       )
       args += 1
 
-    # turn matchers into list of conditions
-    [condition, suffix] = self.transform_matchers_into_condition(matchers, arguments)
-    name += suffix
-
-    # construct body
+    # construct body, fetching the next item before the current one is freed,
+    # and only advancing prev past items that are kept
     body = code.WhileDo(code.NotEquals(code.SimpleVariable("iter"), Null())) \
                .contains(
+                 code.Assign(code.VariableDecl("next", RefType(type.type)),
+                             code.ObjectProperty("iter", "next")),
                  code.IfStatement(condition, [
                    code.IfStatement(code.Equals(code.SimpleVariable("prev"),
                                                 Null()),
                      [ code.Assign(Deref(code.SimpleVariable("list")),
-                                   code.ObjectProperty("iter", "next")) ],
+                                   code.SimpleVariable("next")) ],
                      [ code.Assign(code.ObjectProperty("prev", "next"),
-                                   code.ObjectProperty("iter", "next")) ]
+                                   code.SimpleVariable("next")) ]
                    ),
                    code.FunctionCall("free_"+type_name,
                                     [ code.SimpleVariable("iter") ]),
                    code.Inc(code.SimpleVariable("removed"))
+                 ], [
+                   code.Assign(code.SimpleVariable("prev"),
+                               code.SimpleVariable("iter"))
                  ]),
-                 code.Assign(code.SimpleVariable("prev"),
-                             code.SimpleVariable("iter")),
                  code.Assign(code.SimpleVariable("iter"),
-                             code.ObjectProperty("iter", "next"))
+                             code.SimpleVariable("next"))
                )
   
-    # provide a prototype
-    self.stack[0].find("lists").select("def").append(
-      code.Prototype(name, type=code.IntegerType(), params=params)
-    )
-    # create function and return it
-    return (self.stack[0].find("lists").select("dec").append(
+    # create function (and its prototype) and return it
+    return (self.add_list_function(
       code.Function(name, type=code.IntegerType(), params=params)
           .contains(code.Assign(code.VariableDecl("removed", code.IntegerType()),
                                 code.IntegerLiteral(0)),
@@ -496,7 +1479,883 @@ class Transformer(language.Visitor):
           )
     ), True)
 
-  def transform_matchers_into_condition(self, matchers, arguments):
+  def create_list_clear(self, type, type_name, matchers, arguments, key):
+    [name, function] = self.specialized(key, "list_of_" + type_name + "s_clear")
+    if not function is None: return (function, True)
+
+    params = [ code.Parameter("list", RefType(type)) ]
+
+    # free all items, fetching the next one before the current one is freed
+    return (self.add_list_function(
+      code.Function(name, type=code.VoidType(), params=params)
+          .contains(code.Assign(code.VariableDecl("iter", RefType(type.type)),
+                                Deref(code.SimpleVariable("list"))),
+                    code.WhileDo(code.NotEquals(code.SimpleVariable("iter"),
+                                                Null())).contains(
+                      code.Assign(code.VariableDecl("next", RefType(type.type)),
+                                  code.ObjectProperty("iter", "next")),
+                      code.FunctionCall("free_" + type_name,
+                                        [ code.SimpleVariable("iter") ]),
+                      code.Assign(code.SimpleVariable("iter"),
+                                  code.SimpleVariable("next"))
+                    ),
+                    code.Assign(Deref(code.SimpleVariable("list")), Null())
+          ).tag(name)
+    ), True)
+
+  # arrays: a structured type with a pointer to the elements, the number of
+  # elements and the capacity. elements are stored in place, removal compacts.
+
+  def prepare_array_type(self, type_name):
+    name = array_of(type_name)
+    if self.symbols.declared(name) is None:
+      struct = code.StructuredType(name)
+      struct.append(code.Property("data", RefType(code.NamedType(type_name))),
+                    code.Property("size",     code.IntegerType()),
+                    code.Property("capacity", code.IntegerType()))
+      self.symbols.module("lists").select("def").append(
+        self.symbols.declare(struct)
+      )
+    return code.NamedType(name + "_t")
+
+  def array_elements(self, type_name):
+    """
+    Returns the properties of the structured type of the elements of an array,
+    without the pointer for use in linked lists.
+    """
+    struct = self.symbols.declared(type_name[:-2])
+    return [ prop for prop in struct if prop.name.name != "next" ]
+
+  def array_item(self, index):
+    # list->data[index]
+    if isinstance(index, str): index = code.SimpleVariable(index)
+    return code.ListVariable(code.ObjectProperty("list", "data"), index)
+
+  def array_scan(self, type_name, *body):
+    """
+    Returns a loop over all elements of an array, pointing iter to each element.
+    """
+    return code.For(code.Assign(code.VariableDecl("index", code.IntegerType()),
+                                code.IntegerLiteral(0)),
+                    code.LT(code.SimpleVariable("index"),
+                            code.ObjectProperty("list", "size")),
+                    code.Inc(code.SimpleVariable("index"))).contains(
+             code.Assign(code.VariableDecl("iter",
+                                           RefType(code.NamedType(type_name))),
+                         AddressOf(self.array_item("index"))),
+             *body
+           )
+
+  def array_params(self, type_name, arguments):
+    params = [ code.Parameter("list", RefType(self.prepare_array_type(type_name))) ]
+    for index, arg in enumerate(arguments):
+      params.append(code.Parameter("arg_" + str(index),
+                                   code.ObjectType(arg.info.name)))
+    return params
+
+  def create_array_contains(self, type, type_name, matchers, arguments, key):
+    [condition, suffix] = self.transform_matchers_into_condition(matchers, arguments)
+    [name, function] = self.specialized(key,
+                                        "array_of_" + type_name + "s_contains" + suffix)
+    if not function is None: return (function, True)
+
+    params = self.array_params(type_name, arguments)
+
+    return (self.add_list_function(
+      code.Function(name, type=code.BooleanType(), params=params)
+          .contains(self.array_scan(type_name,
+                      code.IfStatement(condition,
+                        [ code.Return(code.BooleanLiteral(True)) ])
+                    ),
+                    code.Return(code.BooleanLiteral(False))
+          ).tag(name)
+    ), True)
+
+  def create_array_push(self, type, type_name, matchers, arguments, key,
+                              owned=False):
+    [name, function] = self.specialized(key, "array_of_" + type_name + "s_" +
+                                             ("adopt" if owned else "push"))
+    if not function is None: return (function, True)
+
+    params = [ code.Parameter("list", RefType(self.prepare_array_type(type_name))) ]
+    body   = self.array_push(type_name, params,
+                             code.ObjectProperty("list", "size"), owned=owned)
+
+    return (self.add_list_function(
+      code.Function(name, type=code.VoidType(), params=params)
+          .contains(*body).tag(name)
+    ), True)
+
+  def array_push(self, type_name, params, position, prepare=[], owned=False):
+    """
+    Returns the statements growing an array when it is full, and constructing an
+    element at position, after the prepare statements. The elements of the tuple
+    are added to the params, which take ownership of objects if owned.
+    """
+    def list_property(name): return code.ObjectProperty("list", name)
+
+    # grow the array when it is full
+    body = [
+      code.IfStatement(code.Equals(list_property("size"),
+                                   list_property("capacity")), [
+        code.Assign(list_property("capacity"),
+                    code.Plus(code.Mult(list_property("capacity"),
+                                        code.IntegerLiteral(2)),
+                              code.IntegerLiteral(4))),
+        code.Assign(list_property("data"),
+          code.FunctionCall("realloc", type=RefType(code.NamedType(type_name)),
+            arguments=[
+              list_property("data"),
+              code.Mult(list_property("capacity"),
+                        code.FunctionCall("sizeof", type=code.IntegerType(),
+                                  arguments=[code.SimpleVariable(type_name)]))
+            ]))
+      ])
+    ] + prepare + [
+      code.Assign(code.VariableDecl("item", RefType(code.NamedType(type_name))),
+                  AddressOf(self.array_item(position)))
+    ]
+    # construct the element in place, like make_<tuple> or adopt_<tuple> do
+    for prop in self.array_elements(type_name):
+      param = code.Parameter(prop.name.name, prop.type) \
+                  .tag("owned" if owned else "borrowed")
+      params.append(param)
+      body.append(code.Assign(code.ObjectProperty("item", prop.name.name),
+                              take(param)))
+    body.append(code.Inc(list_property("size")))
+    return body
+
+  def create_array_remove(self, type, type_name, matchers, arguments, key):
+    [condition, suffix] = self.transform_matchers_into_condition(matchers, arguments)
+    [name, function] = self.specialized(key,
+                                        "array_of_" + type_name + "s_remove" + suffix)
+    if not function is None: return (function, True)
+
+    params = self.array_params(type_name, arguments)
+
+    # removed elements only need their objects to be freed
+    release = [ code.FunctionCall("free_" + str(prop.type.name),
+                                  [ code.ObjectProperty("iter", prop.name.name) ])
+                for prop in self.array_elements(type_name)
+                if isinstance(prop.type, code.ObjectType) ]
+
+    return (self.add_list_function(
+      code.Function(name, type=code.IntegerType(), params=params)
+          .contains(code.Assign(code.VariableDecl("removed", code.IntegerType()),
+                                code.IntegerLiteral(0)),
+                    code.Assign(code.VariableDecl("kept", code.IntegerType()),
+                                code.IntegerLiteral(0)),
+                    self.array_scan(type_name,
+                      code.IfStatement(condition,
+                        release + [ code.Inc(code.SimpleVariable("removed")) ],
+                        [ code.Assign(self.array_item("kept"),
+                                      Deref(code.SimpleVariable("iter"))),
+                          code.Inc(code.SimpleVariable("kept")) ]
+                      )
+                    ),
+                    code.Assign(code.ObjectProperty("list", "size"),
+                                code.SimpleVariable("kept")),
+                    code.Return(code.SimpleVariable("removed"))
+          ).tag(name)
+    ), True)
+
+  def create_array_clear(self, type, type_name, matchers, arguments, key):
+    [name, function] = self.specialized(key, "array_of_" + type_name + "s_clear")
+    if not function is None: return (function, True)
+
+    params = [ code.Parameter("list", RefType(self.prepare_array_type(type_name))) ]
+
+    # elements are stored in place, only their objects need to be freed
+    release = [ code.FunctionCall("free_" + str(prop.type.name),
+                                  [ code.ObjectProperty("iter", prop.name.name) ])
+                for prop in self.array_elements(type_name)
+                if isinstance(prop.type, code.ObjectType) ]
+    body = [ self.array_scan(type_name, *release) ] if len(release) > 0 else []
+    body.append(code.Assign(code.ObjectProperty("list", "size"),
+                            code.IntegerLiteral(0)))
+
+    return (self.add_list_function(
+      code.Function(name, type=code.VoidType(), params=params)
+          .contains(*body).tag(name)
+    ), True)
+
+  # columns: a structure of arrays, with one array per element of the tuples,
+  # sharing the number of elements and the capacity. scans only load the
+  # columns that their conditions read, using simple indexed loops.
+
+  def prepare_columns_type(self, type_name):
+    name = columns_of(type_name)
+    if self.symbols.declared(name) is None:
+      struct = code.StructuredType(name)
+      for prop in self.array_elements(type_name):
+        struct.append(code.Property(prop.name.name, RefType(prop.type)))
+      struct.append(code.Property("size",     code.IntegerType()),
+                    code.Property("capacity", code.IntegerType()))
+      self.symbols.module("lists").select("def").append(
+        self.symbols.declare(struct)
+      )
+    return code.NamedType(name + "_t")
+
+  def columns_condition(self, type_name, matchers, arguments):
+    """
+    Returns the condition for the matchers, reading the columns at index, along
+    with the suffix and the declarations of local pointers to the columns that
+    are read.
+    """
+    read = []
+    def element(index):
+      if not index in read: read.append(index)
+      return code.ListVariable(code.SimpleVariable("elem_" + str(index)),
+                               code.SimpleVariable("index"))
+    [condition, suffix] = \
+      self.transform_matchers_into_condition(matchers, arguments, element)
+    properties = self.array_elements(type_name)
+    columns = [ code.Assign(code.VariableDecl("elem_" + str(index),
+                                              RefType(properties[index].type)),
+                            code.ObjectProperty("list", "elem_" + str(index)))
+                for index in sorted(read) ]
+    return (condition, suffix, columns)
+
+  def columns_scan(self, *body):
+    return code.For(code.Assign(code.VariableDecl("index", code.IntegerType()),
+                                code.IntegerLiteral(0)),
+                    code.LT(code.SimpleVariable("index"),
+                            code.ObjectProperty("list", "size")),
+                    code.Inc(code.SimpleVariable("index"))).contains(*body)
+
+  def column(self, name, index):
+    # list->name[index]
+    return code.ListVariable(code.ObjectProperty("list", name), index)
+
+  def columns_params(self, type_name, arguments):
+    params = [ code.Parameter("list", RefType(self.prepare_columns_type(type_name))) ]
+    for index, arg in enumerate(arguments):
+      params.append(code.Parameter("arg_" + str(index),
+                                   code.ObjectType(arg.info.name)))
+    return params
+
+  def create_columns_contains(self, type, type_name, matchers, arguments, key):
+    [condition, suffix, columns] = \
+      self.columns_condition(type_name, matchers, arguments)
+    [name, function] = self.specialized(key,
+                                        "columns_of_" + type_name + "s_contains" + suffix)
+    if not function is None: return (function, True)
+
+    params = self.columns_params(type_name, arguments)
+
+    return (self.add_list_function(
+      code.Function(name, type=code.BooleanType(), params=params)
+          .contains(*(columns + [
+                      self.columns_scan(
+                        code.IfStatement(condition,
+                          [ code.Return(code.BooleanLiteral(True)) ])
+                      ),
+                      code.Return(code.BooleanLiteral(False))
+                    ])
+          ).tag(name)
+    ), True)
+
+  def create_columns_push(self, type, type_name, matchers, arguments, key,
+                                owned=False):
+    [name, function] = self.specialized(key, "columns_of_" + type_name + "s_" +
+                                             ("adopt" if owned else "push"))
+    if not function is None: return (function, True)
+
+    params = [ code.Parameter("list", RefType(self.prepare_columns_type(type_name))) ]
+
+    def list_property(name): return code.ObjectProperty("list", name)
+
+    properties = self.array_elements(type_name)
+    # grow all columns when they are full
+    grow = [ code.Assign(list_property("capacity"),
+                         code.Plus(code.Mult(list_property("capacity"),
+                                             code.IntegerLiteral(2)),
+                                   code.IntegerLiteral(4))) ]
+    for prop in properties:
+      column = list_property(prop.name.name)
+      grow.append(code.Assign(column,
+        code.FunctionCall("realloc", type=RefType(prop.type), arguments=[
+          column,
+          code.Mult(list_property("capacity"),
+                    code.FunctionCall("sizeof", type=code.IntegerType(),
+                                      arguments=[Deref(column)]))
+        ])))
+    body = [ code.IfStatement(code.Equals(list_property("size"),
+                                          list_property("capacity")), grow) ]
+    # append the elements to their columns, like make_<tuple> or adopt_<tuple>
+    for prop in properties:
+      param = code.Parameter(prop.name.name, prop.type) \
+                  .tag("owned" if owned else "borrowed")
+      params.append(param)
+      body.append(code.Assign(self.column(prop.name.name, list_property("size")),
+                              take(param)))
+    body.append(code.Inc(list_property("size")))
+
+    return (self.add_list_function(
+      code.Function(name, type=code.VoidType(), params=params)
+          .contains(*body).tag(name)
+    ), True)
+
+  def create_columns_remove(self, type, type_name, matchers, arguments, key):
+    [condition, suffix, columns] = \
+      self.columns_condition(type_name, matchers, arguments)
+    [name, function] = self.specialized(key,
+                                        "columns_of_" + type_name + "s_remove" + suffix)
+    if not function is None: return (function, True)
+
+    params = self.columns_params(type_name, arguments)
+
+    index      = code.SimpleVariable("index")
+    properties = self.array_elements(type_name)
+    # removed elements only need their objects to be freed
+    release = [ code.FunctionCall("free_" + str(prop.type.name),
+                                  [ self.column(prop.name.name, index) ])
+                for prop in properties
+                if isinstance(prop.type, code.ObjectType) ]
+    # kept elements are moved down in all columns
+    keep = [ code.Assign(self.column(prop.name.name, code.SimpleVariable("kept")),
+                         self.column(prop.name.name, index))
+             for prop in properties ]
+
+    return (self.add_list_function(
+      code.Function(name, type=code.IntegerType(), params=params)
+          .contains(*(columns + [
+                      code.Assign(code.VariableDecl("removed", code.IntegerType()),
+                                  code.IntegerLiteral(0)),
+                      code.Assign(code.VariableDecl("kept", code.IntegerType()),
+                                  code.IntegerLiteral(0)),
+                      self.columns_scan(
+                        code.IfStatement(condition,
+                          release + [ code.Inc(code.SimpleVariable("removed")) ],
+                          keep    + [ code.Inc(code.SimpleVariable("kept")) ]
+                        )
+                      ),
+                      code.Assign(code.ObjectProperty("list", "size"),
+                                  code.SimpleVariable("kept")),
+                      code.Return(code.SimpleVariable("removed"))
+                    ])
+          ).tag(name)
+    ), True)
+
+  def create_columns_clear(self, type, type_name, matchers, arguments, key):
+    [name, function] = self.specialized(key, "columns_of_" + type_name + "s_clear")
+    if not function is None: return (function, True)
+
+    params = [ code.Parameter("list", RefType(self.prepare_columns_type(type_name))) ]
+
+    index   = code.SimpleVariable("index")
+    release = [ code.FunctionCall("free_" + str(prop.type.name),
+                                  [ self.column(prop.name.name, index) ])
+                for prop in self.array_elements(type_name)
+                if isinstance(prop.type, code.ObjectType) ]
+    body = [ self.columns_scan(*release) ] if len(release) > 0 else []
+    body.append(code.Assign(code.ObjectProperty("list", "size"),
+                            code.IntegerLiteral(0)))
+
+    return (self.add_list_function(
+      code.Function(name, type=code.VoidType(), params=params)
+          .contains(*body).tag(name)
+    ), True)
+
+  # hash tables: open addressing with linear probing over a table of pointers to
+  # tuples. removed tuples leave a pointer to a sentinel tuple in their slot,
+  # that is skipped by lookups, and reused by insertions. tables are rebuilt,
+  # when they are filled for three quarters, including removed slots. as long
+  # as no tuple was inserted with the key of another one, removal stops at the
+  # first match.
+
+  def prepare_hash_type(self, type_name):
+    name = hash_of(type_name)
+    if self.symbols.declared(name) is None:
+      struct = code.StructuredType(name)
+      struct.append(code.Property("slots",
+                                  RefType(RefType(code.NamedType(type_name)))),
+                    code.Property("size",       code.IntegerType()),
+                    code.Property("used",       code.IntegerType()),
+                    code.Property("capacity",   code.IntegerType()),
+                    code.Property("duplicates", code.IntegerType()))
+      module = self.symbols.module("lists")
+      module.select("def").append(self.symbols.declare(struct))
+      module.select("dec").append(
+        code.VariableDecl(type_name[:-2] + "_deleted", code.NamedType(type_name))
+      )
+    return code.NamedType(name + "_t")
+
+  def hashed_name(self, type_name, keys):
+    return "hashed_" + type_name + "s_on_" + "_".join([ str(key) for key in keys ])
+
+  def deleted(self, type_name):
+    return AddressOf(code.SimpleVariable(type_name[:-2] + "_deleted"))
+
+  def slot(self, index="index"):
+    # list->slots[index]
+    if isinstance(index, str): index = code.SimpleVariable(index)
+    return code.ListVariable(code.ObjectProperty("list", "slots"), index)
+
+  def next_slot(self):
+    # index = ((index + 1) % list->capacity)
+    return code.Assign(code.SimpleVariable("index"),
+                       code.Modulo(code.Plus(code.SimpleVariable("index"),
+                                             code.IntegerLiteral(1)),
+                                   code.ObjectProperty("list", "capacity")))
+
+  def prepare_hash_functions(self, type_name, keys):
+    """
+    Creates the hash function for the keys of a tuple type and the function
+    inserting tuples into a hash table, returning their names.
+    """
+    prefix = self.hashed_name(type_name, keys)
+    hasher = "hash_" + type_name + "s_on_" + "_".join([ str(key) for key in keys ])
+    if not self.symbols.declared(hasher) is None: return (hasher, prefix + "_insert")
+
+    properties = self.array_elements(type_name)
+    result     = code.SimpleVariable("hash")
+    params     = []
+    body       = [ code.Assign(code.VariableDecl("hash",
+                                                 code.UnsignedIntegerType()),
+                               code.IntegerLiteral(17)) ]
+    for key in keys:
+      prop  = properties[key]
+      value = code.SimpleVariable(prop.name.name)
+      if isinstance(prop.type, code.ObjectType):
+        value = code.FunctionCall("hash_" + str(prop.type.name), [value],
+                                  type=code.UnsignedIntegerType())
+      params.append(code.Parameter(prop.name.name, prop.type))
+      body.append(code.Assign(result,
+                              code.Plus(code.Mult(result, code.IntegerLiteral(31)),
+                                        value)))
+    # mix all bits into the lower ones, that select the slot, so that similar
+    # keys don't end up in a single cluster (lowbias32 of hash-prospector, its
+    # multipliers fit an int, keeping the multiplication unsigned)
+    for shift, multiplier in [ (16, 0x21f0aaad), (15, 0x735a2d97), (15, None) ]:
+      body.append(code.Assign(result,
+                              code.BitXor(result, code.ShiftRight(result, shift))))
+      if not multiplier is None:
+        body.append(code.Assign(result,
+                                code.Mult(result, code.IntegerLiteral(multiplier))))
+    body.append(code.Return(result))
+    self.add_list_function(
+      code.Function(hasher, type=code.UnsignedIntegerType(), params=params)
+          .contains(*body).tag(hasher)
+    )
+
+    # insert the item in the first removed or empty slot, counting the tuples
+    # with the same key that are passed while probing up to an empty slot
+    item   = code.SimpleVariable("item")
+    iter   = code.SimpleVariable("iter")
+    reuse  = code.SimpleVariable("reuse")
+    values = [ code.ObjectProperty("item", properties[key].name.name)
+               for key in keys ]
+    same   = None
+    for key in keys:
+      name = properties[key].name.name
+      test = self.equal_elements(properties[key], code.ObjectProperty("iter", name),
+                                                  code.ObjectProperty("item", name))
+      same = test if same is None else code.And(same, test)
+    insert = prefix + "_insert"
+    self.add_list_function(
+      code.Function(insert, type=code.VoidType(), params=[
+        code.Parameter("list", RefType(self.prepare_hash_type(type_name))),
+        code.Parameter("item", RefType(code.NamedType(type_name)))
+      ]).contains(
+        code.Assign(code.VariableDecl("index", code.IntegerType()),
+                    code.Modulo(code.FunctionCall(hasher, values,
+                                                  type=code.UnsignedIntegerType()),
+                                code.ObjectProperty("list", "capacity"))),
+        code.Assign(code.VariableDecl("reuse", code.IntegerType()),
+                    code.IntegerLiteral(-1)),
+        code.Assign(code.VariableDecl("iter", RefType(code.NamedType(type_name))),
+                    self.slot()),
+        code.WhileDo(code.NotEquals(iter, Null())).contains(
+          code.IfStatement(code.Equals(iter, self.deleted(type_name)), [
+            code.IfStatement(code.LT(reuse, code.IntegerLiteral(0)), [
+              code.Assign(reuse, code.SimpleVariable("index"))
+            ])
+          ], [
+            code.IfStatement(same, [
+              code.Inc(code.ObjectProperty("list", "duplicates"))
+            ])
+          ]),
+          self.next_slot(),
+          code.Assign(iter, self.slot())
+        ),
+        code.IfStatement(code.LT(reuse, code.IntegerLiteral(0)), [
+          code.Assign(reuse, code.SimpleVariable("index")),
+          code.Inc(code.ObjectProperty("list", "used"))
+        ]),
+        code.Assign(self.slot("reuse"), item),
+        code.Inc(code.ObjectProperty("list", "size"))
+      ).tag(insert)
+    )
+    return (hasher, insert)
+
+  def equal_elements(self, prop, left, right):
+    if isinstance(prop.type, code.ObjectType):
+      return code.FunctionCall("equal_" + str(prop.type.name), [ left, right ],
+                               type=code.BooleanType())
+    return code.Equals(left, right)
+
+  def hash_lookup(self, type_name, keys, matchers, condition, found, empty):
+    """
+    Returns the statements probing a hash table for the tuples that match the
+    matchers, executing the found statements for each of them. If the table is
+    empty, the empty statement is executed.
+    """
+    [hasher, insert] = self.prepare_hash_functions(type_name, keys)
+    values = []
+    args   = 0
+    for index, matcher in enumerate(matchers):
+      if matcher is None:
+        if index in keys: values.append(code.SimpleVariable("arg_" + str(args)))
+        args += 1
+      elif index in keys:
+        values.append(copy.deepcopy(matcher.expression))
+    iter = code.SimpleVariable("iter")
+    return [
+      code.IfStatement(code.Equals(code.ObjectProperty("list", "capacity"),
+                                   code.IntegerLiteral(0)), [ empty ]),
+      code.Assign(code.VariableDecl("index", code.IntegerType()),
+                  code.Modulo(code.FunctionCall(hasher, values,
+                                                type=code.UnsignedIntegerType()),
+                              code.ObjectProperty("list", "capacity"))),
+      code.Assign(code.VariableDecl("iter", RefType(code.NamedType(type_name))),
+                  self.slot()),
+      code.WhileDo(code.NotEquals(iter, Null())).contains(
+        code.IfStatement(code.And(code.NotEquals(iter, self.deleted(type_name)),
+                                  condition), found),
+        self.next_slot(),
+        code.Assign(iter, self.slot())
+      )
+    ]
+
+  def hash_params(self, type_name, arguments):
+    params = [ code.Parameter("list", RefType(self.prepare_hash_type(type_name))) ]
+    for index, arg in enumerate(arguments):
+      params.append(code.Parameter("arg_" + str(index),
+                                   code.ObjectType(arg.info.name)))
+    return params
+
+  def create_hash_contains(self, type, type_name, matchers, arguments, key, keys):
+    [condition, suffix] = self.transform_matchers_into_condition(matchers, arguments)
+    [name, function] = self.specialized(key,
+                          self.hashed_name(type_name, keys) + "_contains" + suffix)
+    if not function is None: return (function, True)
+
+    params = self.hash_params(type_name, arguments)
+    body   = self.hash_lookup(type_name, keys, matchers, condition,
+                              [ code.Return(code.BooleanLiteral(True)) ],
+                              code.Return(code.BooleanLiteral(False)))
+    body.append(code.Return(code.BooleanLiteral(False)))
+
+    return (self.add_list_function(
+      code.Function(name, type=code.BooleanType(), params=params)
+          .contains(*body).tag(name)
+    ), True)
+
+  def create_hash_push(self, type, type_name, matchers, arguments, key, keys):
+    [name, function] = self.specialized(key,
+                                        self.hashed_name(type_name, keys) + "_push")
+    if not function is None: return (function, True)
+
+    [hasher, insert] = self.prepare_hash_functions(type_name, keys)
+    params = [ code.Parameter("list", RefType(self.prepare_hash_type(type_name))),
+               code.Parameter("item", RefType(code.NamedType(type_name))) ]
+
+    def list_property(name): return code.ObjectProperty("list", name)
+    slots = code.SimpleVariable("slots")
+    # rebuild the table, sized for twice the number of tuples, when needed
+    rebuild = [
+      code.Assign(code.VariableDecl("slots",
+                                    RefType(RefType(code.NamedType(type_name)))),
+                  list_property("slots")),
+      code.Assign(code.VariableDecl("capacity", code.IntegerType()),
+                  list_property("capacity")),
+      code.Assign(list_property("capacity"),
+                  code.Plus(code.Mult(list_property("size"),
+                                      code.IntegerLiteral(2)),
+                            code.IntegerLiteral(8))),
+      code.Assign(list_property("slots"),
+        code.FunctionCall("calloc", type=RefType(RefType(code.NamedType(type_name))),
+          arguments=[ list_property("capacity"),
+                      code.FunctionCall("sizeof", type=code.IntegerType(),
+                                        arguments=[Deref(slots)]) ])),
+      code.Assign(list_property("size"), code.IntegerLiteral(0)),
+      code.Assign(list_property("used"), code.IntegerLiteral(0)),
+      code.Assign(list_property("duplicates"), code.IntegerLiteral(0)),
+      code.For(code.Assign(code.VariableDecl("index", code.IntegerType()),
+                           code.IntegerLiteral(0)),
+               code.LT(code.SimpleVariable("index"),
+                       code.SimpleVariable("capacity")),
+               code.Inc(code.SimpleVariable("index"))).contains(
+        code.IfStatement(
+          code.And(
+            code.NotEquals(code.ListVariable(slots, code.SimpleVariable("index")),
+                           Null()),
+            code.NotEquals(code.ListVariable(slots, code.SimpleVariable("index")),
+                           self.deleted(type_name))), [
+          code.FunctionCall(insert, [
+            code.SimpleVariable("list"),
+            code.ListVariable(slots, code.SimpleVariable("index"))
+          ])
+        ])
+      ),
+      code.FunctionCall("free", [ slots ])
+    ]
+
+    return (self.add_list_function(
+      code.Function(name, type=code.VoidType(), params=params).contains(
+        code.IfStatement(
+          code.GT(code.Mult(code.Plus(list_property("used"),
+                                      code.IntegerLiteral(1)),
+                            code.IntegerLiteral(4)),
+                  code.Mult(list_property("capacity"), code.IntegerLiteral(3))),
+          rebuild),
+        code.FunctionCall(insert, [ code.SimpleVariable("list"),
+                                    code.SimpleVariable("item") ])
+      ).tag(name)
+    ), True)
+
+  def create_hash_remove(self, type, type_name, matchers, arguments, key, keys):
+    [condition, suffix] = self.transform_matchers_into_condition(matchers, arguments)
+    [name, function] = self.specialized(key,
+                          self.hashed_name(type_name, keys) + "_remove" + suffix)
+    if not function is None: return (function, True)
+
+    params  = self.hash_params(type_name, arguments)
+    removed = code.SimpleVariable("removed")
+    body    = [ code.Assign(code.VariableDecl("removed", code.IntegerType()),
+                            code.IntegerLiteral(0)) ]
+    found   = [
+      code.Assign(self.slot(), self.deleted(type_name)),
+      code.FunctionCall("free_" + type_name, [ code.SimpleVariable("iter") ]),
+      code.Dec(code.ObjectProperty("list", "size")),
+      code.Inc(removed)
+    ]
+    # if the key is bound and unique, no other tuple can match
+    if all([ matchers[key] is None or matchers[key].comp.operator == "=="
+             for key in keys ]):
+      found.append(code.IfStatement(
+        code.Equals(code.ObjectProperty("list", "duplicates"),
+                    code.IntegerLiteral(0)),
+        [ code.Return(removed) ]))
+    body.extend(self.hash_lookup(type_name, keys, matchers, condition, found,
+                                 code.Return(removed)))
+    body.append(code.Return(removed))
+
+    return (self.add_list_function(
+      code.Function(name, type=code.IntegerType(), params=params)
+          .contains(*body).tag(name)
+    ), True)
+
+  def create_hash_clear(self, type, type_name, matchers, arguments, key, keys):
+    [name, function] = self.specialized(key,
+                                        self.hashed_name(type_name, keys) + "_clear")
+    if not function is None: return (function, True)
+
+    params = [ code.Parameter("list", RefType(self.prepare_hash_type(type_name))) ]
+    return (self.add_list_function(
+      code.Function(name, type=code.VoidType(), params=params).contains(
+        code.For(code.Assign(code.VariableDecl("index", code.IntegerType()),
+                             code.IntegerLiteral(0)),
+                 code.LT(code.SimpleVariable("index"),
+                         code.ObjectProperty("list", "capacity")),
+                 code.Inc(code.SimpleVariable("index"))).contains(
+          code.IfStatement(code.And(code.NotEquals(self.slot(), Null()),
+                                    code.NotEquals(self.slot(),
+                                                   self.deleted(type_name))), [
+            code.FunctionCall("free_" + type_name, [ self.slot() ])
+          ]),
+          code.Assign(self.slot(), Null())
+        ),
+        code.Assign(code.ObjectProperty("list", "size"), code.IntegerLiteral(0)),
+        code.Assign(code.ObjectProperty("list", "used"), code.IntegerLiteral(0)),
+        code.Assign(code.ObjectProperty("list", "duplicates"),
+                    code.IntegerLiteral(0))
+      ).tag(name)
+    ), True)
+
+  # sorted arrays: arrays, kept in ascending order of one element. the elements
+  # that match a range form a prefix or suffix of the array, that is found
+  # using a binary search.
+
+  def sorted_name(self, type_name, keys):
+    return "sorted_" + type_name + "s_on_" + str(keys[0])
+
+  def prepare_sorted_bound(self, type_name, keys):
+    """
+    Creates the function returning the number of elements that are less than (or
+    equal to, if inclusive) a value, returning its name.
+    """
+    name = self.sorted_name(type_name, keys) + "_bound"
+    if not self.symbols.declared(name) is None: return name
+
+    definitions = self.symbols.module("lists").select("def")
+    if not any([ isinstance(child, code.Import) and \
+                 child.imported == "<string.h>" for child in definitions ]):
+      definitions.append(code.Import("<string.h>")).stick_top()   # memmove
+
+    prop   = self.array_elements(type_name)[keys[0]]
+    low    = code.SimpleVariable("low")
+    high   = code.SimpleVariable("high")
+    middle = code.SimpleVariable("middle")
+    value  = code.ObjectProperty("item", prop.name.name)
+    self.add_list_function(
+      code.Function(name, type=code.IntegerType(), params=[
+        code.Parameter("list", RefType(self.prepare_array_type(type_name))),
+        code.Parameter("value", prop.type),
+        code.Parameter("inclusive", code.BooleanType())
+      ]).contains(
+        code.Assign(code.VariableDecl("low", code.IntegerType()),
+                    code.IntegerLiteral(0)),
+        code.Assign(code.VariableDecl("high", code.IntegerType()),
+                    code.ObjectProperty("list", "size")),
+        code.WhileDo(code.LT(low, high)).contains(
+          code.Assign(code.VariableDecl("middle", code.IntegerType()),
+                      code.Div(code.Plus(low, high), code.IntegerLiteral(2))),
+          code.Assign(code.VariableDecl("item", RefType(code.NamedType(type_name))),
+                      AddressOf(self.array_item(middle))),
+          code.IfStatement(
+            code.Or(code.LT(value, code.SimpleVariable("value")),
+                    code.And(code.SimpleVariable("inclusive"),
+                             code.Equals(value, code.SimpleVariable("value")))),
+            [ code.Assign(low, code.Plus(middle, code.IntegerLiteral(1))) ],
+            [ code.Assign(high, middle) ]
+          )
+        ),
+        code.Return(low)
+      ).tag(name)
+    )
+    return name
+
+  def sorted_range(self, type_name, keys, matchers):
+    """
+    Returns the statements computing the start and end of the range of elements
+    that match the matchers.
+    """
+    bound = self.prepare_sorted_bound(type_name, keys)
+    def count(inclusive):
+      return code.FunctionCall(bound, [ code.SimpleVariable("list"),
+                                        code.SimpleVariable("value"),
+                                        code.BooleanLiteral(inclusive) ],
+                               type=code.IntegerType())
+    size  = code.ObjectProperty("list", "size")
+    range = [ code.IntegerLiteral(0), size ]
+    body  = []
+    for matcher in matchers:
+      if wildcard(matcher): continue
+      prop = self.array_elements(type_name)[keys[0]]
+      body.append(code.Assign(code.VariableDecl("value", prop.type),
+                              matcher.expression))
+      range = {
+        "<"  : lambda: [ code.IntegerLiteral(0), count(False) ],
+        "<=" : lambda: [ code.IntegerLiteral(0), count(True)  ],
+        ">"  : lambda: [ count(True),  size ],
+        ">=" : lambda: [ count(False), size ]
+      }[matcher.comp.operator]()
+    return body + [
+      code.Assign(code.VariableDecl("start", code.IntegerType()), range[0]),
+      code.Assign(code.VariableDecl("end",   code.IntegerType()), range[1])
+    ]
+
+  def memmove(self, type_name, target, source, count):
+    # memmove(&list->data[target], &list->data[source], count * sizeof(tuple))
+    return code.FunctionCall("memmove", [
+      AddressOf(self.array_item(target)), AddressOf(self.array_item(source)),
+      code.Mult(count, code.FunctionCall("sizeof", type=code.IntegerType(),
+                                         arguments=[code.SimpleVariable(type_name)]))
+    ])
+
+  def create_sorted_contains(self, type, type_name, matchers, arguments, key, keys):
+    [condition, suffix] = self.transform_matchers_into_condition(matchers, arguments)
+    [name, function] = self.specialized(key,
+                          self.sorted_name(type_name, keys) + "_contains" + suffix)
+    if not function is None: return (function, True)
+
+    params = [ code.Parameter("list", RefType(self.prepare_array_type(type_name))) ]
+    body   = self.sorted_range(type_name, keys, matchers)
+    body.append(code.Return(code.LT(code.SimpleVariable("start"),
+                                    code.SimpleVariable("end"))))
+
+    return (self.add_list_function(
+      code.Function(name, type=code.BooleanType(), params=params)
+          .contains(*body).tag(name)
+    ), True)
+
+  def create_sorted_push(self, type, type_name, matchers, arguments, key, keys,
+                               owned=False):
+    [name, function] = self.specialized(key, self.sorted_name(type_name, keys) +
+                                             ("_adopt" if owned else "_push"))
+    if not function is None: return (function, True)
+
+    bound  = self.prepare_sorted_bound(type_name, keys)
+    params = [ code.Parameter("list", RefType(self.prepare_array_type(type_name))) ]
+    index  = code.SimpleVariable("index")
+    # insert after all elements that are less than or equal to the new one
+    body   = self.array_push(type_name, params, index, [
+      code.Assign(code.VariableDecl("index", code.IntegerType()),
+        code.FunctionCall(bound, [
+          code.SimpleVariable("list"),
+          code.SimpleVariable(self.array_elements(type_name)[keys[0]].name.name),
+          code.BooleanLiteral(True)
+        ], type=code.IntegerType())),
+      self.memmove(type_name, code.Plus(index, code.IntegerLiteral(1)), index,
+                   code.Minus(code.ObjectProperty("list", "size"), index))
+    ])
+
+    return (self.add_list_function(
+      code.Function(name, type=code.VoidType(), params=params)
+          .contains(*body).tag(name)
+    ), True)
+
+  def create_sorted_remove(self, type, type_name, matchers, arguments, key, keys):
+    [condition, suffix] = self.transform_matchers_into_condition(matchers, arguments)
+    [name, function] = self.specialized(key,
+                          self.sorted_name(type_name, keys) + "_remove" + suffix)
+    if not function is None: return (function, True)
+
+    params  = [ code.Parameter("list", RefType(self.prepare_array_type(type_name))) ]
+    start   = code.SimpleVariable("start")
+    end     = code.SimpleVariable("end")
+    size    = code.ObjectProperty("list", "size")
+    removed = code.Minus(end, start)
+    body    = self.sorted_range(type_name, keys, matchers)
+    # removed elements only need their objects to be freed
+    release = [ code.FunctionCall("free_" + str(prop.type.name),
+                                  [ code.ObjectProperty("iter", prop.name.name) ])
+                for prop in self.array_elements(type_name)
+                if isinstance(prop.type, code.ObjectType) ]
+    if len(release) > 0:
+      body.append(
+        code.For(code.Assign(code.VariableDecl("index", code.IntegerType()),
+                             start),
+                 code.LT(code.SimpleVariable("index"), end),
+                 code.Inc(code.SimpleVariable("index"))).contains(
+          code.Assign(code.VariableDecl("iter",
+                                        RefType(code.NamedType(type_name))),
+                      AddressOf(self.array_item("index"))),
+          *release
+        )
+      )
+    # drop the range in one move
+    body.extend([
+      self.memmove(type_name, start, end, code.Minus(size, end)),
+      code.Assign(size, code.Minus(size, removed)),
+      code.Return(removed)
+    ])
+
+    return (self.add_list_function(
+      code.Function(name, type=code.IntegerType(), params=params)
+          .contains(*body).tag(name)
+    ), True)
+
+  def transform_matchers_into_condition(self, matchers, arguments, element=None):
+    """
+    Returns a condition implementing the matchers, along with a suffix for the
+    name of the function using it. Elements are accessed through iter, unless an
+    element function returns an alternative expression for each index.
+    """
+    if element is None:
+      element = lambda index: code.ObjectProperty("iter", "elem_" + str(index))
     suffix = ""
     conditions = []
     args = 0
@@ -508,7 +2367,7 @@ class Transformer(language.Visitor):
           code.FunctionCall("equal_"+arg_type, type=code.BooleanType(),
             arguments=[
               code.SimpleVariable("arg_"+str(args)),
-              code.ObjectProperty("iter", "elem_" + str(idx)),
+              element(idx),
             ]
           )
         )
@@ -522,8 +2381,7 @@ class Transformer(language.Visitor):
           ">=" : code.GTEQ,
           "==" : code.Equals,
           "!=" : code.NotEquals
-        }[matcher.comp.operator](code.ObjectProperty("iter", "elem_"+str(idx)),
-                                 matcher.expression)
+        }[matcher.comp.operator](element(idx), matcher.expression)
         )
     # join conditions together with AND (TODO: should have factory method)
     if len(conditions) < 1:
@@ -539,14 +2397,27 @@ class Transformer(language.Visitor):
     return (conditions, suffix)
 
 class Generic(Platform):
+  types = {
+    code.ByteType            : "char",
+    code.BooleanType         : "int",
+    code.IntegerType         : "int",
+    code.UnsignedIntegerType : "unsigned int",
+    code.FloatType           : "float",
+    code.LongType            : "long",
+    code.UnsignedLongType    : "unsigned long"
+  }
+
   def type(self, type):
-    return {
-      "ByteType"    : "char",
-      "BooleanType" : "int",
-      "IntegerType" : "int",
-      "FloatType"   : "float",
-      "LongType"    : "long"
-    }[str(type)]
+    if isstring(type): return type        # named types, e.g. of tuples
+    return self.types[type.__class__]
+
+  def integer(self, range, fast=False):
+    """
+    Returns the stdint type for integers with values in range: the narrowest
+    exact-width one to store them, or the fastest one that is at least as wide.
+    """
+    return ("" if range[0] < 0 else "u") + "int" + ("_fast" if fast else "") + \
+           str(self.width(range)) + "_t"
 
 class Dumper(language.Dumper):
   """
@@ -564,7 +2435,8 @@ class Dumper(language.Dumper):
 
   @stacked
   def visit_Function(self, function):
-    return function.type.accept(self) + " " + function.name + \
+    return ("static inline " if "inline" in function.tags else "") + \
+           function.type.accept(self) + " " + function.name + \
            "(" + (", ".join([param.accept(self) for param in function.params]) \
                    if len(function.params) else "void") + ") " + \
            "{\n" + \
@@ -605,7 +2477,11 @@ class Dumper(language.Dumper):
 
   @stacked
   def visit_ShiftLeft(self, exp):
-    return exp.var.accept(self) + " >> " + str(exp.amount);
+    return "(" + exp.var.accept(self) + " << " + str(exp.amount) + ")"
+
+  @stacked
+  def visit_ShiftRight(self, exp):
+    return "(" + exp.var.accept(self) + " >> " + str(exp.amount) + ")"
 
   @stacked
   def visit_Assign(self, stmt):
@@ -662,14 +2538,32 @@ class Dumper(language.Dumper):
   def visit_FloatType(self, type):
     return self.platform.type(type)
 
+  def local(self):
+    """
+    Returns True when dumping a scalar local, parameter or return value of a
+    function, but not a struct, array or pointer, which refer to stored values.
+    """
+    return any([ isinstance(node, code.Function) for node in self.stack ]) and \
+       not any([ isinstance(node, (code.StructuredType, code.AmountType, RefType))
+                 for node in self.stack ])
+
   @stacked
   def visit_IntegerType(self, type):
-    return self.platform.type(type)
+    if type.range is None: return self.platform.type(type)
+    return self.platform.integer(type.range, fast=self.local())
 
   @stacked
   def visit_LongType(self, type):
     return self.platform.type(type)
 
+  @stacked
+  def visit_UnsignedIntegerType(self, type):
+    return self.visit_IntegerType(type)
+
+  @stacked
+  def visit_UnsignedLongType(self, type):
+    return self.platform.type(type)
+
   @stacked
   def visit_BooleanType(self, type):
     return self.platform.type(type)
@@ -680,6 +2574,12 @@ class Dumper(language.Dumper):
 
   @stacked
   def visit_ManyType(self, type):
+    if layout(type, self.platform) in [ "array", "sorted" ]:
+      return array_of(type.type.accept(self)) + "_t"
+    if layout(type, self.platform) == "columns":
+      return columns_of(type.type.accept(self)) + "_t"
+    if layout(type, self.platform) == "hashed":
+      return hash_of(type.type.accept(self)) + "_t"
     return type.type.accept(self) + "*"
 
   @stacked
@@ -709,6 +2609,7 @@ class Dumper(language.Dumper):
   def visit_Property(self, prop):
     return prop.type.accept(self) + " " + prop.name.accept(self) + \
       ("" if not isinstance(prop.type, code.AmountType) else "[" + str(prop.type.size) +"]") + \
+      (" : 1" if "bitfield" in prop.tags else "") + \
       ";"
 
   # Fragments
@@ -776,6 +2677,14 @@ class Dumper(language.Dumper):
            self.visit_children(loop) + \
            "\n} while(!(" + loop.condition.accept(self) + "));"
 
+  @stacked
+  def visit_For(self, loop):
+    return "for(" + loop.init.accept(self).rstrip(";") + "; " + \
+                    loop.check.accept(self) + "; " + \
+                    loop.change.accept(self).rstrip(";") + ") {\n" + \
+           self.visit_children(loop) + \
+           "\n}"
+
   # Calls
   
   @stacked
@@ -791,7 +2700,9 @@ class Dumper(language.Dumper):
 
   @stacked
   def visit_ListVariable(self, var):
-    return var.id.accept(self) + "[" + str(var.index) + "]"
+    index = var.index.accept(self) if isinstance(var.index, code.Expression) \
+                                   else str(var.index)
+    return var.id.accept(self) + "[" + index + "]"
 
   # Expressions
   
@@ -831,6 +2742,14 @@ class Dumper(language.Dumper):
   def visit_Modulo(self, op):
     return "(" + op.left.accept(self) + " % " + op.right.accept(self) + ")"
 
+  @stacked
+  def visit_BitAnd(self, op):
+    return "(" + op.left.accept(self) + " & " + op.right.accept(self) + ")"
+
+  @stacked
+  def visit_BitXor(self, op):
+    return "(" + op.left.accept(self) + " ^ " + op.right.accept(self) + ")"
+
   @stacked
   def visit_Return(self, op):
     return "return" + (" " + op.expression.accept(self) if not op.expression is None
@@ -849,7 +2768,7 @@ class Dumper(language.Dumper):
   def visit_VariableDecl(self, decl):
     type_quantifier = ""
     var_quantifier  = ""
-    inside_assign = isinstance(self.stack[-2], code.Assign)
+    inside_assign = len(self.stack) > 1 and isinstance(self.stack[-2], code.Assign)
     if isinstance(decl.type, code.AmountType):
       if inside_assign: type_quantifier = "*"
       else:             var_quantifier = "[" + str(decl.type.size) +"]"
@@ -870,6 +2789,51 @@ class Dumper(language.Dumper):
   def visit_Null(self, null):
     return "NULL"
 
+  @stacked
+  def visit_AtomConstant(self, atom):
+    return atom.name
+
+  @stacked
+  def visit_Atoms(self, atoms):
+    return "enum atoms {\n" + \
+           ",\n".join([ "atom_" + name + " = " + str(index + 1)
+                         for index, name in enumerate(atoms.atoms) ]) + \
+           "\n};\n" + \
+           "typedef " + atoms.type.accept(self) + " atom_t;"
+
+  @stacked
+  def visit_Switch(self, switch):
+    def clause(label, statements):
+      ends = len(statements) > 0 and isinstance(statements[-1], code.Return)
+      return label + ":\n" + \
+             "".join([ stmt.accept(self) + "\n" for stmt in statements ]) + \
+             ("" if ends else "break;\n")
+    return "switch(" + switch.expression.accept(self) + ") {\n" + \
+           "".join([ clause("case " + literal_of(item).accept(self), consequence)
+                     for item, consequence in zip(switch.cases,
+                                                  switch.consequences) ]) + \
+           (clause("default", switch.default) if len(switch.default) else "") + \
+           "}"
+
+  @stacked
+  def visit_Table(self, table):
+    return "static const " + table.type.accept(self) + " " + table.name + \
+           "[] = { " + ", ".join([ value.accept(self) for value in table.values ]) + \
+           " };"
+
+  @stacked
+  def visit_ArrayLiteral(self, array):
+    return "(const " + array.type.accept(self) + "[]){ " + \
+           ", ".join([ value.accept(self) for value in array.values ]) + " }"
+
+  @stacked
+  def visit_AtomType(self, type):
+    return "atom_t"
+
+  @stacked
+  def visit_Statements(self, statements):
+    return self.visit_children(statements)
+
   @stacked
   def visit_AddressOf(self, address):
     return "&" + address.variable.accept(self)
@@ -913,13 +2877,58 @@ class Builder(language.Builder, Dumper):
   Visitor for CodeCanvas-based ASTs producing actual C code, and constructing
   files as needed.
   """
-  def __init__(self, output, platform=None):
+  def __init__(self, output, platform=None, sharding=None):
     language.Builder.__init__(self, output)
     Dumper.__init__(self, platform)
+    self.sharding = sharding
 
   def ext(self, section):
     return { "def": "h", "dec": "c" }[section]
 
+  def visit_Section(self, section):
+    """
+    With sharding, the functions of a dec section are split over shards, that
+    all include everything else of the section. Variables are defined in the
+    first shard and declared extern in the others.
+    """
+    if section.name != "dec" or self.sharding is None:
+      return language.Builder.visit_Section(self, section)
+    functions = [ (child, child.accept(self)) for child in section
+                  if isinstance(child, code.Function) and \
+                     not "inline" in child.tags ]
+    shards    = self.sharding.split(functions)
+    names     = []
+    for index, shard in enumerate(shards):
+      content = []
+      for child in section:
+        if isinstance(child, code.Function) and not "inline" in child.tags:
+          continue
+        content.append(("extern " if index > 0 and \
+                                     isinstance(child, code.VariableDecl) \
+                                  else "") + child.accept(self))
+      content.extend([ dumped for function, dumped in shard ])
+      content = "\n".join(content)
+      if content == "": continue
+      names.append(self.sharding.name(self.module.name, index, shard))
+      self.write(names[-1], self.transform_Section(section, content) + "\n")
+    if os.path.exists(self.output):
+      self.sharding.clean(self.output, self.module.name, names)
+
+  def write(self, name, content):
+    """
+    Writes a shard, unless it is unchanged, keeping its timestamp.
+    """
+    if not os.path.exists(self.output): os.makedirs(self.output)
+    file_name = os.path.join(self.output, name)
+    if os.path.exists(file_name):
+      file = open(file_name)
+      try:
+        if file.read() == content: return
+      finally: file.close()
+    file = open(file_name, "w+")
+    file.write(content)
+    file.close()
+
   def transform_Section(self, code, content):
     if code.name == "def":
       content = "#ifndef __" + self.module.name.replace("-", "_").upper() + "_H\n" + \
@@ -927,3 +2936,128 @@ class Builder(language.Builder, Dumper):
                 content + \
                 "\n\n#endif\n"
     return content
+
+class Sharding(object):
+  """
+  Splits the functions of a section into shards, with a budget of functions or
+  lines per shard. A shard ends after a function, if the hash of its name modulo
+  the budget is below its weight (1 function or its number of lines), or once
+  it exceeds twice the budget. Boundaries only depend on the functions around
+  them, so adding or removing a function only changes its own shard. Shards are
+  named after their first function.
+  """
+  def __init__(self, budget, by="functions"):
+    assert by in [ "functions", "lines" ], "Unknown sharding budget: " + by
+    self.budget = budget
+    self.by     = by
+
+  def weight(self, content):
+    return 1 if self.by == "functions" else content.count("\n") + 1
+
+  def hash(self, name):
+    return zlib.crc32(name) & 0xffffffff
+
+  def split(self, functions):
+    """
+    Returns lists of (function, content) tuples, given those of a section.
+    """
+    if sum([ self.weight(content) for function, content in functions ]) <= \
+       self.budget:
+      return [ functions ]
+    shards = [ [] ]
+    size   = 0
+    for function, content in functions:
+      weight = self.weight(content)
+      shards[-1].append((function, content))
+      size += weight
+      if self.hash(function.name) % self.budget < weight or \
+         size >= 2 * self.budget:
+        shards.append([])
+        size = 0
+    if len(shards[-1]) == 0: shards.pop()
+    return shards
+
+  def name(self, module, index, shard):
+    if index == 0: return module + ".c"
+    return module + "_" + "%08x" % self.hash(shard[0][0].name) + ".c"
+
+  def clean(self, output, module, names):
+    """
+    Removes shards of earlier builds that are no longer produced.
+    """
+    pattern = re.compile("^" + re.escape(module) + "_[0-9a-f]{8}\\.c$")
+    for name in os.listdir(output):
+      if pattern.match(name) and not name in names:
+        os.remove(os.path.join(output, name))
+
+class Amalgamation(Dumper):
+  """
+  Visitor for CodeCanvas-based ASTs producing a single C file (a unity build),
+  with the definitions and next the declarations of all modules, ordered by
+  their imports. All functions and variables, except the exported ones, get
+  internal linkage, allowing the compiler to inline them across modules.
+  """
+  def __init__(self, output, name="unity", exported=["main"], platform=None):
+    super(Amalgamation, self).__init__(platform)
+    self.output   = output
+    self.name     = name
+    self.exported = exported
+    self.modules  = []
+    self.included = set()
+
+  def imports(self, module):
+    return [ child.imported for section in module for child in section
+                            if isinstance(child, code.Import) ]
+
+  def order(self, unit):
+    """
+    Returns the modules of a unit, with imported modules before the modules that
+    import them. Cyclic imports are resolved in the order of the unit.
+    """
+    modules = dict([ (module.name, module) for module in unit ])
+    ordered = []
+    def visit(module, visiting):
+      if module.name in ordered or module.name in visiting: return
+      for name in self.imports(module):
+        if name in modules: visit(modules[name], visiting + [module.name])
+      ordered.append(module.name)
+    for module in unit: visit(module, [])
+    return [ modules[name] for name in ordered ]
+
+  def visit_Unit(self, unit):
+    modules       = self.order(unit)
+    self.modules  = [ module.name for module in modules ]
+    self.included = set()
+    parts = [ child.accept(self) for name in [ "def", "dec" ]
+                                 for module in modules
+                                 for section in module if section.name == name
+                                 for child in section ]
+    if not os.path.exists(self.output): os.makedirs(self.output)
+    file = open(os.path.join(self.output, self.name + ".c"), "w+")
+    file.write("\n".join([ part for part in parts if part != "" ]) + "\n")
+    file.close()
+
+  def linkage(self, name):
+    return "" if name in self.exported else "static "
+
+  def visit_Import(self, importer):
+    """
+    Imports of modules of the unit are resolved by the amalgamation, others are
+    included once.
+    """
+    if importer.imported in self.modules or importer.imported in self.included:
+      return ""
+    self.included.add(importer.imported)
+    return super(Amalgamation, self).visit_Import(importer)
+
+  def visit_Function(self, function):
+    linkage = "" if "inline" in function.tags else self.linkage(function.name)
+    return linkage + super(Amalgamation, self).visit_Function(function)
+
+  def visit_Prototype(self, function):
+    return self.linkage(function.name) + \
+           super(Amalgamation, self).visit_Prototype(function)
+
+  def visit_VariableDecl(self, decl):
+    linkage = self.linkage(decl.name) if len(self.stack) == 0 else ""
+    return linkage + super(Amalgamation, self).visit_VariableDecl(decl)
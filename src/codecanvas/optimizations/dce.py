@@ -0,0 +1,143 @@
+# dce.py
+# dead code elimination: unreachable statements and unused generated functions
+# author: Christophe VG
+
+from codecanvas.base import Code
+
+import codecanvas.instructions as code
+import codecanvas.structure    as structure
+import codecanvas.passes       as passes
+
+def terminates(statement):
+  """
+  Returns True if control never continues after the statement.
+  """
+  if isinstance(statement, code.Return): return True
+  if isinstance(statement, code.IfStatement):
+    return len(statement.true_clause) > 0 and \
+           len(statement.false_clause) > 0 and \
+           terminates(statement.true_clause[-1]) and \
+           terminates(statement.false_clause[-1])
+  return False
+
+class UnreachableCode(passes.Pass):
+  """
+  Pass removing statements that follow a statement that terminates, e.g. a
+  Return, in functions, clauses of IfStatements and loop bodies.
+  """
+  handles = [ code.Function, code.IfStatement, code.CondLoop, code.For ]
+
+  def __init__(self, name="unreachable", after=None, before=None):
+    super(UnreachableCode, self).__init__(name, after, before)
+    self.removed = []
+
+  def prepare(self, tree):
+    self.removed = []
+
+  def reachable(self, statements):
+    for index, statement in enumerate(statements):
+      if terminates(statement):
+        self.removed.extend(statements[index+1:])
+        return statements[:index+1]
+    return statements
+
+  def visit_IfStatement(self, statement):
+    statement.true_clause  = self.reachable(statement.true_clause)
+    statement.false_clause = self.reachable(statement.false_clause)
+
+  def visit_Prototype(self, prototype): pass
+
+  def visit_Code(self, parent):
+    keep = self.reachable(parent.children)
+    if len(keep) == len(parent): return
+    parent.sticking["top"]    = [c for c in parent.sticking["top"]    if c in keep]
+    parent.floating           = [c for c in parent.floating           if c in keep]
+    parent.sticking["bottom"] = [c for c in parent.sticking["bottom"] if c in keep]
+
+  def report(self):
+    return "removed " + str(len(self.removed)) + " unreachable statement(s)"
+
+def references(node):
+  """
+  Returns the names of all Identifiers that are referenced from node and its
+  descendants, without the names of the declared functions themselves.
+  """
+  names = set()
+  if isinstance(node, code.Identifier):
+    names.add(node.name)
+  elif isinstance(node, Code):
+    for key, value in vars(node).items():
+      if key in [ "_parent", "data", "tags" ]: continue
+      if key == "id" and isinstance(node, code.Function): continue
+      names.update(references(value))
+  elif isinstance(node, list) or isinstance(node, tuple):
+    for item in node: names.update(references(item))
+  elif isinstance(node, dict):
+    for value in node.values(): names.update(references(value))
+  return names
+
+class UnusedFunctions(passes.Pass):
+  """
+  Pass removing generated functions that aren't referenced, along with their
+  Prototypes. The call graph is built from all identifiers that are referenced
+  outside of the generated modules and followed through the generated
+  functions. The names of the removed functions are kept in removed.
+  """
+  fusable = False
+
+  def __init__(self, modules=["tuples", "lists"], name="unused",
+                     after=None, before=None):
+    super(UnusedFunctions, self).__init__(name, after, before)
+    self.modules = modules
+    self.removed = []
+
+  def declarations(self, unit, generated):
+    """
+    Yields the top-level declarations of all Modules, either generated or not.
+    """
+    for module in unit:
+      if not isinstance(module, structure.Module): continue
+      if (module.name in self.modules) != generated: continue
+      for section in module:
+        for child in section:
+          yield (section, child)
+
+  def run(self, unit):
+    self.removed = []
+    functions = {}
+    for section, child in self.declarations(unit, True):
+      if isinstance(child, code.Function) and \
+         not isinstance(child, code.Prototype):
+        functions[child.name] = child
+    if len(functions) < 1: return unit
+
+    # roots: everything that is referenced outside of the generated functions
+    pending = []
+    for child in unit:
+      if isinstance(child, structure.Module): continue
+      pending.extend(references(child))
+    for section, child in self.declarations(unit, False):
+      pending.extend(references(child))
+    for section, child in self.declarations(unit, True):
+      if not isinstance(child, code.Function):
+        pending.extend(references(child))
+
+    # follow references through the generated functions
+    used = set()
+    while len(pending) > 0:
+      name = pending.pop()
+      if name in used: continue
+      used.add(name)
+      if name in functions: pending.extend(references(functions[name]))
+
+    # prune functions and their prototypes
+    for section, child in list(self.declarations(unit, True)):
+      if isinstance(child, code.Function) and child.name in functions and \
+         not child.name in used:
+        section.remove_child(section.children.index(child))
+        if not child.name in self.removed: self.removed.append(child.name)
+    return unit
+
+  def report(self):
+    return "removed " + str(len(self.removed)) + " unused function(s): " + \
+           ", ".join(self.removed)
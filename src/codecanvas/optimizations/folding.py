@@ -0,0 +1,196 @@
+# folding.py
+# constant folding and algebraic simplification
+# author: Christophe VG
+
+import codecanvas.instructions as code
+import codecanvas.structure    as structure
+
+from codecanvas.rewrite import Rules, Pattern, Rewriter
+
+# helper functions
+
+def pure(expression):
+  """
+  Returns True if evaluating the expression has no side effects.
+  """
+  if isinstance(expression, code.BinOp):
+    return pure(expression.left) and pure(expression.right)
+  if isinstance(expression, code.UnOp):
+    return pure(expression.operand)
+  if isinstance(expression, code.FunctionCall):
+    return expression.pure and all([pure(arg) for arg in expression.arguments])
+  return isinstance(expression, code.Literal) or \
+         isinstance(expression, code.SimpleVariable) or \
+         isinstance(expression, code.Object) or \
+         isinstance(expression, code.ObjectProperty) or \
+         isinstance(expression, code.StructProperty)
+
+NUMBERS = (code.IntegerLiteral, code.ByteLiteral, code.FloatLiteral)
+
+def number(literal):
+  return isinstance(literal, NUMBERS)
+
+def divide(left, right):
+  # C integer division truncates towards zero
+  if isinstance(left, float) or isinstance(right, float): return left / right
+  quotient = abs(left) // abs(right)
+  return quotient if (left < 0) == (right < 0) else -quotient
+
+def remainder(left, right):
+  if isinstance(left, float) or isinstance(right, float): return None
+  return left - right * divide(left, right)
+
+ARITHMETIC = {
+  code.Plus   : lambda left, right: left + right,
+  code.Minus  : lambda left, right: left - right,
+  code.Mult   : lambda left, right: left * right,
+  code.Div    : divide,
+  code.Modulo : remainder
+}
+
+COMPARISONS = {
+  code.Equals    : lambda left, right: left == right,
+  code.NotEquals : lambda left, right: left != right,
+  code.LT        : lambda left, right: left <  right,
+  code.LTEQ      : lambda left, right: left <= right,
+  code.GT        : lambda left, right: left >  right,
+  code.GTEQ      : lambda left, right: left >= right
+}
+
+LOGICAL = {
+  code.And : lambda left, right: left and right,
+  code.Or  : lambda left, right: left or  right
+}
+
+def fold(op, left, right):
+  """
+  Computes the literal result of a binary operation on two literals, or None if
+  it can't be folded (safely).
+  """
+  clazz = op.__class__
+  if clazz in LOGICAL:
+    if isinstance(left, code.BooleanLiteral) and \
+       isinstance(right, code.BooleanLiteral):
+      return code.BooleanLiteral(LOGICAL[clazz](left.value, right.value))
+  elif clazz in COMPARISONS:
+    if (number(left) and number(right)) or \
+       (isinstance(left, code.BooleanLiteral) and \
+        isinstance(right, code.BooleanLiteral)):
+      return code.BooleanLiteral(COMPARISONS[clazz](left.value, right.value))
+  elif clazz in ARITHMETIC and number(left) and number(right):
+    if right.value == 0 and clazz in [code.Div, code.Modulo]: return None
+    result = ARITHMETIC[clazz](left.value, right.value)
+    if result is None: return None
+    if isinstance(left, code.FloatLiteral) or \
+       isinstance(right, code.FloatLiteral):
+      return code.FloatLiteral(float(result))
+    if isinstance(result, int) and -2**31 <= result < 2**31:
+      return code.IntegerLiteral(result)
+  return None
+
+def boolean(expression):
+  """
+  Returns True if the expression evaluates to 0 or 1: booleans, comparisons and
+  logical operations.
+  """
+  if isinstance(expression, code.BooleanLiteral): return True
+  if expression.__class__ in COMPARISONS or expression.__class__ in LOGICAL:
+    return True
+  if isinstance(expression, code.Not): return True
+  if isinstance(expression, code.SimpleVariable):
+    return isinstance(expression.info, code.BooleanType)
+  return isinstance(getattr(expression, "type", None), code.BooleanType)
+
+def normalized(expression):
+  """
+  Returns an expression that evaluates to 0 or 1, like a logical operation on
+  the given expression does.
+  """
+  if boolean(expression): return expression
+  return code.Not(code.Not(expression))
+
+def prune(statements, parent=None):
+  """
+  Replaces IfStatements with a constant condition by the statements of the
+  clause that is always taken. Returns the updated list of statements.
+  """
+  pruned = []
+  for statement in statements:
+    if isinstance(statement, code.IfStatement) and \
+       isinstance(statement.expression, code.BooleanLiteral):
+      if statement.expression.value: taken = statement.true_clause
+      else:                          taken = statement.false_clause
+      for child in taken:
+        if not parent is None: child._parent = parent
+      pruned.extend(taken)
+    else:
+      pruned.append(statement)
+  return pruned
+
+# folding rules
+
+rules = Rules()
+
+@rules.rule(code.BinOp, left=code.Literal, right=code.Literal)
+def fold_literals(folder, op):
+  return fold(op, op.left, op.right)
+
+@rules.rule(code.Not, operand=code.BooleanLiteral)
+def fold_not(folder, op):
+  return code.BooleanLiteral(not op.operand.value)
+
+@rules.rule(code.Not, operand=code.Not)
+def double_negation(folder, op):
+  # !!x normalizes x to 0 or 1, so it can only be dropped if x already is
+  if boolean(op.operand.operand): return op.operand.operand
+
+TRUE  = Pattern(code.BooleanLiteral, value=True)
+FALSE = Pattern(code.BooleanLiteral, value=False)
+
+# x && true, true && x, x || false, false || x (normalized to 0 or 1, like the
+# logical operation does, if x isn't already)
+rules.add(Pattern(code.And, right=TRUE),  lambda folder, op: normalized(op.left))
+rules.add(Pattern(code.And, left=TRUE),   lambda folder, op: normalized(op.right))
+rules.add(Pattern(code.Or,  right=FALSE), lambda folder, op: normalized(op.left))
+rules.add(Pattern(code.Or,  left=FALSE),  lambda folder, op: normalized(op.right))
+
+# false && x, true || x (short-circuited), x && false, x || true (if pure)
+rules.add(Pattern(code.And, left=FALSE),  lambda folder, op: op.left)
+rules.add(Pattern(code.Or,  left=TRUE),   lambda folder, op: op.left)
+rules.add(Pattern(code.And, right=FALSE),
+          lambda folder, op: op.right if pure(op.left) else None)
+rules.add(Pattern(code.Or,  right=TRUE),
+          lambda folder, op: op.right if pure(op.left) else None)
+
+for clazz in [code.IntegerLiteral, code.ByteLiteral]:
+  # x + 0, 0 + x, x - 0
+  rules.add(Pattern(code.Plus,  right=Pattern(clazz, value=0)), lambda f, op: op.left)
+  rules.add(Pattern(code.Plus,  left=Pattern(clazz, value=0)),  lambda f, op: op.right)
+  rules.add(Pattern(code.Minus, right=Pattern(clazz, value=0)), lambda f, op: op.left)
+  # x * 1, 1 * x, x / 1
+  rules.add(Pattern(code.Mult,  right=Pattern(clazz, value=1)), lambda f, op: op.left)
+  rules.add(Pattern(code.Mult,  left=Pattern(clazz, value=1)),  lambda f, op: op.right)
+  rules.add(Pattern(code.Div,   right=Pattern(clazz, value=1)), lambda f, op: op.left)
+
+# pruning of branches with constant conditions
+
+@rules.rule(code.IfStatement)
+def prune_clauses(folder, statement):
+  statement.true_clause  = prune(statement.true_clause)
+  statement.false_clause = prune(statement.false_clause)
+
+def prune_children(folder, parent):
+  parent.sticking["top"]    = prune(parent.sticking["top"],    parent)
+  parent.floating           = prune(parent.floating,           parent)
+  parent.sticking["bottom"] = prune(parent.sticking["bottom"], parent)
+
+for clazz in [structure.Section, code.Function, code.CondLoop, code.For]:
+  rules.add(Pattern(clazz), prune_children)
+
+class ConstantFolding(Rewriter):
+  """
+  Pass folding operations on literals, applying algebraic identities and
+  pruning branches of IfStatements with constant conditions.
+  """
+  def __init__(self, name="folding", after=None, before=None):
+    super(ConstantFolding, self).__init__(rules, name, after, before)
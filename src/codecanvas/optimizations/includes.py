@@ -0,0 +1,207 @@
+# includes.py
+# include analysis: imports of sections, based on the names they actually use
+# author: Christophe VG
+
+import re
+
+import codecanvas.instructions as code
+import codecanvas.structure    as structure
+import codecanvas.passes       as passes
+
+NAME = re.compile("[A-Za-z_][A-Za-z0-9_]*")
+
+KEYWORDS = set([ "auto", "break", "case", "char", "const", "continue", "default",
+                 "do", "double", "else", "enum", "extern", "float", "for",
+                 "goto", "if", "inline", "int", "long", "register", "return",
+                 "short", "signed", "sizeof", "static", "struct", "switch",
+                 "typedef", "union", "unsigned", "void", "volatile", "while" ])
+
+class Includes(passes.Pass):
+  """
+  Pass reducing the imports of all sections of a unit, based on the names that
+  are used by their (dumped) code:
+  - duplicate imports are removed,
+  - imports of headers with known names (the headers of the platform) that
+    aren't used are removed, or moved from the def to the dec section of a
+    module, adding them to the sections that include the module and use them,
+  - imports of modules of the unit that a dec section doesn't use are removed,
+  - imports that are already included through another import are removed.
+  Imports of unknown headers, or of modules that include them, are kept. The
+  depth of the include graph, before and after, is kept in depth.
+  """
+  fusable = False
+  after   = [ "transform" ]
+
+  def __init__(self, platform=None, name="includes", after=None, before=None):
+    super(Includes, self).__init__(name, after, before)
+    if platform is None:
+      import codecanvas.languages.C as C
+      platform = C.Generic()
+    self.platform = platform
+    self.removed  = []
+    self.moved    = []
+    self.depth    = (0, 0)
+
+  def run(self, unit):
+    import codecanvas.languages.C as C
+    self.dumper  = C.Dumper(self.platform)
+    self.modules = dict([ (module.name, module) for module in unit
+                          if isinstance(module, structure.Module) ])
+    self.removed = []
+    self.moved   = []
+    self.uses    = {}
+    for module in self.modules.values():
+      for section in module: self.uses[section] = self.used_by(section)
+    before = self.graph_depth()
+    for module in self.modules.values():
+      for section in module: self.remove_duplicates(section)
+    for module in self.modules.values(): self.move_headers(module)
+    for module in self.modules.values():
+      for section in module:
+        if section.name == "dec": self.remove_unused(section)
+    for module in self.modules.values():
+      for section in module: self.remove_redundant(section)
+    self.depth = (before, self.graph_depth())
+    return unit
+
+  # analysis
+
+  def used_by(self, section):
+    """
+    Returns the names that are used by the code of a section, apart from its
+    imports and the keywords of C.
+    """
+    names = set()
+    for child in section:
+      if isinstance(child, code.Import): continue
+      names.update(NAME.findall(child.accept(self.dumper)))
+    return names - KEYWORDS
+
+  def imports(self, section):
+    return [ child for child in section if isinstance(child, code.Import) ]
+
+  def header(self, name):
+    module = self.modules.get(name, None)
+    if module is None: return None
+    return module.select("def")
+
+  def known(self, name, visiting=()):
+    """
+    Returns True if all names that including a header provides are known: those
+    of headers of the platform and modules that only include known headers.
+    """
+    if name in self.platform.headers: return True
+    if name in visiting:              return True
+    header = self.header(name)
+    if header is None: return False
+    return all([ self.known(child.imported, visiting + (name,))
+                 for child in self.imports(header) ])
+
+  def provides(self, name, visiting=()):
+    """
+    Returns the names that are provided by including a header.
+    """
+    if name in self.platform.headers: return set(self.platform.headers[name])
+    header = self.header(name)
+    if header is None or name in visiting: return set()
+    names = set(self.uses[header])
+    for child in self.imports(header):
+      names.update(self.provides(child.imported, visiting + (name,)))
+    return names
+
+  def reachable(self, name, visiting=()):
+    """
+    Returns the names of all headers that are included by including a header.
+    """
+    header = self.header(name)
+    if header is None or name in visiting: return set()
+    names = set()
+    for child in self.imports(header):
+      names.add(child.imported)
+      names.update(self.reachable(child.imported, visiting + (name,)))
+    return names
+
+  def available(self, section):
+    """
+    Returns the names of all headers that are (indirectly) included by a
+    section.
+    """
+    names = set()
+    for child in self.imports(section):
+      names.add(child.imported)
+      names.update(self.reachable(child.imported))
+    return names
+
+  def graph_depth(self):
+    def depth(name, visiting=()):
+      header = self.header(name)
+      if header is None or name in visiting: return 1
+      return 1 + max([0] + [ depth(child.imported, visiting + (name,))
+                             for child in self.imports(header) ])
+    return max([0] + [ depth(child.imported)
+                       for module in self.modules.values()
+                       for section in module if section.name == "dec"
+                       for child in self.imports(section) ])
+
+  # transformations
+
+  def remove(self, section, child):
+    section.remove_child(section.children.index(child))
+    self.removed.append(child.imported)
+
+  def remove_duplicates(self, section):
+    seen = set()
+    for child in self.imports(section):
+      if child.imported in seen: self.remove(section, child)
+      seen.add(child.imported)
+
+  def move_headers(self, module):
+    """
+    Known headers that the def section of a module doesn't use, are imported by
+    the sections that include it and use them instead, e.g. its dec section.
+    """
+    header = module.select("def")
+    for child in self.imports(header):
+      name = child.imported
+      if not name in self.platform.headers: continue
+      if self.uses[header] & set(self.platform.headers[name]): continue
+      users = [ section for other in self.modules.values() for section in other
+                if not section is header and \
+                   module.name in self.available(section) and \
+                   self.uses[section] & set(self.platform.headers[name]) ]
+      header.remove_child(header.children.index(child))
+      for section in users:
+        if name in self.available(section): continue
+        section.append(code.Import(name)).stick_top()
+        self.moved.append((name, section._parent.name))
+      if not any([ section._parent is module for section in users ]):
+        self.removed.append(name)
+
+  def remove_unused(self, section):
+    """
+    Imports of known headers and modules that a dec section doesn't use, are
+    removed. Only the dec section of a module includes its own header.
+    """
+    for child in self.imports(section):
+      name = child.imported
+      if name == section._parent.name: continue
+      if not self.known(name): continue
+      if self.uses[section] & self.provides(name): continue
+      self.remove(section, child)
+
+  def remove_redundant(self, section):
+    """
+    Imports that are included through another import of the section, that isn't
+    included by them in turn, are removed.
+    """
+    for child in self.imports(section):
+      name = child.imported
+      if any([ name in self.reachable(other.imported) and \
+               not other.imported in self.reachable(name)
+               for other in self.imports(section) if not other is child ]):
+        self.remove(section, child)
+
+  def report(self):
+    return "removed " + str(len(self.removed)) + " import(s), moved " + \
+           str(len(self.moved)) + ", include depth " + \
+           str(self.depth[0]) + " -> " + str(self.depth[1])
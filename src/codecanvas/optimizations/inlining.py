@@ -0,0 +1,419 @@
+# inlining.py
+# inlining of small functions at their call sites
+# author: Christophe VG
+
+import copy
+
+from codecanvas.base import Code
+
+import codecanvas.instructions as code
+import codecanvas.structure    as structure
+import codecanvas.passes       as passes
+
+from codecanvas.optimizations.folding import pure
+from codecanvas.optimizations.dce     import references
+
+# helper functions
+
+SKIPPED = [ "_parent", "data", "tags" ]
+
+def nodes(node):
+  """
+  Yields all Code nodes below node, including node itself.
+  """
+  if isinstance(node, Code):
+    yield node
+    for key, value in vars(node).items():
+      if key in SKIPPED: continue
+      for child in nodes(value): yield child
+  elif isinstance(node, list) or isinstance(node, tuple):
+    for item in node:
+      for child in nodes(item): yield child
+  elif isinstance(node, dict):
+    for value in node.values():
+      for child in nodes(value): yield child
+
+def size(statements):
+  """
+  Returns the number of nodes of a list of statements, ignoring Identifiers and
+  Types, as an estimate of the size of the code that is generated for them.
+  """
+  return len([node for node in nodes(statements)
+                   if not isinstance(node, code.Identifier) and \
+                      not isinstance(node, code.Type)])
+
+def replace(node, replacement):
+  """
+  Replaces all nodes below node by the result of calling replacement on them,
+  bottom-up. If replacement returns None, the node is kept.
+  """
+  def update(value):
+    if isinstance(value, Code):
+      replace(value, replacement)
+      result = replacement(value)
+      return value if result is None else result
+    if isinstance(value, list):
+      for index, item in enumerate(value): value[index] = update(item)
+    elif isinstance(value, tuple):
+      return tuple([update(item) for item in value])
+    elif isinstance(value, dict):
+      for key in value: value[key] = update(value[key])
+    return value
+
+  for key, value in vars(node).items():
+    if key in SKIPPED: continue
+    setattr(node, key, update(value))
+
+VARIABLES = (code.SimpleVariable, code.ListVariable, code.Object,
+             code.VariableDecl)
+
+def variables(node, name):
+  """
+  Returns the variables (and declarations) below node that refer to name.
+  """
+  return [ child for child in nodes(node)
+                 if isinstance(child, VARIABLES) and \
+                    isinstance(child.id, code.Identifier) and \
+                    child.name == name ]
+
+def rename(node, names):
+  """
+  Renames all variables (and declarations) below node using a mapping of names.
+  """
+  for child in nodes(node):
+    if isinstance(child, VARIABLES) and isinstance(child.id, code.Identifier) \
+       and child.name in names:
+      child.id.name = names[child.name]
+
+def declared(statements):
+  """
+  Returns the names that are declared by a list of statements, including both
+  the name of structured types and the name they're emitted with.
+  """
+  names = set()
+  for statement in statements:
+    if isinstance(statement, code.Assign): statement = statement.operand
+    if isinstance(statement, code.Function) or \
+       isinstance(statement, code.VariableDecl):
+      names.add(statement.name)
+    elif isinstance(statement, code.StructuredType):
+      name = statement.name.name
+      names.update([ name, (name[:-1] if name[-1] == "s" else name) + "_t" ])
+  return names
+
+def used(function):
+  """
+  Returns the names of all identifiers and types that a function refers to.
+  """
+  names = references(function)
+  for node in nodes(function):
+    if isinstance(node, code.NamedType) or isinstance(node, code.ObjectType):
+      names.update([ node.name, node.name + "_t" ])
+  return names
+
+def recursive(functions):
+  """
+  Returns the names of the functions that (indirectly) call themselves.
+  """
+  calls = {}
+  for name, function in functions.items():
+    calls[name] = set([ callee for callee in references(function)
+                               if callee in functions ])
+  result = set()
+  for name in functions:
+    pending = list(calls[name])
+    seen    = set()
+    while len(pending) > 0:
+      callee = pending.pop()
+      if callee == name:
+        result.add(name)
+        break
+      if callee in seen: continue
+      seen.add(callee)
+      pending.extend(calls[callee])
+  return result
+
+class Inlining(passes.Pass):
+  """
+  Pass inlining small, non-recursive functions at their call sites. Functions
+  that consist of a single Return are substituted in expressions, with their
+  parameters replaced by the arguments, if these are pure, since they might end
+  up where they're evaluated conditionally or in a different order. Calls that are statements are replaced
+  by the body of the function, with its parameters turned into local variables
+  and all locals renamed. Functions are only inlined if the size of their body
+  doesn't exceed the budget (in nodes).
+  The strategy determines what happens to the functions that are selected:
+  - "substitute" inlines them where possible and leaves other call sites alone
+  - "static" emits them as static inline functions in the def section of their
+    module, leaving inlining up to the compiler, if all declarations they depend
+    on are visible there
+  - "mixed" inlines them where possible and emits the remaining as static
+    inline functions
+  The decision made at each call site, along with its impact on the size of the
+  code, is reported by report().
+  """
+  handles = [ code.FunctionCall, structure.Section, code.Function,
+              code.IfStatement, code.CondLoop, code.For ]
+
+  def __init__(self, budget=16, strategy="substitute", name="inlining",
+                     after=None, before=None):
+    assert strategy in [ "substitute", "static", "mixed" ], \
+           "Unknown inlining strategy: " + strategy
+    super(Inlining, self).__init__(name, after, before)
+    self.budget    = budget
+    self.strategy  = strategy
+    self.functions = {}
+    self.sites     = []
+    self.static    = []
+
+  def prepare(self, unit):
+    self.functions = {}
+    self.sites     = []
+    self.static    = []
+    self.renamed   = 0
+    for module in unit:
+      if not isinstance(module, structure.Module): continue
+      for section in module:
+        for child in section:
+          if isinstance(child, code.Function) and \
+             not isinstance(child, code.Prototype) and len(child) > 0:
+            self.functions[child.name] = child
+    self.recursive = recursive(self.functions)
+
+  def caller(self, parent=None):
+    for node in reversed(self.stack + [ parent ]):
+      if isinstance(node, code.Function): return node
+    return None
+
+  def record(self, call, decision, growth=0, parent=None):
+    caller = self.caller(parent)
+    self.sites.append((caller.name if caller else None, call.function.name,
+                       decision, growth))
+
+  def candidate(self, call):
+    """
+    Returns the function that is called if it can be inlined, else the reason
+    why it can't.
+    """
+    try:
+      function = self.functions[call.function.name]
+    except KeyError:
+      return (None, None)
+    if function.name in self.recursive:
+      return (None, "recursive")
+    if len(call.arguments) != len(function.params):
+      return (None, "arguments don't match parameters")
+    body = size(function.children)
+    if body > self.budget:
+      return (None, "too large (" + str(body) + " > " + str(self.budget) + ")")
+    return (function, None)
+
+  def keep(self, call, function, reason, parent=None):
+    if function is None or self.strategy == "substitute":
+      self.record(call, "kept: " + reason, parent=parent)
+    else:
+      self.make_static(function)
+      self.record(call, "static inline (" + reason + ")", parent=parent)
+
+  def make_static(self, function):
+    if not function in self.static: self.static.append(function)
+
+  # expressions
+
+  def visit_FunctionCall(self, call):
+    if self.is_statement(call): return
+    function, reason = self.candidate(call)
+    if function is None:
+      if not reason is None: self.record(call, "kept: " + reason)
+      return
+    if self.strategy == "static":
+      self.make_static(function)
+      self.record(call, "static inline")
+      return
+    expression, reason = self.substitute(function, call)
+    if expression is None:
+      self.keep(call, function, reason)
+      return
+    self.record(call, "inlined expression", size([expression]) - size([call]))
+    return expression
+
+  def substitute(self, function, call):
+    """
+    Returns the expression of a function consisting of a single Return, with its
+    parameters replaced by the arguments of the call.
+    """
+    if len(function) != 1 or not isinstance(function[0], code.Return) or \
+       function[0].expression is None:
+      return (None, "not a single return expression")
+    expression = copy.deepcopy(function[0].expression, { id(function): function })
+    arguments  = {}
+    for param, arg in zip(function.params, call.arguments):
+      uses   = variables(expression, param.name)
+      simple = isinstance(arg, code.SimpleVariable) or \
+               isinstance(arg, code.Object)
+      if not simple and \
+         any([isinstance(use, code.Object) for use in uses]):
+        return (None, "object argument isn't a variable")
+      if not pure(arg):
+        return (None, "argument has side effects")
+      if len(uses) != 1 and not (simple or isinstance(arg, code.Literal)):
+        return (None, "argument isn't used exactly once")
+      arguments[param.name] = arg
+
+    def substitution(node):
+      if isinstance(node, code.Object) and node.name in arguments:
+        return code.Object(arguments[node.name].name, node.type)
+      if isinstance(node, code.SimpleVariable) and node.name in arguments:
+        return copy.deepcopy(arguments[node.name])
+      return None
+
+    if isinstance(expression, code.SimpleVariable) or \
+       isinstance(expression, code.Object):
+      return (substitution(expression) or expression, None)
+    replace(expression, substitution)
+    return (expression, None)
+
+  # statements
+
+  def is_statement(self, call):
+    parent = self.stack[-1] if len(self.stack) > 0 else None
+    if isinstance(parent, code.IfStatement):
+      return any([statement is call for clause in parent.children
+                                    for statement in clause])
+    if isinstance(parent, Code) and self.is_block(parent):
+      return any([statement is call for statement in parent.children])
+    return False
+
+  def is_block(self, node):
+    return isinstance(node, structure.Section) or \
+           isinstance(node, code.Function) or \
+           isinstance(node, code.CondLoop) or \
+           isinstance(node, code.For)
+
+  def visit_Prototype(self, prototype): pass
+
+  def visit_IfStatement(self, statement):
+    statement.true_clause  = self.inline_in(statement.true_clause,  statement)
+    statement.false_clause = self.inline_in(statement.false_clause, statement)
+
+  def visit_Code(self, parent):
+    parent.sticking["top"]    = self.inline_in(parent.sticking["top"],    parent)
+    parent.floating           = self.inline_in(parent.floating,           parent)
+    parent.sticking["bottom"] = self.inline_in(parent.sticking["bottom"], parent)
+
+  def inline_in(self, statements, parent):
+    updated = []
+    for statement in statements:
+      if isinstance(statement, code.FunctionCall):
+        updated.extend(self.inline_statement(statement, parent))
+      else:
+        updated.append(statement)
+    return updated
+
+  def inline_statement(self, call, parent):
+    function, reason = self.candidate(call)
+    if function is None:
+      if not reason is None: self.record(call, "kept: " + reason, parent=parent)
+      return [ call ]
+    if self.strategy == "static":
+      self.make_static(function)
+      self.record(call, "static inline", parent=parent)
+      return [ call ]
+    statements, reason = self.splice(function, call)
+    if statements is None:
+      self.keep(call, function, reason, parent)
+      return [ call ]
+    self.record(call, "inlined body", size(statements) - size([call]),
+                parent=parent)
+    if not isinstance(parent, code.IfStatement):
+      for statement in statements: statement._parent = parent
+    return statements
+
+  def splice(self, function, call):
+    """
+    Returns the statements of a function, with parameters turned into local
+    variables that are initialized with the arguments of the call, and all
+    locals renamed to avoid clashes in the caller's scope.
+    """
+    body = list(function.children)
+    if isinstance(body[-1], code.Return):
+      if not body[-1].expression is None and not pure(body[-1].expression):
+        return (None, "result has side effects")
+      body = body[:-1]
+    if any([isinstance(node, code.Return) for node in nodes(body)]):
+      return (None, "returns early")
+
+    self.renamed += 1
+    suffix = "_" + str(self.renamed)
+    names  = {}
+    for param in function.params: names[param.name] = param.name + suffix
+    for node in nodes(body):
+      if isinstance(node, code.VariableDecl):
+        names[node.name] = node.name + suffix
+
+    statements = [ code.Assign(code.VariableDecl(names[param.name], param.type),
+                               arg)
+                   for param, arg in zip(function.params, call.arguments) ]
+    for statement in body:
+      statement = copy.deepcopy(statement, { id(function): function })
+      rename(statement, names)
+      statements.append(statement)
+    return (statements, None)
+
+  # static inline functions
+
+  def hidden(self, function, moved):
+    """
+    Returns the names that a function uses, that are declared in its module,
+    but not in the def section of it, which it would be moved to. Prototypes of
+    functions that are moved are removed, and thus not visible either.
+    """
+    module  = function._parent._parent
+    private = set()
+    for section in module:
+      if section.name != "def": private.update(declared(section))
+    public = declared([ child for child in module.select("def")
+                              if not (isinstance(child, code.Prototype) and \
+                                      child.name in moved) ])
+    return (used(function) & private) - public - set([ function.name ])
+
+  def finish(self, unit):
+    """
+    Moves the functions that are marked static inline to the def section of
+    their module, along with the imports they need, and removes all Prototypes
+    for them. Functions that depend on declarations that aren't visible in the
+    def section are kept where they are.
+    """
+    moved       = set([ function.name for function in self.static ])
+    self.static = [ function for function in self.static
+                             if len(self.hidden(function, moved)) == 0 ]
+    names       = [ function.name for function in self.static ]
+    for index, (caller, callee, decision, growth) in enumerate(self.sites):
+      if decision.startswith("static inline") and not callee in names:
+        self.sites[index] = (caller, callee,
+                             "kept: depends on declarations of its module",
+                             growth)
+    for module in unit:
+      if not isinstance(module, structure.Module): continue
+      for section in module:
+        for child in list(section.children):
+          if isinstance(child, code.Prototype) and child.name in names:
+            section.remove_child(section.children.index(child))
+    for function in self.static:
+      section = function._parent
+      module  = section._parent
+      section.remove_child(section.children.index(function))
+      definitions = module.select("def")
+      imported    = [ child.imported for child in definitions
+                                     if isinstance(child, code.Import) ]
+      for child in section:
+        if isinstance(child, code.Import) and \
+           not child.imported in imported + [ module.name ]:
+          definitions.append(code.Import(child.imported))
+      definitions.append(function.tag("inline"))
+
+  def report(self):
+    return "\n".join([ str(caller) + " -> " + callee + ": " + decision + \
+                       (" (" + ("+" if growth > 0 else "") + str(growth) + \
+                        " nodes)" if growth != 0 else "")
+                       for caller, callee, decision, growth in self.sites ])
@@ -0,0 +1,117 @@
+# layout.py
+# layout of structured types: ordering of properties to minimize padding
+# author: Christophe VG
+
+import codecanvas.instructions as code
+import codecanvas.passes       as passes
+
+from codecanvas.platform import Platform
+
+# classes of types that are emitted as pointers
+POINTERS = [ "RefType", "ObjectType" ]
+
+def align(offset, alignment):
+  return (offset + alignment - 1) // alignment * alignment
+
+class StructLayout(passes.Pass):
+  """
+  Pass reordering the properties of structured types to minimize padding, using
+  the sizes and alignments of types of the platform. Properties that are tagged
+  hot (e.g. read by matchers) and next pointers are kept within the first cache
+  line. Optionally, boolean properties are packed into bitfields.
+  Structs tagged ordered, or with properties of unknown size, are left as they
+  are. The size of every struct, before and after, is kept in sizes.
+  """
+  handles = [ code.StructuredType ]
+  after   = [ "transform" ]
+
+  def __init__(self, platform=None, bitfields=False, name="layout", after=None,
+                     before=None):
+    super(StructLayout, self).__init__(name, after, before)
+    self.platform  = platform if not platform is None else Platform()
+    self.bitfields = bitfields
+    self.sizes     = {}
+
+  def prepare(self, tree):
+    self.sizes = {}
+
+  def measure(self, type):
+    """
+    Returns the size and alignment of a type, or None if it isn't known.
+    """
+    if type.__class__.__name__ in POINTERS: return self.platform.pointer()
+    if isinstance(type, code.IntegerType) and not type.range is None:
+      size = self.platform.width(type.range) // 8
+      return (size, min(size, self.platform.alignment))
+    if isinstance(type, code.AmountType):
+      element = self.measure(type.type)
+      if element is None: return None
+      return (element[0] * type.size, element[1])
+    return self.platform.sizes.get(type.__class__.__name__, None)
+
+  def place(self, props):
+    """
+    Returns the offsets at which the properties end, in the given order, and the
+    size of the struct. Subsequent bitfields share unsigned ints.
+    """
+    unit   = self.platform.sizes["UnsignedIntegerType"]
+    ends   = []
+    offset = 0
+    bits   = 0
+    widest = 1
+    for prop in props:
+      [size, alignment] = unit if "bitfield" in prop.tags \
+                               else self.measure(prop.type)
+      widest = max(widest, alignment)
+      if "bitfield" in prop.tags and 0 < bits < size * 8:
+        bits += 1
+      else:
+        bits   = 1 if "bitfield" in prop.tags else 0
+        offset = align(offset, alignment) + size
+      ends.append(offset)
+    return (ends, align(offset, widest))
+
+  def sizeof(self, props):
+    return self.place(props)[1]
+
+  def hot(self, prop):
+    return "hot" in prop.tags or prop.name.name == "next"
+
+  def order(self, props):
+    """
+    Properties are ordered by decreasing alignment, with bitfields at the end,
+    and hot ones before others with the same alignment. If this doesn't keep all
+    hot properties in the first cache line, they go first as a group.
+    """
+    def alignment(prop):
+      if "bitfield" in prop.tags: return 0
+      return self.measure(prop.type)[1]
+    def by_alignment(props):
+      return sorted(props, key=lambda prop: (-alignment(prop), not self.hot(prop)))
+    compact = by_alignment(props)
+    ends    = self.place(compact)[0]
+    if all([ end <= self.platform.cache_line
+             for prop, end in zip(compact, ends) if self.hot(prop) ]):
+      return compact
+    return by_alignment([ prop for prop in props if self.hot(prop)     ]) + \
+           by_alignment([ prop for prop in props if not self.hot(prop) ])
+
+  def visit_StructuredType(self, struct):
+    if "ordered" in struct.tags or len(struct.sticking["top"]) > 0 or \
+       len(struct.sticking["bottom"]) > 0: return
+    props = list(struct)
+    if not all([ isinstance(prop, code.Property) and \
+                 not self.measure(prop.type) is None for prop in props ]):
+      return
+    before = self.sizeof(props)
+    if self.bitfields:
+      for prop in props:
+        if isinstance(prop.type, code.BooleanType):
+          prop.type = code.UnsignedIntegerType()
+          prop.tag("bitfield")
+    struct.floating = self.order(props)
+    self.sizes[struct.name.name] = (before, self.sizeof(struct.floating))
+
+  def report(self):
+    return ", ".join([ name + ": " + str(before) + " -> " + str(after) + " bytes"
+                       for name, (before, after) in sorted(self.sizes.items()) ])
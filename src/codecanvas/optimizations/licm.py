@@ -0,0 +1,235 @@
+# licm.py
+# loop-invariant code motion
+# author: Christophe VG
+
+import codecanvas.instructions as code
+import codecanvas.structure    as structure
+import codecanvas.passes       as passes
+
+from codecanvas.optimizations.folding  import pure
+from codecanvas.optimizations.strength import type_of
+
+# fields of statements and expressions that hold expressions that are evaluated
+# each time the statement/expression is
+EXPRESSIONS = [
+  (code.BinOp,       [ "left", "right" ]),
+  (code.UnOp,        [ "operand"       ]),
+  (code.VarExpOp,    [ "expression"    ]),
+  (code.IfStatement, [ "expression"    ]),
+  (code.CondLoop,    [ "condition"     ]),
+  (code.For,         [ "check"         ]),
+  (code.Return,      [ "expression"    ])
+]
+
+def expression_fields(node):
+  for clazz, fields in EXPRESSIONS:
+    if isinstance(node, clazz): return fields
+  return []
+
+def statements(node):
+  """
+  Returns the lists of statements that are nested in a statement.
+  """
+  if isinstance(node, code.IfStatement):
+    return [ node.true_clause, node.false_clause ]
+  if isinstance(node, code.CondLoop) or isinstance(node, code.For):
+    return [ node.children ]
+  return []
+
+def name_of(variable):
+  """
+  Returns the name of the variable or object that is written to/through.
+  """
+  if isinstance(variable, code.ObjectProperty) or \
+     isinstance(variable, code.StructProperty):
+    return variable.obj.name
+  if isinstance(variable, code.ListVariable):
+    return name_of(variable.id) if isinstance(variable.id, code.Variable) \
+                                else variable.id.name
+  if isinstance(variable, code.Identified): return variable.name
+  for field in [ "pointer", "variable" ]:    # e.g. C's Deref and AddressOf
+    try:    return name_of(getattr(variable, field))
+    except AttributeError: pass
+  return None
+
+class Loop(object):
+  """
+  Information about what is written inside a loop.
+  """
+  def __init__(self, loop):
+    self.loop     = loop
+    self.written  = set()   # variables and objects that are assigned
+    self.escaped  = set()   # variables that are passed to impure calls
+    self.guards   = set()   # variables and objects tested by the condition
+    if isinstance(loop, code.For):
+      self.collect(loop.init)
+      self.collect(loop.change)
+      self.reads(loop.check, self.guards, properties=False)
+    else:
+      self.reads(loop.condition, self.guards, properties=False)
+    for statement in loop: self.collect(statement)
+
+  def collect(self, node):
+    if isinstance(node, code.VarExpOp) or isinstance(node, code.MutUnOp):
+      self.written.add(name_of(node.operand))
+    if isinstance(node, code.VariableDecl):
+      self.written.add(node.name)
+    if isinstance(node, code.Call) and not (
+         isinstance(node, code.FunctionCall) and node.pure
+       ):
+      for arg in node.arguments: self.reads(arg, self.escaped)
+    for field in expression_fields(node):
+      value = getattr(node, field)
+      if not value is None: self.collect(value)
+    if isinstance(node, code.VarExpOp): self.collect(node.operand)
+    if isinstance(node, code.Call):
+      for arg in node.arguments: self.collect(arg)
+    for nested in statements(node):
+      for statement in nested: self.collect(statement)
+
+  def reads(self, expression, names, properties=True):
+    if isinstance(expression, code.SimpleVariable) or \
+       isinstance(expression, code.Object):
+      names.add(expression.name)
+    elif isinstance(expression, code.Variable) and properties:
+      name = name_of(expression)
+      if not name is None: names.add(name)
+    for field in expression_fields(expression):
+      self.reads(getattr(expression, field), names, properties)
+    if isinstance(expression, code.Call):
+      for arg in expression.arguments: self.reads(arg, names, properties)
+
+  def invariant(self, expression):
+    if isinstance(expression, code.Literal):
+      return True
+    if isinstance(expression, code.SimpleVariable) or \
+       isinstance(expression, code.Object):
+      return not expression.name in self.written and \
+             not expression.name in self.escaped
+    if isinstance(expression, code.ObjectProperty):
+      name = expression.obj.name
+      return not name in self.written and not name in self.escaped and \
+             not name in self.guards
+    if isinstance(expression, code.BinOp):
+      return self.invariant(expression.left) and \
+             self.invariant(expression.right)
+    if isinstance(expression, code.UnOp):
+      return self.invariant(expression.operand)
+    if isinstance(expression, code.FunctionCall):
+      return pure(expression) and \
+             all([self.invariant(arg) for arg in expression.arguments])
+    return False
+
+def costly(expression):
+  """
+  Returns True if an expression involves a call or a property read.
+  """
+  if isinstance(expression, code.FunctionCall) or \
+     isinstance(expression, code.ObjectProperty):
+    return True
+  return any([costly(getattr(expression, field))
+              for field in expression_fields(expression)])
+
+def dereferences(expression):
+  """
+  Returns True if evaluating an expression reads a property through a pointer.
+  """
+  if isinstance(expression, code.ObjectProperty): return True
+  if isinstance(expression, code.Call) and \
+     any([dereferences(arg) for arg in expression.arguments]):
+    return True
+  return any([dereferences(getattr(expression, field))
+              for field in expression_fields(expression)])
+
+class LoopInvariants(passes.Pass):
+  """
+  Pass hoisting loop-invariant expressions out of WhileDo, RepeatUntil and For
+  loops, into local variables that are assigned before the loop. Expressions
+  are invariant if they are side-effect free and only read variables and
+  objects that aren't written to in the loop, nor passed to impure calls, which
+  might change them through a pointer. Calls are considered free of side
+  effects if they are marked pure, using FunctionCall.mark_pure(). Reads of
+  properties of objects that are tested by the loop's condition, e.g. to be not
+  NULL, aren't hoisted, since the condition might be guarding them.
+  Only expressions that are evaluated each time the loop's body is, are hoisted,
+  not those in nested clauses or right operands of && and ||. Reads of
+  properties are only hoisted from the body of loops that run at least once.
+  The hoisted expressions are kept in hoisted.
+  """
+  handles = [ structure.Section, code.Function, code.IfStatement,
+              code.CondLoop, code.For ]
+
+  def __init__(self, prefix="inv_", name="licm", after=None, before=None):
+    super(LoopInvariants, self).__init__(name, after, before)
+    self.prefix  = prefix
+    self.hoisted = []
+
+  def prepare(self, tree):
+    self.hoisted = []
+
+  def visit_Prototype(self, prototype): pass
+
+  def visit_IfStatement(self, statement):
+    statement.true_clause  = self.hoist_from(statement.true_clause)
+    statement.false_clause = self.hoist_from(statement.false_clause)
+
+  def visit_Code(self, parent):
+    for child in parent.children:
+      if self.is_loop(child) and not child.sticky:
+        for assignment in self.hoist(child):
+          assignment.insert_before(child)
+
+  def is_loop(self, statement):
+    return isinstance(statement, code.CondLoop) or \
+           isinstance(statement, code.For)
+
+  def hoist_from(self, clause):
+    updated = []
+    for statement in clause:
+      if self.is_loop(statement): updated.extend(self.hoist(statement))
+      updated.append(statement)
+    return updated
+
+  def hoist(self, loop):
+    """
+    Replaces invariant expressions in the loop by variables and returns the
+    assignments of these variables.
+    """
+    info        = Loop(loop)
+    assignments = []
+
+    def replace(expression, speculative):
+      if info.invariant(expression) and costly(expression) and \
+         not type_of(expression) is None and \
+         not (speculative and dereferences(expression)):
+        name = self.prefix + str(len(self.hoisted))
+        self.hoisted.append(expression)
+        assignments.append(code.Assign(
+          code.VariableDecl(name, type_of(expression)), expression
+        ))
+        return code.SimpleVariable(name)
+      visit(expression, speculative)
+      return expression
+
+    # nested statements aren't visited, since they don't always execute
+    def visit(node, speculative):
+      for field in expression_fields(node):
+        value = getattr(node, field)
+        if value is None: continue
+        if field == "right" and (isinstance(node, code.And) or \
+                                 isinstance(node, code.Or)):
+          continue                          # only evaluated conditionally
+        setattr(node, field, replace(value, speculative))
+      if isinstance(node, code.Call):
+        for index, arg in enumerate(node.arguments):
+          node.arguments[index] = replace(arg, speculative)
+
+    # the condition is evaluated at least once, the body maybe not
+    speculative = not isinstance(loop, code.RepeatUntil)
+    if isinstance(loop, code.For):
+      loop.check = replace(loop.check, False)
+      visit(loop.change, speculative)
+    else:
+      loop.condition = replace(loop.condition, False)
+    for statement in loop: visit(statement, speculative)
+    return assignments
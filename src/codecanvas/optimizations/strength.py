@@ -0,0 +1,145 @@
+# strength.py
+# strength reduction of arithmetic on integer types
+# author: Christophe VG
+
+import codecanvas.instructions as code
+
+from codecanvas.rewrite import Rules, Pattern, Rewriter
+
+from codecanvas.optimizations.inlining import nodes
+
+# helper functions
+
+def exponent(value):
+  """
+  Returns k if value is 2^k, with k > 0, else None.
+  """
+  if not isinstance(value, (int, long)) or value < 2 or value & (value - 1):
+    return None
+  return len(bin(value)) - 3
+
+def power_of_two(value):
+  return not exponent(value) is None
+
+INTEGERS = (code.ByteType, code.IntegerType, code.LongType)
+UNSIGNED = (code.UnsignedIntegerType, code.UnsignedLongType)
+
+ARITHMETIC = (code.Plus, code.Minus, code.Mult, code.Div, code.Modulo,
+              code.BitAnd)
+
+LOGICAL = (code.Equals, code.NotEquals, code.LT, code.LTEQ, code.GT, code.GTEQ,
+           code.And, code.Or, code.Not)
+
+def combine(left, right):
+  """
+  Returns the type of an arithmetic operation on two (known) types, following
+  C's usual arithmetic conversions.
+  """
+  if left is None or right is None: return None
+  if not isinstance(left, INTEGERS) or not isinstance(right, INTEGERS):
+    return None
+  wide     = isinstance(left, code.LongType) or isinstance(right, code.LongType)
+  unsigned = isinstance(left, UNSIGNED)      or isinstance(right, UNSIGNED)
+  if wide: return code.UnsignedLongType()    if unsigned else code.LongType()
+  return          code.UnsignedIntegerType() if unsigned else code.IntegerType()
+
+def type_of(expression, declarations={}):
+  """
+  Returns the type of an expression, or None if it isn't known. The types of
+  SimpleVariables are looked up in the declarations.
+  """
+  if isinstance(expression, code.ByteLiteral):    return code.ByteType()
+  if isinstance(expression, code.IntegerLiteral): return code.IntegerType()
+  if isinstance(expression, code.FloatLiteral):   return code.FloatType()
+  if isinstance(expression, code.SimpleVariable):
+    if isinstance(expression.info, code.Type): return expression.info
+    return declarations.get(expression.name, None)
+  if isinstance(expression, LOGICAL): return code.BooleanType()
+  if isinstance(expression, ARITHMETIC):
+    return combine(type_of(expression.left,  declarations),
+                   type_of(expression.right, declarations))
+  if isinstance(expression, code.ShiftLeft) or \
+     isinstance(expression, code.ShiftRight):
+    return type_of(expression.var, declarations)
+  try:
+    if not isinstance(expression.type, code.VoidType): return expression.type
+  except AttributeError: pass
+  return None
+
+# reduction rules
+
+POWER_OF_TWO = Pattern(code.IntegerLiteral, value=power_of_two)
+
+rules = Rules()
+
+@rules.rule(code.Mult, right=POWER_OF_TWO)
+def multiply(reducer, op):
+  return reducer.reduce(op, code.ShiftLeft, op.left, op.right)
+
+@rules.rule(code.Mult, left=POWER_OF_TWO)
+def multiply_left(reducer, op):
+  return reducer.reduce(op, code.ShiftLeft, op.right, op.left)
+
+@rules.rule(code.Div, right=POWER_OF_TWO)
+def divide(reducer, op):
+  if not reducer.unsigned(op.left): return None
+  return reducer.reduce(op, code.ShiftRight, op.left, op.right)
+
+@rules.rule(code.Modulo, right=POWER_OF_TWO)
+def remainder(reducer, op):
+  if not reducer.unsigned(op.left): return None
+  reducer.reduced.append(op)
+  return code.BitAnd(op.left, code.IntegerLiteral(op.right.value - 1))
+
+class StrengthReduction(Rewriter):
+  """
+  Pass replacing multiplications, divisions and modulo operations by a power of
+  two by shifts and masks. Multiplications are reduced for all integer types,
+  since GCC defines left shifts of negative values as multiplications. Divisions
+  and modulo operations of signed values round towards zero, and therefore are
+  only reduced if the left operand is unsigned. Operand types are taken from the
+  expressions themselves, or from the declarations of parameters and local
+  variables of the enclosing function. The replaced operations are kept in
+  reduced.
+  """
+  def __init__(self, name="strength", after=None, before=None):
+    super(StrengthReduction, self).__init__(rules, name, after, before)
+    self.reduced      = []
+    self.declarations = {}
+
+  def prepare(self, tree):
+    self.reduced      = []
+    self.declarations = {}
+
+  def declared(self):
+    """
+    Returns the types of the parameters and local variables of the function that
+    encloses the current node.
+    """
+    function = None
+    for node in reversed(self.stack):
+      if isinstance(node, code.Function):
+        function = node
+        break
+    if function is None: return {}
+    if not function in self.declarations:
+      types = {}
+      for param in function.params: types[param.name] = param.type
+      for node in nodes(function.children):
+        if isinstance(node, code.VariableDecl): types[node.name] = node.type
+      self.declarations[function] = types
+    return self.declarations[function]
+
+  def integral(self, expression):
+    return isinstance(type_of(expression, self.declared()), INTEGERS)
+
+  def unsigned(self, expression):
+    return isinstance(type_of(expression, self.declared()), UNSIGNED)
+
+  def reduce(self, op, shift, operand, literal):
+    if not self.integral(operand): return None
+    self.reduced.append(op)
+    return shift(operand, exponent(literal.value))
+
+  def report(self):
+    return "reduced " + str(len(self.reduced)) + " operation(s)"
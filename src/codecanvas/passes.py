@@ -0,0 +1,210 @@
+# passes.py
+# pass manager, running passes over a CodeCanvas and fusing independent ones
+# into a single traversal
+# author: Christophe VG
+
+from timeit import default_timer as timer
+
+from util.visitor import stacked
+
+import codecanvas.language as language
+
+class Pass(object):
+  """
+  Base-class for passes that can be fused. A pass declares the classes of nodes
+  it handles and implements visit_<class> handlers for (super-classes of) them.
+  Handlers are called bottom-up, once all children of a node have been handled.
+  Like with visitors, a handler can return a replacement for the node.
+  """
+  name    = None  # defaults to the name of the class
+  handles = []    # classes of nodes the pass wants to handle
+  after   = []    # names of passes that must be completed before this one
+  before  = []    # names of passes that can only start after this one
+  fusable = True  # passes that need a traversal of their own, override run()
+
+  def __init__(self, name=None, after=None, before=None):
+    if not name   is None: self.name   = name
+    if self.name  is None: self.name   = self.__class__.__name__
+    if not after  is None: self.after  = after
+    if not before is None: self.before = before
+    self.traversal = None
+
+  def get_stack(self):
+    """
+    While handling a node, the stack contains all ancestors of that node.
+    """
+    return self.traversal.stack
+  stack = property(get_stack)
+
+  def handler(self, clazz):
+    """
+    Returns the handler for nodes of a given class, or None if the pass doesn't
+    handle them.
+    """
+    if not any([issubclass(clazz, handled) for handled in self.handles]):
+      return None
+    for base in clazz.__mro__:
+      try: return getattr(self, "visit_" + base.__name__)
+      except AttributeError: pass
+    return None
+
+  def prepare(self, tree):
+    """
+    Called before the traversal that includes this pass.
+    """
+    pass
+
+  def finish(self, tree):
+    """
+    Called after the traversal that included this pass.
+    """
+    pass
+
+  def run(self, tree):
+    raise NotImplementedError, "Pass.run(self, tree)"
+
+class VisitorPass(Pass):
+  """
+  Wraps a language.Visitor as a pass. The visitor performs its own traversal of
+  the tree and can't be fused with other passes. A new visitor is constructed
+  for every run, using the given factory, e.g. the class of the visitor.
+  """
+  fusable = False
+
+  def __init__(self, visitor, name=None, after=None, before=None):
+    if name is None: name = visitor.__name__
+    super(VisitorPass, self).__init__(name, after, before)
+    self.visitor = visitor
+
+  def run(self, tree):
+    return self.visitor().accept(tree)
+
+class Fusion(language.Visitor):
+  """
+  Visitor performing a single traversal on behalf of a group of passes. After
+  visiting a node, it dispatches it to the handlers of all passes, in order.
+  """
+  def __init__(self, passes, timings):
+    super(Fusion, self).__init__()
+    self.passes   = passes
+    self.timings  = timings
+    self.handlers = {}
+    for pass_ in passes: pass_.traversal = self
+
+  def handlers_for(self, clazz):
+    try:
+      return self.handlers[clazz]
+    except KeyError:
+      handlers = []
+      for pass_ in self.passes:
+        handler = pass_.handler(clazz)
+        if not handler is None: handlers.append((pass_, handler))
+      self.handlers[clazz] = handlers
+      return handlers
+
+  def accept(self, target):
+    update = super(Fusion, self).accept(target)
+    for pass_, handler in self.handlers_for(update.__class__):
+      start  = timer()
+      result = handler(update)
+      self.timings[pass_.name] += timer() - start
+      if not result is None: update = result
+    return update
+
+  # also allow replacement of the top-level structural children
+
+  @stacked
+  def visit_Unit(self, code):    self.visit_children(code)
+
+  @stacked
+  def visit_Module(self, code):  self.visit_children(code)
+
+  @stacked
+  def visit_Section(self, code): self.visit_children(code)
+
+  def visit_children(self, code):
+    for index, child in enumerate(code):
+      self.child = index
+      code.update_child(index, self.accept(child))
+
+class Manager(object):
+  """
+  Runs passes in an order that respects their ordering constraints. Subsequent
+  fusable passes that don't depend on each other are fused into a single
+  traversal. Time spent in each pass is kept in timings.
+  """
+  def __init__(self, *passes):
+    self.passes     = []
+    self.timings    = {}
+    self.traversals = 0
+    self.add(*passes)
+
+  def add(self, *passes):
+    for pass_ in passes:
+      assert isinstance(pass_, Pass), "expected Pass but got " + \
+                                      pass_.__class__.__name__
+      assert not pass_.name in [known.name for known in self.passes], \
+             "a pass named " + pass_.name + " was already added"
+      self.passes.append(pass_)
+    return self
+
+  def predecessors(self):
+    """
+    Returns a dict mapping the name of each pass to the names of the passes that
+    need to be completed before it. Constraints on unknown passes are ignored.
+    """
+    names        = [pass_.name for pass_ in self.passes]
+    predecessors = dict([(name, set()) for name in names])
+    for pass_ in self.passes:
+      for name in pass_.after:
+        if name in names: predecessors[pass_.name].add(name)
+      for name in pass_.before:
+        if name in names: predecessors[name].add(pass_.name)
+    return predecessors
+
+  def schedule(self):
+    """
+    Returns a list of groups of passes, each group requiring one traversal.
+    Without constraints, the order in which passes were added is respected.
+    """
+    predecessors = self.predecessors()
+    ordered      = []
+    done         = set()
+    while len(ordered) < len(self.passes):
+      ready = [pass_ for pass_ in self.passes
+                     if not pass_.name in done
+                    and predecessors[pass_.name].issubset(done)]
+      if len(ready) < 1:
+        raise RuntimeError, "passes have cyclic ordering constraints: " + \
+          ", ".join([pass_.name for pass_ in self.passes
+                                if not pass_.name in done])
+      ordered.append(ready[0])
+      done.add(ready[0].name)
+
+    groups = []
+    for pass_ in ordered:
+      if pass_.fusable and len(groups) > 0 and groups[-1][0].fusable and \
+         predecessors[pass_.name].isdisjoint([p.name for p in groups[-1]]):
+        groups[-1].append(pass_)
+      else:
+        groups.append([pass_])
+    return groups
+
+  def run(self, tree):
+    """
+    Runs all passes on the tree and returns the (possibly replaced) tree.
+    """
+    timings = dict([(pass_.name, 0.0) for pass_ in self.passes])
+    groups  = self.schedule()
+    for group in groups:
+      for pass_ in group: pass_.prepare(tree)
+      if group[0].fusable:
+        tree = Fusion(group, timings).accept(tree)
+      else:
+        start = timer()
+        tree  = group[0].run(tree)
+        timings[group[0].name] += timer() - start
+      for pass_ in group: pass_.finish(tree)
+    self.timings    = timings
+    self.traversals = len(groups)
+    return tree
@@ -4,7 +4,83 @@
 # Platform interface for the code emission
 
 class Platform(object):
-  
+
+  # capabilities of the target: the size in bytes of a word (its natural
+  # integer) and of pointers, the largest alignment that is required and the
+  # order of bytes ("little" or "big")
+  word_size    = 4
+  pointer_size = 8
+  alignment    = 8
+  endianness   = "little"
+
+  # default layout of lists: "linked" (singly linked lists), "array" (growable,
+  # contiguous arrays) or "columns" (structure of arrays)
+  lists = "linked"
+  # lists of tuples that are only queried for equality on the same elements are
+  # lowered to hash tables
+  hashing = False
+  # lists of tuples that are only queried with a range (<, <=, >, >=) on the
+  # same element are kept sorted on that element
+  sorting = False
+
+  # storage of atoms: "byte" (a single byte) or "word" (a word, which can be
+  # cheaper to access)
+  atoms = "byte"
+
+  # ListLiterals passed to functions: "varargs" (size, followed by the items),
+  # "fixed" (a specialization per size, e.g. f_2(a, b)) or "array" (size and a
+  # constant array with the items)
+  arguments = "varargs"
+
+  # CaseStatements with at least switch_minimum literal cases, that cover at
+  # least switch_density of the range between the lowest and highest case, are
+  # lowered to a switch (or a lookup table), others to a tree of comparisons
+  switch_minimum = 4
+  switch_density = 0.5
+
+  # allocation of tuples: "malloc" (heap), "pool" (a fixed-size pool per tuple
+  # type) or "arena" (a single region, released as a whole)
+  allocator  = "malloc"
+  # number of tuples in a pool, per tuple type (e.g. { "tuple_0" : 64 }, see
+  # __init__) or the default pool_size
+  pool_size  = 32
+  # size of the arena in bytes
+  arena_size = 4096
+
+  # size in bytes of a cache line
+  cache_line = 64
+
+  # names that are provided by headers outside of the unit, allowing the include
+  # analysis to drop or move imports of them; imports of other headers are kept
+  headers = {
+    "<stdlib.h>": [ "malloc", "calloc", "realloc", "free", "exit", "abs", "NULL",
+                    "size_t", "EXIT_SUCCESS", "EXIT_FAILURE" ],
+    "<string.h>": [ "memmove", "memcpy", "memset", "memcmp", "strlen", "strcmp",
+                    "strcpy", "strncpy", "NULL", "size_t" ],
+    "<stdio.h>" : [ "printf", "fprintf", "sprintf", "snprintf", "puts",
+                    "putchar", "stdout", "stderr", "NULL", "size_t" ],
+    "<stdint.h>": [ prefix + "int" + kind + str(bits) + "_t"
+                    for prefix in [ "", "u" ]
+                    for kind   in [ "", "_fast", "_least" ]
+                    for bits   in [ 8, 16, 32, 64 ] ] + \
+                  [ "intptr_t", "uintptr_t", "intmax_t", "uintmax_t" ]
+  }
+
+  def __init__(self):
+    # pools and sizes are adapted per platform, so every instance has its own
+    self.pools = {}
+    # sizes and alignments in bytes of types, by the name of their class, used
+    # to lay out structs
+    self.sizes = {
+      "ByteType"            : (1, 1),
+      "BooleanType"         : (4, 4),
+      "IntegerType"         : (4, 4),
+      "UnsignedIntegerType" : (4, 4),
+      "FloatType"           : (4, 4),
+      "LongType"            : (8, 8),
+      "UnsignedLongType"    : (8, 8)
+    }
+
   def setup(self, unit):
     """
     Allows a platform to set up basic infrastructure.
@@ -17,6 +93,24 @@ class Platform(object):
     """
     return NotImplementedError, "type(self, type)"
 
+  def width(self, range):
+    """
+    Returns the number of bits (8, 16, 32 or 64) of the narrowest integer that
+    holds all values in range, a (minimum, maximum) tuple.
+    """
+    [minimum, maximum] = range
+    for bits in [ 8, 16, 32, 64 ]:
+      if minimum < 0:
+        if -2 ** (bits - 1) <= minimum and maximum < 2 ** (bits - 1): return bits
+      elif maximum < 2 ** bits: return bits
+    raise ValueError, "no integer holds " + str(range)
+
+  def pointer(self):
+    """
+    Returns the size and alignment of pointers.
+    """
+    return (self.pointer_size, min(self.pointer_size, self.alignment))
+
   def add_handler(self, event, call=None, module=None, location=None):
     """
     Used to register platform specific callbacks/handlers. Dispatches to
@@ -0,0 +1,202 @@
+# rewrite.py
+# declarative rewrite rules, compiled into class-indexed decision trees
+# author: Christophe VG
+
+import codecanvas.passes as passes
+
+class Pattern(object):
+  """
+  Describes the shape of a node: its class and patterns for its fields. Fields
+  can be matched using a Pattern, a class (shorthand for a Pattern of that
+  class), a function (predicate on the field's value) or any other value (to
+  which the field's value should be equal).
+  Example: Pattern(code.MethodCall, obj=Pattern(type=code.ManyType))
+  """
+  def __init__(self, clazz=object, **fields):
+    self.clazz   = clazz
+    self.fields  = {}
+    self.capture = None
+    for name, field in fields.items():
+      if isinstance(field, type): field = Pattern(field)
+      self.fields[name] = field
+
+  def bind(self, name):
+    """
+    Binds the matched node to a name, which is passed to the replacement.
+    """
+    self.capture = name
+    return self
+
+  def flatten(self, path=()):
+    """
+    Returns the class tests, other checks and captures of the pattern as
+    (path, ...) tuples, with path the sequence of fields leading to the value.
+    """
+    classes  = {}
+    checks   = []
+    captures = []
+    if self.clazz is not object: classes[path] = self.clazz
+    elif path != ():             checks.append((path, lambda value: True))
+    if not self.capture is None: captures.append((path, self.capture))
+    for name in sorted(self.fields):
+      field = self.fields[name]
+      if isinstance(field, Pattern):
+        [more_classes, more_checks, more_captures] = field.flatten(path+(name,))
+        classes.update(more_classes)
+        checks.extend(more_checks)
+        captures.extend(more_captures)
+      elif callable(field):
+        checks.append((path+(name,), field))
+      else:
+        checks.append((path+(name,), lambda value, field=field: value == field))
+    return (classes, checks, captures)
+
+class Missing(object):
+  """
+  Class of the value of a path that doesn't exist in a node.
+  """
+  pass
+
+def fetch(node, path):
+  for name in path:
+    try: node = getattr(node, name)
+    except AttributeError: return Missing()
+  return node
+
+class Rule(object):
+  """
+  Combines a pattern with a replacement function. The replacement is called
+  with the optional context, the matched node and the captured values as
+  keyword arguments. It returns the replacement node or None to keep the node.
+  """
+  def __init__(self, pattern, replacement):
+    self.pattern     = pattern
+    self.replacement = replacement
+    [self.classes, self.checks, self.captures] = pattern.flatten()
+
+  def check(self, node):
+    for path, check in self.checks:
+      value = fetch(node, path)
+      if isinstance(value, Missing) or not check(value): return False
+    return True
+
+  def apply(self, node, context):
+    captures = dict([(name, fetch(node, path)) for path, name in self.captures])
+    return self.replacement(*(context + (node,)), **captures)
+
+class Leaf(object):
+  """
+  Remaining rules, of which all class tests have been performed. The first rule
+  of which the other checks succeed matches.
+  """
+  def __init__(self, rules):
+    self.rules = rules
+
+  def match(self, node):
+    for rule in self.rules:
+      if rule.check(node): return rule
+    return None
+
+class Switch(object):
+  """
+  Decision on the class of the value at a path. Branches are compiled the first
+  time a class is encountered and only retain the rules that are applicable to
+  instances of that class, in their original order.
+  """
+  def __init__(self, path, entries):
+    self.path     = path
+    self.entries  = entries
+    self.branches = {}
+
+  def match(self, node):
+    clazz = fetch(node, self.path).__class__
+    try:
+      branch = self.branches[clazz]
+    except KeyError:
+      selected = []
+      for rule, pending in self.entries:
+        if self.path in pending:
+          if not issubclass(clazz, pending[self.path]): continue
+          pending = dict(pending)
+          del pending[self.path]
+        selected.append((rule, pending))
+      branch = self.branches[clazz] = decide(selected)
+    return branch.match(node)
+
+def decide(entries):
+  """
+  Compiles (rule, pending class tests) entries into a decision tree, first
+  switching on the path that is tested by most rules.
+  """
+  counts = {}
+  for rule, pending in entries:
+    for path in pending: counts[path] = counts.get(path, 0) + 1
+  if len(counts) < 1: return Leaf([rule for rule, pending in entries])
+  path = sorted(counts, key=lambda path: (-counts[path], len(path), path))[0]
+  return Switch(path, entries)
+
+class Rules(object):
+  """
+  An ordered collection of rewrite rules. The first matching rule is applied.
+  Rules can be added using add() or by decorating their replacement function:
+
+    rules = Rules()
+    @rules.rule(code.Not, operand=code.Not)
+    def double_negation(node): return node.operand.operand
+  """
+  def __init__(self, *others):
+    self.rules = []
+    self.tree  = None
+    for other in others: self.rules.extend(other.rules)
+
+  def add(self, pattern, replacement):
+    self.rules.append(Rule(pattern, replacement))
+    self.tree = None
+    return self
+
+  def rule(self, clazz=object, **fields):
+    def decorator(replacement):
+      self.add(Pattern(clazz, **fields), replacement)
+      return replacement
+    return decorator
+
+  def classes(self):
+    """
+    Returns the classes of nodes that can be matched by the rules.
+    """
+    return list(set([rule.pattern.clazz for rule in self.rules]))
+
+  def compile(self):
+    self.tree = decide([(rule, rule.classes) for rule in self.rules])
+    return self
+
+  def match(self, node):
+    if self.tree is None: self.compile()
+    return self.tree.match(node)
+
+  def apply(self, node, *context):
+    """
+    Applies the first matching rule to node and returns its replacement, or
+    None if no rule matched or the rule didn't replace the node.
+    """
+    rule = self.match(node)
+    if rule is None: return None
+    return rule.apply(node, context)
+
+class Rewriter(passes.Pass):
+  """
+  Pass applying rules to all nodes they can match. Replacements are called
+  with the pass as context, giving access to the stack of ancestors.
+  """
+  def __init__(self, rules, name=None, after=None, before=None):
+    super(Rewriter, self).__init__(name, after, before)
+    self.rules   = rules
+    self.handles = rules.classes()
+
+  def handler(self, clazz):
+    if not any([issubclass(clazz, handled) for handled in self.handles]):
+      return None
+    return self.rewrite
+
+  def rewrite(self, node):
+    return self.rules.apply(node, self)
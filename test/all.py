@@ -11,6 +11,30 @@ from test.examples     import TestExamples
 from test.structure    import TestStructure
 from test.instructions import TestInstructions
 from test.integration  import TestIntegration
+from test.passes       import TestPasses
+from test.rewrite      import TestRewrite
+from test.folding      import TestFolding
+from test.dce          import TestDeadCode
+from test.licm         import TestLoopInvariants
+from test.inlining     import TestInlining
+from test.strength     import TestStrengthReduction
+from test.context      import TestContext
+from test.symbols      import TestSymbols
+from test.arrays       import TestArrayLists
+from test.columns      import TestColumnLists
+from test.allocators   import TestAllocators
+from test.hashing      import TestHashedLists
+from test.sorting      import TestSortedLists
+from test.benchmark    import TestBenchmark
+from test.layout       import TestStructLayout
+from test.platform     import TestPlatform
+from test.cases        import TestCaseStatements
+from test.atoms        import TestAtoms
+from test.arguments    import TestArguments
+from test.amalgamation import TestAmalgamation
+from test.sharding     import TestSharding
+from test.includes     import TestIncludes
+from test.ownership    import TestOwnership
 
 if __name__ == '__main__':
   tests = [ unittest.TestLoader().loadTestsFromTestCase(test)
@@ -19,7 +43,31 @@ if __name__ == '__main__':
                           TestExamples,
                           TestStructure,
                           TestInstructions,
-                          TestIntegration
+                          TestIntegration,
+                          TestPasses,
+                          TestRewrite,
+                          TestFolding,
+                          TestDeadCode,
+                          TestLoopInvariants,
+                          TestInlining,
+                          TestStrengthReduction,
+                          TestContext,
+                          TestSymbols,
+                          TestArrayLists,
+                          TestColumnLists,
+                          TestAllocators,
+                          TestHashedLists,
+                          TestSortedLists,
+                          TestBenchmark,
+                          TestStructLayout,
+                          TestPlatform,
+                          TestCaseStatements,
+                          TestAtoms,
+                          TestArguments,
+                          TestAmalgamation,
+                          TestSharding,
+                          TestIncludes,
+                          TestOwnership
                          ]
           ]
 
@@ -0,0 +1,121 @@
+# allocators.py
+# tests allocation strategies for tuples and bulk clearing of lists
+# author: Christophe VG
+
+import unittest
+
+from codecanvas.structure import Unit, Module
+
+import codecanvas.instructions as code
+import codecanvas.languages.C  as C
+
+class PoolPlatform(C.Generic):
+  allocator = "pool"
+  def __init__(self):
+    super(PoolPlatform, self).__init__()
+    self.pools = { "tuple_1" : 8 }
+
+class ArenaPlatform(C.Generic):
+  allocator  = "arena"
+  arena_size = 1024
+
+class TestAllocators(unittest.TestCase):
+
+  def setUp(self):
+    self.unit = Unit()
+    self.unit.append(Module("includes"))
+    self.unit.append(Module("test"))
+    self.unit.select("test", "dec").append(code.Import("includes")) \
+                                   .tag("requires-tuples")
+    self.function = self.unit.select("test", "dec").append(
+      code.Function("main")
+    )
+
+  def clear(self, name, *types):
+    type = code.ManyType(code.TupleType(list(types)))
+    self.function.append(code.MethodCall(code.Object(name, type), "clear"))
+    return type
+
+  def functions(self, module):
+    return [ child.name for child in self.unit.select(module, "dec")
+                        if isinstance(child, code.Function) ]
+
+  def test_malloc_is_default(self):
+    self.clear("queue", code.IntegerType(), code.ObjectType("payload"))
+    result = C.Emitter().emit(self.unit)
+    self.assertIn("tuple_0_t* tuple = malloc(sizeof(tuple_0_t));", result)
+    self.assertIn("free_payload(tuple->elem_1);\nfree(tuple);", result)
+    self.assertEqual(self.functions("tuples"), [
+      "make_tuple_0_t", "free_tuple_0_t", "copy_tuple_0_t"
+    ])
+
+  def test_pools(self):
+    self.clear("queue", code.IntegerType(), code.ObjectType("payload"))
+    self.clear("other", code.ByteType())
+    result = C.Emitter(platform=PoolPlatform()).emit(self.unit)
+    self.assertEqual(self.functions("tuples"), [
+      "alloc_tuple_0_t", "release_tuple_0_t",
+      "make_tuple_0_t", "free_tuple_0_t", "copy_tuple_0_t",
+      "alloc_tuple_1_t", "release_tuple_1_t",
+      "make_tuple_1_t", "free_tuple_1_t", "copy_tuple_1_t"
+    ])
+    self.assertIn("tuple_0_t tuple_0_pool[32];\ntuple_0_t* tuple_0_free;\n" +
+                  "int tuple_0_used;", result)
+    self.assertIn("tuple_1_t tuple_1_pool[8];", result)
+    self.assertIn("if((tuple_0_free != NULL)){tuple = tuple_0_free;\n" +
+                  "tuple_0_free = tuple->next;}else {" +
+                  "if((tuple_0_used < 32)){tuple = &tuple_0_pool[tuple_0_used];\n" +
+                  "tuple_0_used++;}}", result)
+    self.assertIn("tuple->next = tuple_0_free;\ntuple_0_free = tuple;", result)
+    self.assertIn("tuple_0_t* tuple = alloc_tuple_0_t();", result)
+    self.assertIn("free_payload(tuple->elem_1);\nrelease_tuple_0_t(tuple);",
+                  result)
+    self.assertNotIn("malloc", result)
+
+  def test_arena(self):
+    self.clear("queue", code.IntegerType(), code.ObjectType("payload"))
+    self.clear("other", code.ByteType())
+    result = C.Emitter(platform=ArenaPlatform()).emit(self.unit)
+    self.assertEqual(self.functions("tuples"), [
+      "alloc_from_arena", "reset_arena",
+      "make_tuple_0_t", "free_tuple_0_t", "copy_tuple_0_t",
+      "make_tuple_1_t", "free_tuple_1_t", "copy_tuple_1_t"
+    ])
+    self.assertIn("char arena[1024];\nint arena_used;", result)
+    self.assertIn("if(((arena_used + size) <= 1024)){block = &arena[arena_used];",
+                  result)
+    self.assertIn("tuple_1_t* tuple = alloc_from_arena(sizeof(tuple_1_t));",
+                  result)
+    self.assertIn("void free_tuple_1_t(tuple_1_t* tuple) {\n\n}", result)
+
+  def test_unknown_allocator(self):
+    class Broken(C.Generic): allocator = "gc"
+    self.clear("queue", code.IntegerType())
+    self.assertRaises(AssertionError, C.Emitter(platform=Broken()).emit,
+                      self.unit)
+
+  def test_clear(self):
+    self.clear("linked", code.IntegerType(), code.ObjectType("payload"))
+    self.clear("array",  code.IntegerType(), code.ObjectType("payload")) \
+        .tag("array")
+    self.clear("columns", code.IntegerType(), code.ObjectType("payload")) \
+        .tag("columns")
+    self.clear("bytes", code.ByteType()).tag("array")
+    result = C.Emitter().emit(self.unit)
+    self.assertEqual(self.functions("lists"), [
+      "list_of_tuple_0_ts_clear", "array_of_tuple_0_ts_clear",
+      "columns_of_tuple_0_ts_clear", "array_of_tuple_1_ts_clear"
+    ])
+    self.assertIn("while((iter != NULL)) {\ntuple_0_t* next = iter->next;\n" +
+                  "free_tuple_0_t(iter);\niter = next;\n}\n*list = NULL;",
+                  result)
+    self.assertIn("tuple_0_t* iter = &list->data[index];\n" +
+                  "free_payload(iter->elem_1);\n}\nlist->size = 0;", result)
+    self.assertIn("free_payload(list->elem_1[index]);\n}\nlist->size = 0;",
+                  result)
+    self.assertIn("void array_of_tuple_1_ts_clear(tuple_1_array_t* list) {\n" +
+                  "list->size = 0;\n}", result)
+
+if __name__ == '__main__':
+  suite = unittest.TestLoader().loadTestsFromTestCase(TestAllocators)
+  unittest.TextTestRunner(verbosity=2).run(suite)
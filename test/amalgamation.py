@@ -0,0 +1,94 @@
+# amalgamation.py
+# tests emitting a unit as a single translation unit
+# author: Christophe VG
+
+import os
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+from distutils.spawn import find_executable
+
+from codecanvas.structure import Unit, Module
+
+import codecanvas.instructions as code
+import codecanvas.languages.C  as C
+
+class TestAmalgamation(unittest.TestCase):
+
+  def setUp(self):
+    self.output = tempfile.mkdtemp(prefix="codecanvas-test-")
+
+  def tearDown(self):
+    shutil.rmtree(self.output)
+
+  def unit(self):
+    """
+    main (in app) calls twice (in math), which is defined after it in the unit
+    and uses a global counter.
+    """
+    unit = Unit()
+    app  = unit.append(Module("app"))
+    app.select("dec").append(code.Import("<stdlib.h>"))
+    app.select("dec").append(code.Import("math"))
+    app.select("dec").append(
+      code.Function("main", type=code.IntegerType())
+    ).contains(
+      code.Return(code.FunctionCall("twice", [code.IntegerLiteral(21)],
+                                    type=code.IntegerType()))
+    )
+    math = unit.append(Module("math"))
+    math.select("dec").append(code.Import("<stdlib.h>"))
+    math.select("dec").append(code.VariableDecl("calls", code.IntegerType()))
+    math.select("dec").append(
+      code.Function("twice", type=code.IntegerType(),
+                    params=[code.Parameter("x", code.IntegerType())])
+    ).contains(
+      code.Inc(code.SimpleVariable("calls")),
+      code.Return(code.Mult(code.SimpleVariable("x"), code.IntegerLiteral(2)))
+    )
+    return unit
+
+  def emit(self, unit, **options):
+    C.Emitter().output_to(self.output).amalgamate(**options).emit(unit)
+
+  def read(self, name):
+    file = open(os.path.join(self.output, name))
+    try:     return file.read()
+    finally: file.close()
+
+  def test_modules_are_ordered_by_imports(self):
+    unit = self.unit()
+    unit.select("math", "dec").append(code.Import("app"))   # cyclic
+    unit.append(Module("base"))
+    unit.select("math", "dec").append(code.Import("base"))
+    self.assertEqual([ module.name for module in C.Amalgamation("").order(unit) ],
+                     ["base", "math", "app"])
+
+  def test_single_translation_unit(self):
+    self.emit(self.unit(), name="all")
+    self.assertEqual(sorted(os.listdir(self.output)),
+                     ["all.c", "app.c", "app.h", "math.c", "math.h"])
+    self.assertEqual(self.read("all.c"),
+                     "static int twice(int x);\n" +
+                     "int main(void);\n" +
+                     "#include <stdlib.h>\n" +
+                     "static int calls;\n" +
+                     "static int twice(int x) {\ncalls++;\nreturn (x * 2);\n}\n" +
+                     "int main(void) {\nreturn twice(21);\n}\n")
+
+  def test_exported_functions(self):
+    self.emit(self.unit(), exported=["main", "twice"])
+    self.assertIn("\nint twice(int x) {", self.read("unity.c"))
+
+  @unittest.skipUnless(find_executable("gcc"), "requires gcc")
+  def test_compiles(self):
+    self.emit(self.unit())
+    subprocess.check_output(["gcc", "-std=gnu99", "-o", "app", "unity.c"],
+                            cwd=self.output, stderr=subprocess.STDOUT)
+    self.assertEqual(subprocess.call([os.path.join(self.output, "app")]), 42)
+
+if __name__ == '__main__':
+  suite = unittest.TestLoader().loadTestsFromTestCase(TestAmalgamation)
+  unittest.TextTestRunner(verbosity=2).run(suite)
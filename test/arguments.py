@@ -0,0 +1,83 @@
+# arguments.py
+# tests lowering of ListLiterals that are passed to functions
+# author: Christophe VG
+
+import unittest
+
+from codecanvas.structure import Unit, Module
+
+import codecanvas.instructions as code
+import codecanvas.languages.C  as C
+
+class TestArguments(unittest.TestCase):
+
+  def setUp(self):
+    self.unit = Unit()
+    self.unit.append(Module("test"))
+    self.function = self.unit.select("test", "dec").append(
+      code.Function("main", params=[code.Parameter("x", code.ByteType())])
+    )
+
+  def call(self, name, *arguments):
+    self.function.append(code.FunctionCall(name, list(arguments)))
+
+  def items(self, *items):
+    return code.ListLiteral().contains(*items)
+
+  def lowered(self, arguments, context=None):
+    platform = C.Generic()
+    platform.arguments = arguments
+    C.Emitter(platform=platform, context=context).passes.run(self.unit)
+    return [ child.accept(C.Dumper()) for child in self.function ]
+
+  def test_varargs(self):
+    self.call("send", code.IntegerLiteral(7),
+                      self.items(code.AtomLiteral("hello"), code.IntegerLiteral(1)))
+    self.call("stop", self.items())
+    self.assertEqual(self.lowered("varargs"), [
+      "send(7, 2, atom_hello, 1);",
+      "stop(NULL);"
+    ])
+
+  def test_fixed_arity_specializations(self):
+    context = C.Context()
+    self.call("send", code.IntegerLiteral(7),
+                      self.items(code.AtomLiteral("hello"), code.IntegerLiteral(1)))
+    self.call("send", code.IntegerLiteral(8), self.items(code.IntegerLiteral(1)))
+    self.call("send", code.IntegerLiteral(9), self.items(code.IntegerLiteral(2)))
+    self.call("stop", self.items())
+    self.assertEqual(self.lowered("fixed", context), [
+      "send_2(7, atom_hello, 1);",
+      "send_1(8, 1);",
+      "send_1(9, 2);",
+      "stop_0();"
+    ])
+    self.assertEqual(context.arities, { "send": set(["send_1", "send_2"]),
+                                        "stop": set(["stop_0"]) })
+
+  def test_constant_arrays(self):
+    self.call("send", code.IntegerLiteral(7),
+                      self.items(code.AtomLiteral("hello"), code.IntegerLiteral(1)))
+    self.call("log", self.items(code.ByteLiteral(1), code.ByteLiteral(2)))
+    self.call("stop", self.items())
+    self.assertEqual(self.lowered("array"), [
+      "static const int arguments_0[] = { atom_hello, 1 };",
+      "static const char arguments_1[] = { 0x01, 0x02 };",
+      "send(7, 2, arguments_0);",
+      "log(2, arguments_1);",
+      "stop(0, NULL);"
+    ])
+
+  def test_arrays_with_variables(self):
+    self.call("log", self.items(code.SimpleVariable("x", info=code.ByteType()),
+                                code.ByteLiteral(2)))
+    self.call("send", self.items(code.AtomLiteral("a"), code.AtomLiteral("b")))
+    self.assertEqual(self.lowered("array"), [
+      "static const atom_t arguments_0[] = { atom_a, atom_b };",
+      "log(2, (const char[]){ x, 0x02 });",
+      "send(2, arguments_0);"
+    ])
+
+if __name__ == '__main__':
+  suite = unittest.TestLoader().loadTestsFromTestCase(TestArguments)
+  unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,119 @@
+# arrays.py
+# tests array-backed lowering of lists
+# author: Christophe VG
+
+import unittest
+
+from codecanvas.structure import Unit, Module
+
+import codecanvas.instructions as code
+import codecanvas.languages.C  as C
+
+class ArrayPlatform(C.Generic):
+  lists = "array"
+
+class TestArrayLists(unittest.TestCase):
+
+  def setUp(self):
+    self.unit = Unit()
+    self.unit.append(Module("includes"))
+    self.unit.append(Module("test"))
+    self.unit.select("test", "dec").append(code.Import("includes")) \
+                                   .tag("requires-tuples")
+    self.function = self.unit.select("test", "dec").append(
+      code.Function("main")
+    )
+    self.type = code.ManyType(
+      code.TupleType([code.IntegerType(), code.ObjectType("payload")])
+    )
+    self.list = code.Object("queue", self.type)
+
+  def call(self, method, *arguments):
+    self.function.append(
+      code.MethodCall(self.list, method,
+                      [code.ListLiteral().contains(*arguments)],
+                      type=code.BooleanType())
+    )
+
+  def functions(self):
+    return [ child.name for child in self.unit.select("lists", "dec")
+                        if isinstance(child, code.Function) ]
+
+  def structs(self):
+    return [ child.name.name for child in self.unit.select("lists", "def")
+                             if isinstance(child, code.StructuredType) ]
+
+  def payload(self):
+    return code.SimpleVariable("p", info=code.ObjectType("payload"))
+
+  def test_layout_selection(self):
+    self.assertEqual(C.layout(self.type, C.Generic()), "linked")
+    self.assertEqual(C.layout(self.type, ArrayPlatform()), "array")
+    self.type.tag("linked")
+    self.assertEqual(C.layout(self.type, ArrayPlatform()), "linked")
+    self.assertEqual(C.layout(code.ManyType(code.IntegerType()).tag("array"),
+                              C.Generic()), "array")
+
+  def test_platform_selects_arrays(self):
+    self.call("push", code.IntegerLiteral(1), self.payload())
+    self.call("contains", code.Match("*"), code.Match("*"))
+    C.Emitter(platform=ArrayPlatform()).passes.run(self.unit)
+    self.assertEqual(self.structs(), ["tuple_0_array"])
+    self.assertEqual(self.functions(), [
+      "array_of_tuple_0_ts_push", "array_of_tuple_0_ts_contains"
+    ])
+    push = self.function[0]
+    self.assertEqual(push.function.name, "array_of_tuple_0_ts_push")
+    self.assertEqual(push.accept(C.Dumper()),
+                     "array_of_tuple_0_ts_push(&queue, 1, p);")
+
+  def test_matched_arguments_are_passed(self):
+    self.call("contains", code.Match("*"), self.payload())
+    C.Emitter(platform=ArrayPlatform()).passes.run(self.unit)
+    contains = self.unit.select("lists", "dec")[-1]
+    self.assertEqual([ param.name for param in contains.params ],
+                     [ "list", "arg_0" ])
+    call = self.function[0]
+    self.assertEqual(call.function.name, contains.name)
+    self.assertEqual([ arg.accept(C.Dumper()) for arg in call.arguments ],
+                     [ "&queue", "p" ])
+
+  def test_lists_can_be_tagged(self):
+    self.type.tag("array")
+    self.call("contains", code.Match("*"), code.Match("*"))
+    other = code.Object("other", code.ManyType(self.type.type))
+    self.function.append(code.MethodCall(other, "contains",
+      [code.ListLiteral().contains(code.Match("*"), code.Match("*"))],
+      type=code.BooleanType()))
+    C.Emitter().passes.run(self.unit)
+    self.assertEqual(self.functions(), [
+      "array_of_tuple_0_ts_contains", "list_of_tuple_0_ts_contains"
+    ])
+
+  def test_dumped_functions(self):
+    self.call("push", code.SimpleVariable("i"), self.payload())
+    self.call("remove", code.Match("*"), self.payload())
+    result = C.Emitter(platform=ArrayPlatform()).emit(self.unit)
+    self.assertIn("typedef struct tuple_0_array_t {\n" +
+                  "tuple_0_t* data;\nint size;\nint capacity;\n" +
+                  "} tuple_0_array_t;", result)
+    self.assertIn("list->data = realloc(list->data, " +
+                  "(list->capacity * sizeof(tuple_0_t)));", result)
+    self.assertIn("tuple_0_t* item = &list->data[list->size];\n" +
+                  "item->elem_0 = elem_0;\n" +
+                  "item->elem_1 = copy_payload(elem_1);\n" +
+                  "list->size++;", result)
+    self.assertIn("for(int index = 0; (index < list->size); index++) {\n" +
+                  "tuple_0_t* iter = &list->data[index];", result)
+    self.assertIn("list->data[kept] = *iter;", result)
+    self.assertIn("list->size = kept;\nreturn removed;", result)
+
+  def test_dumped_type(self):
+    type = code.ManyType(code.NamedType("tuple_0_t"))
+    self.assertEqual(type.accept(C.Dumper(platform=ArrayPlatform())),
+                     "tuple_0_array_t")
+    self.assertEqual(type.accept(C.Dumper(platform=C.Generic())), "tuple_0_t*")
+
+if __name__ == '__main__':
+  suite = unittest.TestLoader().loadTestsFromTestCase(TestArrayLists)
+  unittest.TextTestRunner(verbosity=2).run(suite)
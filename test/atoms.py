@@ -0,0 +1,85 @@
+# atoms.py
+# tests lowering of atoms to an enumeration
+# author: Christophe VG
+
+import unittest
+
+from codecanvas.structure import Unit, Module
+
+import codecanvas.instructions as code
+import codecanvas.languages.C  as C
+
+class TestAtoms(unittest.TestCase):
+
+  def unit(self, *names):
+    unit = Unit()
+    unit.append(Module("includes"))
+    unit.append(Module("test"))
+    unit.select("test", "dec").append(code.Import("includes")) \
+                              .tag("requires-tuples")
+    self.function = unit.select("test", "dec").append(code.Function("main"))
+    self.function.append(code.FunctionCall("send", [ code.AtomLiteral(name)
+                                                     for name in names ]))
+    return unit
+
+  def dump(self, section):
+    return "\n".join([ child.accept(C.Dumper()) for child in section ])
+
+  def imports(self, unit, module):
+    return [ child.imported for child in unit.select(module, "dec")
+                            if isinstance(child, code.Import) ]
+
+  def test_atoms_are_enumerated(self):
+    unit = self.unit("hello", "world", "hello")
+    C.Emitter().passes.run(unit)
+    self.assertEqual(self.dump(self.function),
+                     "send(atom_hello, atom_world, atom_hello);")
+    self.assertEqual(self.dump(unit.select("atoms", "def")),
+                     "#include <stdint.h>\n" +
+                     "enum atoms {\natom_hello = 1,\natom_world = 2\n};\n" +
+                     "typedef uint8_t atom_t;")
+    self.assertEqual(self.imports(unit, "test").count("atoms"), 1)
+
+  def test_atoms_can_be_stored_in_words(self):
+    platform = C.Generic()
+    platform.atoms = "word"
+    unit = self.unit("hello")
+    C.Emitter(platform=platform).passes.run(unit)
+    self.assertIn("typedef uint32_t atom_t;",
+                  self.dump(unit.select("atoms", "def")))
+
+  def test_generated_functions_import_atoms(self):
+    unit = self.unit()
+    self.function.append(code.MethodCall(
+      code.Object("list", code.ManyType(
+        code.TupleType([code.ByteType(), code.IntegerType()])
+      )),
+      "contains", [code.ListLiteral().contains(
+        code.Match("==", code.AtomLiteral("pong")), code.Match("*")
+      )], type=code.BooleanType()
+    ))
+    C.Emitter().passes.run(unit)
+    function = unit.select("lists", "dec")[-1]
+    self.assertEqual(function.name, "list_of_tuple_0_ts_contains_match_eq_atom_pong")
+    self.assertIn("(iter->elem_0 == atom_pong)", self.dump(function))
+    self.assertIn("atoms", self.imports(unit, "lists"))
+
+  def test_shared_context_keeps_indices(self):
+    context = C.Context()
+    first   = self.unit("hello")
+    second  = self.unit("world", "hello")
+    C.Emitter(context=context).passes.run(first)
+    C.Emitter(context=context).passes.run(second)
+    self.assertEqual(self.dump(second.select("atoms", "def")),
+                     "#include <stdint.h>\n" +
+                     "enum atoms {\natom_hello = 1,\natom_world = 2\n};\n" +
+                     "typedef uint8_t atom_t;")
+
+  def test_units_without_atoms(self):
+    unit = self.unit()
+    C.Emitter().passes.run(unit)
+    self.assertIsNone(unit.find("atoms"))
+
+if __name__ == '__main__':
+  suite = unittest.TestLoader().loadTestsFromTestCase(TestAtoms)
+  unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,75 @@
+# benchmark.py
+# tests the benchmark suite of emitted code
+# author: Christophe VG
+
+import unittest
+
+from distutils.spawn import find_executable
+
+import codecanvas.instructions as code
+import codecanvas.languages.C  as C
+import codecanvas.benchmark    as benchmark
+
+class TestBenchmark(unittest.TestCase):
+
+  def case(self, operator="==", layout="linked", shape=("int", "int")):
+    return benchmark.Case(shape, 16, operator, layout, "0")
+
+  def functions(self, unit, module):
+    return [ child.name for child in unit.select(module, "dec")
+                        if isinstance(child, code.Function) ]
+
+  def test_matrix(self):
+    cases = benchmark.cases(sizes=[16], levels=["0"])
+    names = [ str(case) for case in cases ]
+    self.assertIn("int,int/16/==/hashed/-O0", names)
+    self.assertIn("int,int/16/>/sorted/-O0",  names)
+    self.assertNotIn("int,int/16/</hashed/-O0", names)
+    self.assertNotIn("int,int/16/==/sorted/-O0", names)
+    self.assertEqual(len(cases), len(benchmark.SHAPES) * 3 * 4)
+
+  def test_emitted_unit(self):
+    case = self.case(">", "sorted", ("int", "byte"))
+    unit = case.unit()
+    C.Emitter(platform=case.platform()).passes.run(unit)
+    self.assertEqual(self.functions(unit, "bench"), [
+      "bench_push", "bench_contains", "bench_remove", "bench_clear"
+    ])
+    self.assertEqual(self.functions(unit, "lists"), [
+      "sorted_tuple_0_ts_on_0_bound",
+      "sorted_tuple_0_ts_on_0_push",
+      "sorted_tuple_0_ts_on_0_contains_match_gt_target",
+      "sorted_tuple_0_ts_on_0_remove_match_gt_target",
+      "array_of_tuple_0_ts_clear"
+    ])
+
+  def test_harness(self):
+    harness = self.case(">").harness(0.5)
+    self.assertIn("#define SIZE    16\n#define MINIMUM 0.500000\n", harness)
+    self.assertIn("key = SIZE;\n          bench_push(key);\n" +
+                  "          key = SIZE - 1;\n", harness)
+
+  def test_compare(self):
+    baseline = { "a": { "fill": 10.0, "contains": 100.0 },
+                 "b": { "fill": 10.0 } }
+    results  = { "a": { "fill": 12.0, "contains": 200.0, "update": 1.0 },
+                 "b": { "fill": 13.0 },
+                 "c": { "fill": 99.0 } }
+    self.assertEqual(benchmark.compare(results, baseline), [
+      ("a", "contains", 100.0, 200.0), ("b", "fill", 10.0, 13.0)
+    ])
+    self.assertEqual(benchmark.compare(results, baseline, tolerance=0.5), [
+      ("a", "contains", 100.0, 200.0)
+    ])
+
+  @unittest.skipUnless(find_executable("gcc"), "requires gcc")
+  def test_run(self):
+    for case in [ self.case("==", "linked"), self.case("<", "columns"),
+                  self.case("==", "hashed"), self.case(">", "sorted") ]:
+      result = benchmark.Runner(minimum=0.001).run(case)
+      self.assertEqual(sorted(result.keys()), sorted(benchmark.METRICS))
+      for metric in benchmark.METRICS: self.assertGreater(result[metric], 0)
+
+if __name__ == '__main__':
+  suite = unittest.TestLoader().loadTestsFromTestCase(TestBenchmark)
+  unittest.TextTestRunner(verbosity=2).run(suite)
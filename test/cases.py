@@ -0,0 +1,129 @@
+# cases.py
+# tests lowering of CaseStatements
+# author: Christophe VG
+
+import unittest
+
+from codecanvas.structure import Unit, Module
+
+import codecanvas.instructions as code
+import codecanvas.languages.C  as C
+
+from codecanvas.optimizations.inlining import Inlining
+
+class TestCaseStatements(unittest.TestCase):
+
+  def setUp(self):
+    self.unit = Unit()
+    self.unit.append(Module("test"))
+
+  def lowered(self, cases, consequences, otherwise=None, expression=None,
+                    type=code.VoidType(), emitter=None):
+    if expression is None: expression = code.SimpleVariable("x")
+    function = self.unit.select("test", "dec").append(
+      code.Function("f", type=type, params=[code.Parameter("x", code.IntegerType())])
+    )
+    function.append(code.CaseStatement(expression, cases, consequences, otherwise))
+    (emitter or C.Emitter()).passes.run(self.unit)
+    self.function = function
+    return "\n".join([ child.accept(C.Dumper()) for child in function ])
+
+  def literals(self, *values):
+    return [ code.IntegerLiteral(value) for value in values ]
+
+  def returns(self, *values):
+    return [ [ code.Return(code.IntegerLiteral(value)) ] for value in values ]
+
+  def calls(self, *names):
+    return [ [ code.FunctionCall(name) ] for name in names ]
+
+  def test_lookup_table(self):
+    self.assertEqual(
+      self.lowered(self.literals(1, 2, 3, 5), self.returns(10, 20, 30, 50),
+                   [ code.Return(code.IntegerLiteral(-1)) ],
+                   type=code.IntegerType()),
+      "static const int case_table_0[] = { 10, 20, 30, -1, 50 };\n" +
+      "if(((x >= 1) && (x <= 5))){return case_table_0[(x - 1)];}\n" +
+      "return -1;"
+    )
+
+  def test_lookup_table_uses_copies_of_the_value(self):
+    self.lowered(self.literals(0, 1, 2, 3), self.returns(10, 20, 30, 40),
+                 [ code.Return(code.IntegerLiteral(-1)) ],
+                 type=code.IntegerType())
+    test  = self.function[1].expression
+    index = self.function[1].true_clause[0].expression.index
+    self.assertIsNot(index, test.left.left)
+    self.assertIsNot(index, test.right.left)
+    self.assertIsNot(test.left.left, test.right.left)
+
+  def test_lookup_table_requires_constants_for_gaps(self):
+    result = self.lowered(self.literals(0, 1, 2, 4), self.returns(1, 2, 3, 4),
+                          type=code.IntegerType())
+    self.assertTrue(result.startswith("switch(x) {\ncase 0:\nreturn 1;\n"))
+
+  def test_switch(self):
+    self.assertEqual(
+      self.lowered(self.literals(4, 1, 2, 3),
+                   self.calls("a", "b", "c") + self.returns(7),
+                   self.calls("z")[0]),
+      "switch(x) {\n" +
+      "case 4:\na();\nbreak;\n" +
+      "case 1:\nb();\nbreak;\n" +
+      "case 2:\nc();\nbreak;\n" +
+      "case 3:\nreturn 7;\n" +
+      "default:\nz();\nbreak;\n" +
+      "}"
+    )
+
+  def test_comparison_tree(self):
+    self.assertEqual(
+      self.lowered(self.literals(1000, 1, 50), self.calls("a", "b", "c"),
+                   self.calls("z")[0]),
+      "if((x < 50)){if((x == 1)){b();}else {z();}}" +
+      "else {if((x == 50)){c();}else {if((x == 1000)){a();}else {z();}}}"
+    )
+
+  def test_computed_expressions_are_evaluated_once(self):
+    self.assertEqual(
+      self.lowered(self.literals(1, 9), self.calls("a", "b"),
+                   expression=code.FunctionCall("g", type=code.IntegerType())),
+      "int case_value_0 = g();\n" +
+      "if((case_value_0 < 9)){if((case_value_0 == 1)){a();}}" +
+      "else {if((case_value_0 == 9)){b();}}"
+    )
+
+  def test_matches(self):
+    self.assertEqual(
+      self.lowered([ code.Match("<", code.IntegerLiteral(0)),
+                     code.Match("==", code.SimpleVariable("y")),
+                     code.Match("*") ],
+                   self.calls("a", "b", "c")),
+      "if((x < 0)){a();}else {if((x == y)){b();}else {c();}}"
+    )
+
+  def test_lowered_statements_are_spliced(self):
+    self.unit.select("test", "dec").append(
+      code.Function("g").contains(code.Assign("n", code.IntegerLiteral(1)))
+    )
+    result = self.lowered([ code.Match("<", code.IntegerLiteral(0)),
+                            code.Match("*") ],
+                          self.calls("a", "g"),
+                          expression=code.FunctionCall("h",
+                                                       type=code.IntegerType()),
+                          emitter=C.Emitter().add_pass(Inlining()))
+    self.assertEqual(result, "int case_value_0 = h();\n" +
+                             "if((case_value_0 < 0)){a();}else {n = 1;}")
+    self.assertEqual([ child.__class__ for child in self.function ],
+                     [ code.Assign, code.IfStatement ])
+
+  def test_duplicate_cases_keep_their_order(self):
+    self.assertEqual(
+      self.lowered(self.literals(1, 1), self.calls("a", "b"),
+                   self.calls("z")[0]),
+      "if((x == 1)){a();}else {if((x == 1)){b();}else {z();}}"
+    )
+
+if __name__ == '__main__':
+  suite = unittest.TestLoader().loadTestsFromTestCase(TestCaseStatements)
+  unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,131 @@
+# columns.py
+# tests structure-of-arrays lowering of lists
+# author: Christophe VG
+
+import unittest
+
+from codecanvas.structure import Unit, Module
+
+import codecanvas.instructions as code
+import codecanvas.languages.C  as C
+
+class ColumnPlatform(C.Generic):
+  lists = "columns"
+
+class TestColumnLists(unittest.TestCase):
+
+  def setUp(self):
+    self.unit = Unit()
+    self.unit.append(Module("includes"))
+    self.unit.append(Module("test"))
+    self.unit.select("test", "dec").append(code.Import("includes")) \
+                                   .tag("requires-tuples")
+    self.function = self.unit.select("test", "dec").append(
+      code.Function("main")
+    )
+    self.type = code.ManyType(code.TupleType([
+      code.IntegerType(), code.ObjectType("payload"), code.ByteType()
+    ]))
+    self.list = code.Object("queue", self.type)
+
+  def call(self, method, *arguments):
+    self.function.append(
+      code.MethodCall(self.list, method,
+                      [code.ListLiteral().contains(*arguments)],
+                      type=code.BooleanType())
+    )
+
+  def functions(self):
+    return [ child for child in self.unit.select("lists", "dec")
+                   if isinstance(child, code.Function) ]
+
+  def payload(self):
+    return code.SimpleVariable("p", info=code.ObjectType("payload"))
+
+  def emit(self):
+    return C.Emitter(platform=ColumnPlatform()).emit(self.unit)
+
+  def test_columns_type(self):
+    self.call("contains", code.Match("*"), code.Match("*"), code.Match("*"))
+    result = self.emit()
+    self.assertIn("typedef struct tuple_0_soa_t {\n" +
+                  "int* elem_0;\npayload_t** elem_1;\nchar* elem_2;\n" +
+                  "int size;\nint capacity;\n" +
+                  "} tuple_0_soa_t;", result)
+    self.assertEqual(code.ManyType(code.NamedType("tuple_0_t")).accept(
+                       C.Dumper(platform=ColumnPlatform())), "tuple_0_soa_t")
+
+  def test_scans_only_load_columns_that_are_read(self):
+    self.call("contains", code.Match("*"), code.Match("*"),
+                          code.Match("==", code.ByteLiteral(3)))
+    result = self.emit()
+    self.assertEqual([ function.name for function in self.functions() ],
+                     [ "columns_of_tuple_0_ts_contains_match_eq_0x03" ])
+    self.assertIn("(tuple_0_soa_t* list) {\n" +
+                  "char* elem_2 = list->elem_2;\n" +
+                  "for(int index = 0; (index < list->size); index++) {\n" +
+                  "if((elem_2[index] == 0x03)){return TRUE;}\n" +
+                  "}\nreturn FALSE;\n}", result)
+    self.assertNotIn("elem_0 = list->elem_0", result)
+
+  def test_push_appends_to_all_columns(self):
+    self.call("push", code.SimpleVariable("i"), self.payload(),
+                      code.SimpleVariable("b"))
+    result = self.emit()
+    self.assertEqual(len(self.function[0].arguments), 4)
+    self.assertIn("list->elem_1 = realloc(list->elem_1, " +
+                  "(list->capacity * sizeof(*list->elem_1)));", result)
+    self.assertIn("list->elem_0[list->size] = elem_0;\n" +
+                  "list->elem_1[list->size] = copy_payload(elem_1);\n" +
+                  "list->elem_2[list->size] = elem_2;\n" +
+                  "list->size++;", result)
+
+  def test_arguments_and_literals(self):
+    self.call("push", code.IntegerLiteral(1), self.payload(), code.ByteLiteral(2))
+    self.call("contains", code.Match("*"), self.payload(), code.ByteLiteral(3))
+    result = self.emit()
+    self.assertIn("columns_of_tuple_0_ts_push(&queue, 1, p, 0x02);", result)
+    self.assertIn("columns_of_tuple_0_ts_contains_match_arg_0_match_eq_0x03(" +
+                  "&queue, p)", result)
+    self.assertIn("int columns_of_tuple_0_ts_contains_match_arg_0_match_eq_0x03(" +
+                  "tuple_0_soa_t* list, payload_t* arg_0) {", result)
+    self.assertIn("if((equal_payload(arg_0, elem_1[index]) && " +
+                  "(elem_2[index] == 0x03))){return TRUE;}", result)
+
+  def test_ranged_columns_are_accessed_with_their_stored_type(self):
+    self.list = code.Object("queue", code.ManyType(code.TupleType([
+      code.IntegerType((0, 1000)), code.ObjectType("payload"), code.ByteType()
+    ])))
+    self.call("contains", code.Match("==", code.FunctionCall("a",
+                                             type=code.IntegerType())),
+                          code.Match("*"), code.Match("*"))
+    result = self.emit()
+    self.assertIn("uint16_t* elem_0;", result)
+    self.assertIn("uint16_t* elem_0 = list->elem_0;", result)
+    self.assertNotIn("uint_fast16_t*", result)
+
+  def test_remove_compacts_all_columns(self):
+    self.call("remove", code.Match("*"), self.payload(), code.Match("*"))
+    result = self.emit()
+    self.assertIn("payload_t** elem_1 = list->elem_1;", result)
+    self.assertIn("if(equal_payload(arg_0, elem_1[index])){" +
+                  "free_payload(list->elem_1[index]);\nremoved++;}else {" +
+                  "list->elem_0[kept] = list->elem_0[index];\n" +
+                  "list->elem_1[kept] = list->elem_1[index];\n" +
+                  "list->elem_2[kept] = list->elem_2[index];\n" +
+                  "kept++;}", result)
+
+  def test_layouts_are_specialized_separately(self):
+    self.call("contains", code.Match("*"), code.Match("*"), code.Match("*"))
+    other = code.Object("other", code.ManyType(self.type.type).tag("array"))
+    self.function.append(code.MethodCall(other, "contains",
+      [code.ListLiteral().contains(*[ code.Match("*") for i in range(3) ])],
+      type=code.BooleanType()))
+    C.Emitter(platform=ColumnPlatform()).passes.run(self.unit)
+    self.assertEqual([ function.name for function in self.functions() ], [
+      "columns_of_tuple_0_ts_contains", "array_of_tuple_0_ts_contains"
+    ])
+
+if __name__ == '__main__':
+  suite = unittest.TestLoader().loadTestsFromTestCase(TestColumnLists)
+  unittest.TextTestRunner(verbosity=2).run(suite)
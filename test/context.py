@@ -0,0 +1,93 @@
+# context.py
+# tests lowering context functionality
+# author: Christophe VG
+
+import unittest
+import threading
+
+from codecanvas.structure import Unit, Module
+
+import codecanvas.instructions as code
+import codecanvas.languages.C  as C
+
+class TestContext(unittest.TestCase):
+
+  def unit(self, *types):
+    unit = Unit()
+    unit.append(Module("includes"))
+    unit.append(Module("test"))
+    unit.select("test", "dec").append(code.Import("includes")) \
+                              .tag("requires-tuples")
+    function = unit.select("test", "dec").append(code.Function("main"))
+    for index, types in enumerate(types):
+      function.append(code.MethodCall(
+        code.Object("list" + str(index), code.ManyType(code.TupleType(types))),
+        "push", [ code.ListLiteral().contains(*[ code.SimpleVariable("x")
+                                                 for type in types ]) ]
+      ))
+    return unit
+
+  def structs(self, unit):
+    return [ child.name.name for child in unit.select("tuples", "def")
+                             if isinstance(child, code.StructuredType) ]
+
+  def test_registries(self):
+    context = C.Context()
+    self.assertEqual(context.tuple("int,int"),  "tuple_0")
+    self.assertEqual(context.tuple("int,byte"), "tuple_1")
+    self.assertEqual(context.tuple("int,int"),  "tuple_0")
+    self.assertEqual(context.atom("hello"), 1)
+    self.assertEqual(context.atom("world"), 2)
+    self.assertEqual(context.atom("hello"), 1)
+    context.reset()
+    self.assertEqual(context.tuple("int,byte"), "tuple_0")
+    self.assertEqual(context.atoms, [])
+
+  def test_colliding_specializations(self):
+    context = C.Context()
+    self.assertEqual(context.specialization("a", "f"),   "f")
+    self.assertEqual(context.specialization("b", "f_2"), "f_2")
+    self.assertEqual(context.specialization("c", "f"),   "f_3")
+    self.assertEqual(context.specialization("d", "f"),   "f_4")
+    self.assertEqual(context.specialization("c", "f"),   "f_3")
+
+  def test_every_emit_starts_afresh(self):
+    emitter = C.Emitter()
+    emitter.emit(self.unit([code.IntegerType(), code.IntegerType()]))
+    second  = self.unit([code.ByteType()], [code.IntegerType(), code.IntegerType()])
+    result  = emitter.emit(second)
+    self.assertEqual(self.structs(second), ["tuple_0", "tuple_1"])
+    self.assertEqual(len(emitter.context.tuples), 2)
+    self.assertEqual(result, C.Emitter().emit(
+      self.unit([code.ByteType()], [code.IntegerType(), code.IntegerType()])
+    ))
+
+  def test_shared_context_defines_tuples_in_every_unit(self):
+    context = C.Context()
+    first   = self.unit([code.IntegerType()])
+    second  = self.unit([code.ByteType()], [code.IntegerType()])
+    C.Emitter(context=context).passes.run(first)
+    C.Emitter(context=context).passes.run(second)
+    self.assertEqual(self.structs(first),  ["tuple_0"])
+    self.assertEqual(self.structs(second), ["tuple_1", "tuple_0"])
+
+  def test_concurrent_emits(self):
+    units   = [ self.unit([code.IntegerType()] * (index + 1))
+                for index in range(8) ]
+    context = C.Context()
+    results = {}
+    def emit(index):
+      results[index] = C.Emitter(context=context).passes.run(units[index])
+    threads = [ threading.Thread(target=emit, args=(index,))
+                for index in range(len(units)) ]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    self.assertEqual(len(results), len(units))
+    self.assertEqual(sorted(context.tuples.values()),
+                     sorted([ "tuple_" + str(index)
+                              for index in range(len(units)) ]))
+    for unit in units: self.assertEqual(len(self.structs(unit)), 1)
+
+if __name__ == '__main__':
+  suite = unittest.TestLoader().loadTestsFromTestCase(TestContext)
+  unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,93 @@
+# dce.py
+# tests dead code elimination functionality
+# author: Christophe VG
+
+import unittest
+
+from codecanvas.structure import Unit, Module
+
+import codecanvas.instructions as code
+import codecanvas.passes       as passes
+import codecanvas.languages.C  as C
+
+from codecanvas.optimizations.dce     import UnreachableCode, UnusedFunctions
+from codecanvas.optimizations.folding import ConstantFolding
+
+class TestDeadCode(unittest.TestCase):
+
+  def setUp(self):
+    self.unit = Unit()
+    self.unit.append(Module("includes"))
+    self.unit.append(Module("test"))
+    self.unit.select("test", "dec").append(code.Import("includes")) \
+                                   .tag("requires-tuples")
+    self.function = self.unit.select("test", "dec").append(
+      code.Function("main", type=code.IntegerType())
+    )
+
+  def names(self, module, section):
+    return [child.name for child in self.unit.select(module, section)
+                       if isinstance(child, code.Function)]
+
+  def test_statements_after_return(self):
+    self.function.append(
+      code.IfStatement(code.SimpleVariable("a"),
+        [ code.Return(code.IntegerLiteral(1)), code.Print("never") ],
+        [ code.Return(code.IntegerLiteral(2)) ]
+      ),
+      code.Print("never"),
+      code.Return(code.IntegerLiteral(0))
+    )
+    unreachable = UnreachableCode()
+    passes.Manager(unreachable).run(self.unit)
+    self.assertEqual(len(self.function), 1)
+    self.assertEqual(len(self.function[0].true_clause), 1)
+    self.assertEqual(len(unreachable.removed), 3)
+
+  def test_statements_after_return_in_loop(self):
+    loop = code.WhileDo(code.SimpleVariable("a")).contains(
+      code.Return(code.IntegerLiteral(1)),
+      code.Assign("a", code.BooleanLiteral(False))
+    )
+    self.function.append(loop, code.Return(code.IntegerLiteral(0)))
+    passes.Manager(UnreachableCode()).run(self.unit)
+    self.assertEqual(len(loop), 1)
+    self.assertEqual(len(self.function), 2)
+
+  def list_call(self, method, arguments):
+    tuple = code.TupleType([code.IntegerType(), code.ByteType()])
+    self.function.append(
+      code.MethodCall(code.Object("queue", code.ManyType(tuple)), method,
+                      [code.ListLiteral().contains(*arguments)],
+                      type=code.BooleanType())
+    )
+
+  def test_unused_generated_functions(self):
+    self.list_call("push", [ code.SimpleVariable("a"), code.SimpleVariable("b") ])
+    unused  = UnusedFunctions()
+    emitter = C.Emitter().add_pass(unused)
+    emitter.passes.run(self.unit)
+    self.assertEqual(self.names("tuples", "dec"), ["make_tuple_0_t"])
+    self.assertEqual(self.names("tuples", "def"), ["make_tuple_0_t"])
+    self.assertEqual(sorted(unused.removed), ["copy_tuple_0_t", "free_tuple_0_t"])
+    self.assertEqual(self.names("lists", "dec"), ["list_of_tuple_0_ts_push"])
+
+  def test_functions_called_by_used_functions_are_kept(self):
+    self.list_call("remove", [ code.Match("<", code.FunctionCall("now")),
+                               code.Match("*") ])
+    emitter = C.Emitter().add_pass(UnusedFunctions())
+    emitter.passes.run(self.unit)
+    self.assertEqual(self.names("tuples", "dec"), ["free_tuple_0_t"])
+
+  def test_folded_scans_lose_their_loop_tail(self):
+    self.list_call("contains", [ code.Match("*"), code.Match("*") ])
+    emitter = C.Emitter().add_pass(ConstantFolding(), UnreachableCode())
+    emitter.passes.run(self.unit)
+    loop = self.unit.select("lists", "dec")[1][0]
+    self.assertIsInstance(loop, code.WhileDo)
+    self.assertEqual(len(loop), 1)
+    self.assertIsInstance(loop[0], code.Return)
+
+if __name__ == '__main__':
+  suite = unittest.TestLoader().loadTestsFromTestCase(TestDeadCode)
+  unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,127 @@
+# folding.py
+# tests constant folding functionality
+# author: Christophe VG
+
+import unittest
+
+from codecanvas.structure import Unit, Module
+
+import codecanvas.instructions as code
+import codecanvas.passes       as passes
+import codecanvas.languages.C  as C
+
+from codecanvas.optimizations.folding import ConstantFolding
+
+class TestFolding(unittest.TestCase):
+
+  def setUp(self):
+    self.unit = Unit()
+    self.unit.append(Module("test"))
+    self.function = self.unit.select("test", "dec").append(
+      code.Function("main", type=code.IntegerType())
+    )
+
+  def folded(self, expression):
+    self.function.append(code.Return(expression))
+    passes.Manager(ConstantFolding()).run(self.unit)
+    return self.function[-1].expression
+
+  def test_arithmetic(self):
+    result = self.folded(code.Plus(code.IntegerLiteral(2),
+                                   code.Mult(code.IntegerLiteral(3),
+                                             code.IntegerLiteral(4))))
+    self.assertIsInstance(result, code.IntegerLiteral)
+    self.assertEqual(result.value, 14)
+
+  def test_c_division_semantics(self):
+    result = self.folded(code.Div(code.IntegerLiteral(-7), code.IntegerLiteral(2)))
+    self.assertEqual(result.value, -3)
+    result = self.folded(code.Modulo(code.IntegerLiteral(-7), code.IntegerLiteral(2)))
+    self.assertEqual(result.value, -1)
+
+  def test_division_by_zero_is_kept(self):
+    result = self.folded(code.Div(code.IntegerLiteral(1), code.IntegerLiteral(0)))
+    self.assertIsInstance(result, code.Div)
+
+  def test_floats_and_bytes(self):
+    result = self.folded(code.Plus(code.FloatLiteral(1.5), code.ByteLiteral(2)))
+    self.assertIsInstance(result, code.FloatLiteral)
+    self.assertEqual(result.value, 3.5)
+
+  def test_comparisons_and_logic(self):
+    result = self.folded(code.And(code.LT(code.IntegerLiteral(1),
+                                          code.IntegerLiteral(2)),
+                                  code.Not(code.BooleanLiteral(False))))
+    self.assertIsInstance(result, code.BooleanLiteral)
+    self.assertTrue(result.value)
+
+  def test_identities(self):
+    x = code.SimpleVariable("x")
+    flag = code.SimpleVariable("flag", info=code.BooleanType())
+    self.assertIs(self.folded(code.And(flag, code.BooleanLiteral(True))), flag)
+    self.assertIs(self.folded(code.Or(code.BooleanLiteral(False), flag)), flag)
+    self.assertIs(self.folded(code.Mult(code.IntegerLiteral(1), x)), x)
+    self.assertIs(self.folded(code.Plus(x, code.IntegerLiteral(0))), x)
+
+  def test_logical_identities_of_integers_are_normalized(self):
+    x = code.SimpleVariable("x", info=code.IntegerType())
+    for expression in [ code.And(x, code.BooleanLiteral(True)),
+                        code.And(code.BooleanLiteral(True), x),
+                        code.Or(x, code.BooleanLiteral(False)),
+                        code.Or(code.BooleanLiteral(False), x) ]:
+      self.setUp()
+      result = self.folded(expression)
+      self.assertIsInstance(result, code.Not)
+      self.assertIs(result.operand.operand, x)
+
+  def test_double_negation_of_booleans(self):
+    flag = code.SimpleVariable("flag", info=code.BooleanType())
+    self.assertIs(self.folded(code.Not(code.Not(flag))), flag)
+    test = code.LT(code.SimpleVariable("x"), code.IntegerLiteral(3))
+    self.assertIs(self.folded(code.Not(code.Not(test))), test)
+
+  def test_double_negation_of_integers_is_kept(self):
+    x = code.SimpleVariable("x", info=code.IntegerType())
+    for operand in [ x, code.SimpleVariable("y"),
+                     code.FunctionCall("f", type=code.IntegerType()) ]:
+      result = self.folded(code.Not(code.Not(operand)))
+      self.assertIsInstance(result, code.Not)
+      self.assertIs(result.operand.operand, operand)
+
+  def test_side_effects_are_kept(self):
+    call   = code.FunctionCall("f", type=code.BooleanType())
+    result = self.folded(code.And(call, code.BooleanLiteral(False)))
+    self.assertIsInstance(result, code.And)
+    result = self.folded(code.And(code.BooleanLiteral(False), call))
+    self.assertIsInstance(result, code.BooleanLiteral)
+
+  def test_pruning_of_constant_branches(self):
+    self.function.append(
+      code.IfStatement(code.Equals(code.IntegerLiteral(1), code.IntegerLiteral(1)),
+        [ code.IfStatement(code.BooleanLiteral(False),
+                           [ code.Print("never") ],
+                           [ code.Print("always") ]) ],
+        [ code.Print("never") ]
+      )
+    )
+    passes.Manager(ConstantFolding()).run(self.unit)
+    self.assertEqual(len(self.function), 1)
+    self.assertIsInstance(self.function[0], code.Print)
+    self.assertEqual(self.function[0].string.data, "always")
+
+  def test_emitter_pipeline(self):
+    self.function.append(
+      code.IfStatement(code.And(code.SimpleVariable("a",
+                                                    info=code.BooleanType()),
+                                code.BooleanLiteral(True)),
+                       [ code.Return(code.Plus(code.IntegerLiteral(1),
+                                               code.IntegerLiteral(2))) ]),
+      code.Return(code.IntegerLiteral(0))
+    )
+    result = C.Emitter().add_pass(ConstantFolding()).emit(self.unit)
+    self.assertEqual(result, "int main(void);int main(void) {\n" + \
+                             "if(a){return 3;}\nreturn 0;\n}")
+
+if __name__ == '__main__':
+  suite = unittest.TestLoader().loadTestsFromTestCase(TestFolding)
+  unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,192 @@
+# hashing.py
+# tests lowering of lists that are queried for equality to hash tables
+# author: Christophe VG
+
+import unittest
+import os
+import shutil
+import subprocess
+import tempfile
+
+from distutils.spawn import find_executable
+
+from codecanvas.structure import Unit, Module
+
+import codecanvas.instructions as code
+import codecanvas.languages.C  as C
+import codecanvas.benchmark    as benchmark
+
+# fills the hashed benchmark list with sequential keys and reports the longest
+# run of occupied slots, which unsuccessful lookups have to probe entirely,
+# followed by the number of elements removed for a duplicate and a unique key
+PROBE = """
+#include <stdio.h>
+#include "bench.h"
+#include "lists.h"
+extern tuple_0_hash_t list;
+int key = 0;
+int target(void) { return key; }
+int main(void) {
+  int index, run = 0, longest = 0;
+  for(index=0; index<256; index++) { bench_push(index); }
+  for(index=0; index<2*list.capacity; index++) {
+    run = list.slots[index % list.capacity] == NULL ? 0 : run + 1;
+    if(run > longest) { longest = run; }
+  }
+  printf("%d", longest);
+  key = 7; bench_push(key);
+  printf(" %d", bench_remove());
+  key = 8;
+  printf(" %d", bench_remove());
+  return 0;
+}
+"""
+
+class HashedPlatform(C.Generic):
+  hashing = True
+
+class TestHashedLists(unittest.TestCase):
+
+  def setUp(self):
+    self.unit = Unit()
+    self.unit.append(Module("includes"))
+    self.unit.append(Module("test"))
+    self.unit.select("test", "dec").append(code.Import("includes")) \
+                                   .tag("requires-tuples")
+    self.function = self.unit.select("test", "dec").append(
+      code.Function("main")
+    )
+    self.type = code.ManyType(code.TupleType([
+      code.IntegerType(), code.ObjectType("payload")
+    ]))
+    self.list = code.Object("queue", self.type)
+
+  def call(self, method, *arguments):
+    self.function.append(
+      code.MethodCall(self.list, method,
+                      [code.ListLiteral().contains(*arguments)],
+                      type=code.BooleanType())
+    )
+
+  def equals(self, name):
+    return code.Match("==", code.FunctionCall(name, type=code.IntegerType()))
+
+  def payload(self):
+    return code.SimpleVariable("p", info=code.ObjectType("payload"))
+
+  def functions(self):
+    return [ child.name for child in self.unit.select("lists", "dec")
+                        if isinstance(child, code.Function) ]
+
+  def usage(self):
+    return C.Usage(self.unit, C.Transformer().matchers_of)
+
+  def test_usage(self):
+    self.call("contains", self.equals("a"), code.Match("*"))
+    self.call("remove",   self.equals("b"), code.Match("*"))
+    self.call("push", code.SimpleVariable("i"), self.payload())
+    usage = self.usage()
+    self.assertEqual(usage.equalities("queue"), [0])
+    self.assertEqual(usage.types["queue"], [self.type])
+
+  def test_usage_of_other_queries(self):
+    self.call("contains", self.equals("a"), code.Match("*"))
+    self.call("contains", code.Match("*"), self.payload())
+    self.assertIsNone(self.usage().equalities("queue"))
+    self.setUp()
+    self.call("contains", code.Match("<", code.FunctionCall("now",
+                                          type=code.IntegerType())),
+                          code.Match("*"))
+    self.assertIsNone(self.usage().equalities("queue"))
+    self.setUp()
+    self.call("contains", code.Match("*"), code.Match("*"))
+    self.assertIsNone(self.usage().equalities("queue"))
+
+  def test_usage_of_opaque_lists(self):
+    self.call("contains", self.equals("a"), code.Match("*"))
+    self.function.append(code.FunctionCall("dump",
+                                           [code.Object("queue", self.type)]))
+    self.assertIsNone(self.usage().equalities("queue"))
+
+  def test_hashing_is_optional(self):
+    self.call("contains", self.equals("a"), code.Match("*"))
+    C.Emitter().passes.run(self.unit)
+    self.assertEqual(self.functions(), ["list_of_tuple_0_ts_contains_match_eq_a"])
+
+  def test_hashed_lists(self):
+    self.call("contains", self.equals("a"), code.Match("*"))
+    self.call("push", code.SimpleVariable("i"), self.payload())
+    self.call("remove", self.equals("b"), code.Match("*"))
+    result = C.Emitter(platform=HashedPlatform()).emit(self.unit)
+    self.assertIn("hashed", self.type.tags)
+    self.assertEqual(self.functions(), [
+      "hash_tuple_0_ts_on_0", "hashed_tuple_0_ts_on_0_insert",
+      "hashed_tuple_0_ts_on_0_contains_match_eq_a",
+      "hashed_tuple_0_ts_on_0_push",
+      "hashed_tuple_0_ts_on_0_remove_match_eq_b"
+    ])
+    self.assertIn("hashed_tuple_0_ts_on_0_push(&queue, make_tuple_0_t(i, p));",
+                  result)
+    self.assertIn("typedef struct tuple_0_hash_t {\ntuple_0_t** slots;\n" +
+                  "int size;\nint used;\nint capacity;\nint duplicates;\n" +
+                  "} tuple_0_hash_t;",
+                  result)
+    self.assertIn("tuple_0_t tuple_0_deleted;", result)
+    self.assertIn("unsigned int hash = 17;\nhash = ((hash * 31) + elem_0);\n" +
+                  "hash = (hash ^ (hash >> 16));\n", result)
+    self.assertIn("int index = (hash_tuple_0_ts_on_0(a()) % list->capacity);\n" +
+                  "tuple_0_t* iter = list->slots[index];\n" +
+                  "while((iter != NULL)) {\n" +
+                  "if(((iter != &tuple_0_deleted) && (iter->elem_0 == a())))" +
+                  "{return TRUE;}\n" +
+                  "index = ((index + 1) % list->capacity);", result)
+    self.assertIn("{list->slots[index] = &tuple_0_deleted;\n" +
+                  "free_tuple_0_t(iter);\nlist->size--;\nremoved++;\n" +
+                  "if((list->duplicates == 0)){return removed;}}", result)
+    self.assertIn("if((iter == &tuple_0_deleted)){if((reuse < 0)){reuse = index;}}" +
+                  "else {if((iter->elem_0 == item->elem_0))" +
+                  "{list->duplicates++;}}", result)
+    self.assertIn("if((((list->used + 1) * 4) > (list->capacity * 3)))", result)
+
+  def test_hashed_objects(self):
+    self.call("contains", code.Match("*"), self.payload())
+    self.call("clear")
+    result = C.Emitter(platform=HashedPlatform()).emit(self.unit)
+    self.assertIn("hashed_tuple_0_ts_on_1_contains_match_arg_0(&queue, p);",
+                  result)
+    self.assertIn("hash = ((hash * 31) + hash_payload(elem_1));", result)
+    self.assertIn("int index = (hash_tuple_0_ts_on_1(arg_0) % list->capacity);",
+                  result)
+    self.assertIn("void hashed_tuple_0_ts_on_1_clear(tuple_0_hash_t* list) {",
+                  result)
+
+  @unittest.skipUnless(find_executable("gcc"), "requires gcc")
+  def test_probes(self):
+    case      = benchmark.Case(("int", "int"), 256, "==", "hashed", "0")
+    runner    = benchmark.Runner()
+    directory = tempfile.mkdtemp(prefix="codecanvas-hashing-")
+    try:
+      runner.build(case, directory)
+      runner.write(os.path.join(directory, "harness.c"), PROBE)
+      subprocess.check_output(
+        [ "gcc", "-std=gnu99", "-o", "probe" ] +
+        sorted([ name for name in os.listdir(directory) if name.endswith(".c") ]),
+        cwd=directory, stderr=subprocess.STDOUT
+      )
+      output = subprocess.check_output([os.path.join(directory, "probe")])
+    finally:
+      shutil.rmtree(directory)
+    [ longest, duplicate, unique ] = [ int(value) for value in output.split() ]
+    self.assertLess(longest, 64)    # sequential keys no longer form one cluster
+    self.assertEqual(duplicate, 2)  # duplicates are all removed
+    self.assertEqual(unique, 1)
+
+  def test_explicit_layouts_are_kept(self):
+    self.type.tag("array")
+    self.call("contains", self.equals("a"), code.Match("*"))
+    C.Emitter(platform=HashedPlatform()).passes.run(self.unit)
+    self.assertEqual(self.functions(), ["array_of_tuple_0_ts_contains_match_eq_a"])
+
+if __name__ == '__main__':
+  suite = unittest.TestLoader().loadTestsFromTestCase(TestHashedLists)
+  unittest.TextTestRunner(verbosity=2).run(suite)
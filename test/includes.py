@@ -0,0 +1,103 @@
+# includes.py
+# tests include analysis functionality
+# author: Christophe VG
+
+import unittest
+
+from codecanvas.structure import Unit, Module
+
+import codecanvas.instructions as code
+import codecanvas.languages.C  as C
+
+from codecanvas.optimizations.includes import Includes
+
+class TestIncludes(unittest.TestCase):
+
+  def setUp(self):
+    self.unit = Unit()
+    self.util = self.unit.append(Module("util"))
+    self.app  = self.unit.append(Module("app"))
+    self.util.select("dec").append(code.Import("util"))
+    # void* make(void) { return malloc(8); }
+    self.util.select("dec").append(
+      code.Function("make", type=C.RefType(code.VoidType()))
+    ).contains(code.Return(code.FunctionCall("malloc", [code.IntegerLiteral(8)],
+                                             type=code.IntegerType())))
+
+  def imports(self, module, section):
+    return [ child.imported for child in self.unit.select(module, section)
+                            if isinstance(child, code.Import) ]
+
+  def run_includes(self):
+    includes = Includes()
+    C.Emitter().add_pass(includes).passes.run(self.unit)
+    return includes
+
+  def main(self, *statements):
+    return self.app.select("dec").append(code.Function("main")).contains(
+      *statements
+    )
+
+  def test_duplicates_are_removed(self):
+    self.util.select("dec").append(code.Import("<stdlib.h>"),
+                                   code.Import("<stdlib.h>"))
+    self.run_includes()
+    self.assertEqual(self.imports("util", "dec"), ["util", "<stdlib.h>"])
+
+  def test_unused_headers_are_removed(self):
+    self.app.select("dec").append(code.Import("<string.h>"),
+                                  code.Import("<stdlib.h>"),
+                                  code.Import("foo-lib/time"))
+    self.main(code.Print(code.StringLiteral("hello")))
+    includes = self.run_includes()
+    self.assertEqual(self.imports("app", "dec"), ["<stdio.h>", "foo-lib/time"])
+    self.assertEqual(includes.removed, ["<string.h>", "<stdlib.h>"])
+
+  def test_headers_are_moved_to_the_sections_using_them(self):
+    self.util.select("def").append(code.Import("<stdlib.h>"))
+    self.app.select("dec").append(code.Import("util"))
+    self.main(code.FunctionCall("free", [code.FunctionCall("make")]))
+    includes = self.run_includes()
+    self.assertEqual(self.imports("util", "def"), [])
+    self.assertEqual(self.imports("util", "dec"), ["<stdlib.h>", "util"])
+    self.assertEqual(self.imports("app", "dec"),  ["<stdlib.h>", "util"])
+    self.assertEqual(includes.moved, [("<stdlib.h>", "util"),
+                                      ("<stdlib.h>", "app")])
+
+  def test_used_headers_stay(self):
+    self.util.select("def").append(code.Import("<stdint.h>"))
+    self.util.select("def").append(
+      code.VariableDecl("size", code.IntegerType((0, 255)))
+    )
+    self.run_includes()
+    self.assertEqual(self.imports("util", "def"), ["<stdint.h>"])
+
+  def test_unused_and_redundant_modules_are_removed(self):
+    lists = self.unit.append(Module("lists"))
+    lists.select("def").append(code.Import("util"))
+    lists.select("def").append(code.Prototype("first", type=code.IntegerType()))
+    self.app.select("dec").append(code.Import("lists"), code.Import("util"))
+    self.main(code.FunctionCall("first", type=code.IntegerType()),
+              code.FunctionCall("make"))
+    other = self.unit.append(Module("other"))
+    other.select("dec").append(code.Import("lists"))
+    other.select("dec").append(code.Function("nothing")).contains(
+      code.Return(code.IntegerLiteral(1))
+    )
+    includes = self.run_includes()
+    self.assertEqual(self.imports("app", "dec"),   ["lists"])
+    self.assertEqual(self.imports("other", "dec"), [])
+    self.assertEqual(includes.depth, (2, 2))
+
+  def test_unknown_headers_are_kept(self):
+    self.util.select("def").append(code.Import("foo-lib/payload"))
+    self.app.select("dec").append(code.Import("util"))
+    self.main(code.Return())
+    includes = self.run_includes()
+    self.assertEqual(self.imports("app", "dec"), ["util"])
+    self.assertEqual(includes.report(),
+                     "removed 0 import(s), moved 0, include depth 2 -> 2")
+
+if __name__ == '__main__':
+  suite = unittest.TestLoader().loadTestsFromTestCase(TestIncludes)
+  unittest.TextTestRunner(verbosity=2).run(suite)
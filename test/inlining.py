@@ -0,0 +1,182 @@
+# inlining.py
+# tests function inlining functionality
+# author: Christophe VG
+
+import unittest
+
+from codecanvas.structure import Unit, Module
+
+import codecanvas.instructions as code
+import codecanvas.passes       as passes
+import codecanvas.languages.C  as C
+
+from codecanvas.optimizations.inlining import Inlining
+
+class TestInlining(unittest.TestCase):
+
+  def setUp(self):
+    self.unit = Unit()
+    self.unit.append(Module("includes"))
+    self.unit.append(Module("test"))
+    self.unit.select("test", "dec").append(code.Import("includes")) \
+                                   .tag("requires-tuples")
+    self.section  = self.unit.select("test", "dec")
+    self.function = code.Function("main")
+
+  def twice(self):
+    self.section.append(
+      code.Function("twice", type=code.IntegerType(),
+                    params=[code.Parameter("x", code.IntegerType())]).contains(
+        code.Return(code.Plus(code.SimpleVariable("x"), code.SimpleVariable("x")))
+      )
+    )
+
+  def call(self, name, *arguments):
+    return code.FunctionCall(name, list(arguments), type=code.IntegerType())
+
+  def test_expressions_are_substituted(self):
+    self.twice()
+    self.section.append(self.function).contains(
+      code.Assign("a", self.call("twice", code.SimpleVariable("b")))
+    )
+    inlining = Inlining()
+    passes.Manager(inlining).run(self.unit)
+    self.assertIn("void main(void) {\na = (b + b);\n}",
+                  C.Emitter().emit(self.unit))
+    self.assertEqual(inlining.sites, [("main", "twice", "inlined expression", 1)])
+
+  def test_arguments_with_side_effects_are_not_duplicated(self):
+    self.twice()
+    self.section.append(self.function).contains(
+      code.Assign("a", self.call("twice", self.call("now")))
+    )
+    inlining = Inlining()
+    passes.Manager(inlining).run(self.unit)
+    self.assertIsInstance(self.function[0].expression, code.FunctionCall)
+    self.assertEqual(inlining.report(),
+                     "main -> twice: kept: argument has side effects")
+
+  def test_arguments_with_side_effects_are_not_moved(self):
+    self.section.append(
+      code.Function("guarded", type=code.BooleanType(),
+                    params=[code.Parameter("x", code.IntegerType())]).contains(
+        code.Return(code.And(code.SimpleVariable("ready"),
+                             code.LT(code.SimpleVariable("x"),
+                                     code.IntegerLiteral(3))))
+      )
+    )
+    self.section.append(self.function).contains(
+      code.Assign("a", self.call("guarded", self.call("next"))),
+      code.Assign("b", self.call("guarded", code.Plus(code.SimpleVariable("c"),
+                                                      code.IntegerLiteral(1))))
+    )
+    inlining = Inlining()
+    passes.Manager(inlining).run(self.unit)
+    self.assertIsInstance(self.function[0].expression, code.FunctionCall)
+    self.assertEqual(self.function[1].expression.accept(C.Dumper()),
+                     "(ready && ((c + 1) < 3))")
+    self.assertEqual([ decision for caller, callee, decision, growth
+                                in inlining.sites ],
+                     [ "kept: argument has side effects", "inlined expression" ])
+
+  def test_statements_are_spliced_with_renamed_locals(self):
+    self.section.append(
+      code.Function("update", params=[code.Parameter("v", code.IntegerType())])
+        .contains(
+          code.Assign(code.VariableDecl("t", code.IntegerType()),
+                      code.Plus(code.SimpleVariable("v"), code.IntegerLiteral(1))),
+          code.Assign("a", code.SimpleVariable("t")),
+          code.Return()
+        )
+    )
+    self.section.append(self.function).contains(
+      code.FunctionCall("update", [code.IntegerLiteral(1)]),
+      code.FunctionCall("update", [code.SimpleVariable("b")])
+    )
+    passes.Manager(Inlining()).run(self.unit)
+    self.assertIn("""void main(void) {
+int v_1 = 1;
+int t_1 = (v_1 + 1);
+a = t_1;
+int v_2 = b;
+int t_2 = (v_2 + 1);
+a = t_2;
+}""", C.Emitter().emit(self.unit))
+
+  def test_recursive_and_large_functions_are_kept(self):
+    self.section.append(
+      code.Function("loop", params=[code.Parameter("x", code.IntegerType())])
+        .contains(code.FunctionCall("loop", [code.SimpleVariable("x")]))
+    )
+    self.twice()
+    self.section.append(self.function).contains(
+      code.FunctionCall("loop", [code.IntegerLiteral(1)]),
+      code.Assign("a", self.call("twice", code.SimpleVariable("b")))
+    )
+    inlining = Inlining(budget=2)
+    passes.Manager(inlining).run(self.unit)
+    self.assertEqual(len(self.function), 2)
+    self.assertEqual([decision for caller, callee, decision, growth
+                               in inlining.sites if caller == "main"],
+                     [ "kept: too large (4 > 2)", "kept: recursive" ])
+
+  def test_static_inline_definitions(self):
+    self.twice()
+    self.section.append(self.function).contains(
+      code.Assign("a", self.call("twice", code.SimpleVariable("b")))
+    )
+    inlining = Inlining(strategy="static")
+    emitter  = C.Emitter().add_pass(inlining)
+    result   = emitter.emit(self.unit)
+    self.assertIn("static inline int twice(int x) {\nreturn (x + x);\n}",
+                  result)
+    self.assertNotIn("int twice(int x);", result)
+    self.assertIs(self.unit.select("test", "def")[-1].name, "twice")
+    self.assertEqual(inlining.sites, [("main", "twice", "static inline", 0)])
+
+  def test_static_inline_definitions_need_visible_declarations(self):
+    self.section.append(code.VariableDecl("counter", code.IntegerType()))
+    self.section.append(
+      code.Function("next", type=code.IntegerType()).contains(
+        code.Return(code.Plus(code.SimpleVariable("counter"),
+                              code.IntegerLiteral(1)))
+      )
+    )
+    self.section.append(self.function).contains(
+      code.Assign("a", self.call("next"))
+    )
+    inlining = Inlining(strategy="static")
+    result   = C.Emitter().add_pass(inlining).emit(self.unit)
+    self.assertNotIn("static inline", result)
+    self.assertIn("int next(void);", result)
+    self.assertEqual([ child.name for child in self.unit.select("test", "dec")
+                                  if isinstance(child, code.Function) ],
+                     [ "next", "main" ])
+    self.assertEqual(inlining.sites, [
+      ("main", "next", "kept: depends on declarations of its module", 0)
+    ])
+
+  def test_mixed_strategy_on_generated_functions(self):
+    tuple = code.TupleType([code.IntegerType(), code.ByteType()])
+    self.section.append(self.function).contains(
+      code.MethodCall(code.Object("queue", code.ManyType(tuple)), "push",
+                      [code.ListLiteral().contains(code.SimpleVariable("a"),
+                                                   code.SimpleVariable("b"))])
+    )
+    inlining = Inlining(budget=32, strategy="mixed")
+    C.Emitter().add_pass(inlining).passes.run(self.unit)
+    definitions = self.unit.select("tuples", "def")
+    constructor = [child for child in definitions
+                         if isinstance(child, code.Function) and \
+                            child.name == "make_tuple_0_t"]
+    self.assertEqual(len(constructor), 1)
+    self.assertNotIsInstance(constructor[0], code.Prototype)
+    self.assertIn("inline", constructor[0].tags)
+    self.assertEqual(inlining.sites, [
+      ("main", "make_tuple_0_t", "static inline (not a single return expression)", 0),
+      ("main", "list_of_tuple_0_ts_push", "inlined body", 12)
+    ])
+
+if __name__ == '__main__':
+  suite = unittest.TestLoader().loadTestsFromTestCase(TestInlining)
+  unittest.TextTestRunner(verbosity=2).run(suite)
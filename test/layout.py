@@ -0,0 +1,101 @@
+# layout.py
+# tests struct layout functionality
+# author: Christophe VG
+
+import unittest
+
+from codecanvas.structure import Unit, Module
+
+import codecanvas.instructions as code
+import codecanvas.passes       as passes
+import codecanvas.languages.C  as C
+
+from codecanvas.optimizations.layout import StructLayout
+
+class TestStructLayout(unittest.TestCase):
+
+  def setUp(self):
+    self.unit = Unit()
+    self.unit.append(Module("test"))
+
+  def struct(self, *properties):
+    struct = self.unit.select("test", "def").append(code.StructuredType("thing"))
+    for name, type in properties: struct.append(code.Property(name, type))
+    return struct
+
+  def names(self, struct):
+    return [ prop.name.name for prop in struct ]
+
+  def run_layout(self, **options):
+    layout = StructLayout(**options)
+    passes.Manager(layout).run(self.unit)
+    return layout
+
+  def test_padding_is_minimized(self):
+    struct = self.struct(("a", code.ByteType()), ("b", code.LongType()),
+                         ("c", code.ByteType()), ("d", code.LongType()))
+    layout = self.run_layout()
+    self.assertEqual(self.names(struct), ["b", "d", "a", "c"])
+    self.assertEqual(layout.sizes, { "thing": (32, 24) })
+    self.assertEqual(layout.report(), "thing: 32 -> 24 bytes")
+
+  def test_hot_properties(self):
+    struct = self.struct(("a", code.LongType()), ("b", code.IntegerType()),
+                         ("c", code.IntegerType()))
+    struct[2].tag("hot")
+    self.run_layout()
+    self.assertEqual(self.names(struct), ["a", "c", "b"])
+
+  def test_hot_properties_are_kept_in_the_first_cache_line(self):
+    struct = self.struct(("data",  code.AmountType(code.LongType(), 16)),
+                         ("count", code.IntegerType()),
+                         ("flag",  code.ByteType()))
+    struct[2].tag("hot")
+    layout = self.run_layout()
+    self.assertEqual(self.names(struct), ["flag", "data", "count"])
+    self.assertEqual(layout.sizes, { "thing": (136, 144) })
+
+  def test_bitfields(self):
+    struct = self.struct(("x", code.BooleanType()), ("y", code.IntegerType()),
+                         ("z", code.BooleanType()))
+    layout = self.run_layout(bitfields=True)
+    self.assertEqual(self.names(struct), ["y", "x", "z"])
+    self.assertEqual(layout.sizes, { "thing": (12, 8) })
+    self.assertEqual(struct.accept(C.Dumper()),
+                     "typedef struct thing_t {\nint y;\n" +
+                     "unsigned int x : 1;\nunsigned int z : 1;\n} thing_t;")
+
+  def test_structs_that_are_left_alone(self):
+    ordered = self.struct(("a", code.ByteType()), ("b", code.LongType()))
+    ordered.tag("ordered")
+    unknown = self.unit.select("test", "def").append(code.StructuredType("other"))
+    unknown.append(code.Property("a", code.ByteType()),
+                   code.Property("b", code.NamedType("something")),
+                   code.Property("c", code.LongType()))
+    layout = self.run_layout()
+    self.assertEqual(self.names(ordered), ["a", "b"])
+    self.assertEqual(self.names(unknown), ["a", "b", "c"])
+    self.assertEqual(layout.sizes, {})
+
+  def test_tuples_read_by_matchers(self):
+    self.unit.append(Module("includes"))
+    self.unit.select("test", "dec").append(code.Import("includes")) \
+                                   .tag("requires-tuples")
+    function = self.unit.select("test", "dec").append(code.Function("main"))
+    queue = code.Object("queue", code.ManyType(code.TupleType([
+      code.ByteType(), code.ObjectType("payload"), code.IntegerType()
+    ])))
+    function.append(code.MethodCall(queue, "contains", [
+      code.ListLiteral().contains(
+        code.Match("*"), code.Match("*"),
+        code.Match(">", code.FunctionCall("now", type=code.IntegerType()))
+      )], type=code.BooleanType()))
+    layout = StructLayout(C.Generic())
+    C.Emitter().add_pass(layout).emit(self.unit)
+    tuple = self.unit.select("tuples", "def")[3]
+    self.assertEqual(self.names(tuple), ["next", "elem_1", "elem_2", "elem_0"])
+    self.assertEqual(layout.sizes, { "tuple_0": (32, 24) })
+
+if __name__ == '__main__':
+  suite = unittest.TestLoader().loadTestsFromTestCase(TestStructLayout)
+  unittest.TextTestRunner(verbosity=2).run(suite)
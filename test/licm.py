@@ -0,0 +1,176 @@
+# licm.py
+# tests loop-invariant code motion functionality
+# author: Christophe VG
+
+import unittest
+
+from codecanvas.structure import Unit, Module
+
+import codecanvas.instructions as code
+import codecanvas.passes       as passes
+import codecanvas.languages.C  as C
+
+from codecanvas.optimizations.licm import LoopInvariants
+
+class TestLoopInvariants(unittest.TestCase):
+
+  def setUp(self):
+    self.unit = Unit()
+    self.unit.append(Module("includes"))
+    self.unit.append(Module("test"))
+    self.unit.select("test", "dec").append(code.Import("includes")) \
+                                   .tag("requires-tuples")
+    self.function = self.unit.select("test", "dec").append(
+      code.Function("main")
+    )
+
+  def now(self):
+    return code.FunctionCall("now", type=code.IntegerType())
+
+  def test_pure_calls_are_hoisted(self):
+    loop = code.WhileDo(code.LT(code.SimpleVariable("i"),
+                                self.now().mark_pure())).contains(
+      code.Inc(code.SimpleVariable("i"))
+    )
+    self.function.append(loop)
+    licm = LoopInvariants()
+    passes.Manager(licm).run(self.unit)
+    self.assertEqual(len(licm.hoisted), 1)
+    self.assertIn("""
+void main(void) {
+int inv_0 = now();
+while((i < inv_0)) {
+i++;
+}
+}""", C.Emitter().emit(self.unit))
+
+  def test_impure_calls_are_not_hoisted(self):
+    loop = code.WhileDo(code.LT(code.SimpleVariable("i"), self.now())).contains(
+      code.Inc(code.SimpleVariable("i"))
+    )
+    self.function.append(loop)
+    licm = LoopInvariants()
+    passes.Manager(licm).run(self.unit)
+    self.assertEqual(len(licm.hoisted), 0)
+    self.assertEqual(len(self.function), 1)
+
+  def test_variant_operands_are_not_hoisted(self):
+    call = code.FunctionCall("f", [code.SimpleVariable("i")],
+                             type=code.IntegerType()).mark_pure()
+    loop = code.For(code.Assign(code.VariableDecl("i", code.IntegerType()),
+                                code.IntegerLiteral(0)),
+                    code.LT(code.SimpleVariable("i"), code.IntegerLiteral(10)),
+                    code.Inc(code.SimpleVariable("i"))).contains(
+      code.Assign("a", call)
+    )
+    self.function.append(loop)
+    licm = LoopInvariants()
+    passes.Manager(licm).run(self.unit)
+    self.assertEqual(len(licm.hoisted), 0)
+
+  def test_property_reads_of_objects_that_are_not_iterated(self):
+    config = code.ObjectProperty("config", "limit", type=code.IntegerType())
+    loop   = code.For(code.Assign(code.VariableDecl("i", code.IntegerType()),
+                                  code.IntegerLiteral(0)),
+                      code.LT(code.SimpleVariable("i"), config),
+                      code.Inc(code.SimpleVariable("i"))).contains(
+      code.FunctionCall("work", [code.SimpleVariable("i")])
+    )
+    self.function.append(loop)
+    passes.Manager(LoopInvariants()).run(self.unit)
+    self.assertIn("""
+void main(void) {
+int inv_0 = config->limit;
+for(int i = 0; (i < inv_0); i++) {
+work(i);
+}
+}""", C.Emitter().emit(self.unit))
+
+  def test_property_reads_of_escaped_objects_are_not_hoisted(self):
+    loop = code.WhileDo(code.LT(code.SimpleVariable("i"),
+                        code.ObjectProperty("config", "limit",
+                                            type=code.IntegerType()))).contains(
+      code.FunctionCall("update", [code.Object("config")])
+    )
+    self.function.append(loop)
+    licm = LoopInvariants()
+    passes.Manager(licm).run(self.unit)
+    self.assertEqual(len(licm.hoisted), 0)
+
+  def test_escaped_variables_are_not_hoisted(self):
+    call = code.FunctionCall("f", [code.SimpleVariable("limit")],
+                             type=code.IntegerType()).mark_pure()
+    loop = code.WhileDo(code.LT(code.SimpleVariable("i"), call)).contains(
+      code.Inc(code.SimpleVariable("i")),
+      code.FunctionCall("update", [code.SimpleVariable("limit")])
+    )
+    self.function.append(loop)
+    licm = LoopInvariants()
+    passes.Manager(licm).run(self.unit)
+    self.assertEqual(len(licm.hoisted), 0)
+
+  def test_property_reads_of_tested_objects_are_not_hoisted(self):
+    limit = code.ObjectProperty("config", "limit", type=code.IntegerType())
+    loop  = code.WhileDo(code.And(code.Object("config"),
+                                  code.LT(code.SimpleVariable("i"), limit))
+                        ).contains(code.Inc(code.SimpleVariable("i")))
+    self.function.append(loop)
+    licm = LoopInvariants()
+    passes.Manager(licm).run(self.unit)
+    self.assertEqual(len(licm.hoisted), 0)
+
+  def test_guarded_property_reads_are_not_hoisted(self):
+    limit = code.ObjectProperty("config", "limit", type=code.IntegerType())
+    loop  = code.RepeatUntil(code.LT(code.SimpleVariable("i"),
+                                     code.IntegerLiteral(10))).contains(
+      code.IfStatement(code.Object("config"), [
+        code.Assign("a", limit)
+      ]),
+      code.Assign("b", code.And(code.Object("config"),
+                                code.LT(code.SimpleVariable("i"), limit))),
+      code.Inc(code.SimpleVariable("i"))
+    )
+    self.function.append(loop)
+    licm = LoopInvariants()
+    passes.Manager(licm).run(self.unit)
+    self.assertEqual(len(licm.hoisted), 0)
+
+  def test_property_reads_are_only_hoisted_from_loops_that_run(self):
+    def loop(clazz):
+      return clazz(code.LT(code.SimpleVariable("i"), code.IntegerLiteral(10))) \
+        .contains(
+          code.Assign("a", code.ObjectProperty("config", "limit",
+                                               type=code.IntegerType())),
+          code.Inc(code.SimpleVariable("i"))
+        )
+    self.function.append(loop(code.WhileDo))
+    licm = LoopInvariants()
+    passes.Manager(licm).run(self.unit)
+    self.assertEqual(len(licm.hoisted), 0)
+    self.function.append(loop(code.RepeatUntil))
+    passes.Manager(licm).run(self.unit)
+    self.assertEqual(len(licm.hoisted), 1)
+    self.assertIsInstance(self.function[1], code.Assign)
+    self.assertIsInstance(self.function[2], code.RepeatUntil)
+
+  def test_generated_list_scan(self):
+    tuple = code.TupleType([code.IntegerType(), code.ByteType()])
+    self.function.append(
+      code.MethodCall(code.Object("queue", code.ManyType(tuple)), "contains",
+                      [code.ListLiteral().contains(
+                         code.Match(">", self.now().mark_pure()),
+                         code.Match("*")
+                      )], type=code.BooleanType())
+    )
+    C.Emitter().add_pass(LoopInvariants()).passes.run(self.unit)
+    scan = self.unit.select("lists", "dec")[1]
+    self.assertIsInstance(scan[0], code.Assign)
+    self.assertIsInstance(scan[0].expression, code.FunctionCall)
+    self.assertIsInstance(scan[1], code.WhileDo)
+    condition = scan[1][0].expression
+    self.assertIsInstance(condition.right, code.SimpleVariable)
+    self.assertEqual(condition.right.name, "inv_0")
+
+if __name__ == '__main__':
+  suite = unittest.TestLoader().loadTestsFromTestCase(TestLoopInvariants)
+  unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,121 @@
+# ownership.py
+# tests handing over objects to the tuples that are stored in lists
+# author: Christophe VG
+
+import unittest
+
+from codecanvas.structure import Unit, Module
+
+import codecanvas.instructions as code
+import codecanvas.languages.C  as C
+
+class TestOwnership(unittest.TestCase):
+
+  def setUp(self):
+    self.unit = Unit()
+    self.unit.append(Module("includes"))
+    self.unit.append(Module("test"))
+    self.unit.select("test", "dec").append(
+      code.Import("includes")
+    ).tag("requires-tuples")
+    self.function = self.unit.select("test", "dec").append(
+      code.Function("main")
+    )
+    self.list = code.Object("queue", code.ManyType(code.TupleType([
+      code.IntegerType(), code.ObjectType("payload"), code.ObjectType("payload")
+    ])))
+
+  def push(self, *arguments):
+    self.function.append(
+      code.MethodCall(self.list, "push", [code.ListLiteral().contains(*arguments)])
+    )
+
+  def lowered(self, lists="linked"):
+    platform = C.Generic()
+    platform.lists = lists
+    C.Emitter(platform=platform).passes.run(self.unit)
+    return [ child.accept(C.Dumper()) for child in self.function ]
+
+  def functions(self, module):
+    return [ child for child in self.unit.select(module, "dec")
+                   if isinstance(child, code.Function) ]
+
+  def stored(self, function):
+    assigns = [ child for child in function if isinstance(child, code.Assign) ]
+    return [ assign.accept(C.Dumper()) for assign in assigns[-2:] ]
+
+  def variable(self, name, *tags):
+    return code.SimpleVariable(name).tag(*tags)
+
+  def test_ownership_defaults_to_borrowed(self):
+    self.assertEqual(C.ownership(code.Parameter("p")), "borrowed")
+    self.assertEqual(C.ownership(code.Parameter("p").tag("owned")), "owned")
+    self.assertEqual(C.ownership(self.variable("p", "moved")), "moved")
+
+  def test_borrowed_objects_are_copied(self):
+    self.push(self.variable("n"), self.variable("p"), self.variable("q"))
+    self.assertEqual(self.lowered(), [
+      "list_of_tuple_0_ts_push(&queue, make_tuple_0_t(n, p, q));"
+    ])
+    self.assertEqual([ function.name for function in self.functions("tuples") ],
+                     [ "make_tuple_0_t", "free_tuple_0_t", "copy_tuple_0_t" ])
+    self.assertEqual(self.stored(self.functions("tuples")[0]), [
+      "tuple->elem_1 = copy_payload(elem_1);",
+      "tuple->elem_2 = copy_payload(elem_2);"
+    ])
+
+  def test_moved_objects_are_adopted(self):
+    self.push(self.variable("n"), self.variable("p", "moved"), self.variable("q"))
+    self.push(self.variable("n"), self.variable("p", "moved"),
+                                  self.variable("q", "moved"))
+    self.assertEqual(self.lowered(), [
+      "list_of_tuple_0_ts_push(&queue, adopt_tuple_0_t(n, p, copy_payload(q)));",
+      "list_of_tuple_0_ts_push(&queue, adopt_tuple_0_t(n, p, q));"
+    ])
+    adopt = self.unit.find("tuples").select("dec").children[-1]
+    self.assertEqual(adopt.name, "adopt_tuple_0_t")
+    self.assertEqual([ C.ownership(param) for param in adopt.params ],
+                     [ "owned", "owned", "owned" ])
+    self.assertEqual(self.stored(adopt), [
+      "tuple->elem_1 = elem_1;",
+      "tuple->elem_2 = elem_2;"
+    ])
+    self.assertEqual([ function.name for function in self.functions("lists") ],
+                     [ "list_of_tuple_0_ts_push" ])
+
+  def test_moved_objects_are_stored_in_place(self):
+    self.push(self.variable("n"), self.variable("p", "moved"), self.variable("q"))
+    self.push(self.variable("n"), self.variable("p"), self.variable("q"))
+    self.assertEqual(self.lowered("array"), [
+      "array_of_tuple_0_ts_adopt(&queue, n, p, copy_payload(q));",
+      "array_of_tuple_0_ts_push(&queue, n, p, q);"
+    ])
+    [adopt, push] = self.functions("lists")
+    self.assertEqual(self.stored(adopt), [
+      "item->elem_1 = elem_1;",
+      "item->elem_2 = elem_2;"
+    ])
+    self.assertEqual(self.stored(push), [
+      "item->elem_1 = copy_payload(elem_1);",
+      "item->elem_2 = copy_payload(elem_2);"
+    ])
+
+  def test_ownership_follows_literals(self):
+    self.push(code.IntegerLiteral(1), self.variable("p", "moved"),
+                                      self.variable("q"))
+    self.push(code.IntegerLiteral(1), self.variable("p"),
+                                      self.variable("q", "moved"))
+    self.assertEqual(self.lowered(), [
+      "list_of_tuple_0_ts_push(&queue, adopt_tuple_0_t(1, p, copy_payload(q)));",
+      "list_of_tuple_0_ts_push(&queue, adopt_tuple_0_t(1, copy_payload(p), q));"
+    ])
+    self.setUp()
+    self.push(code.IntegerLiteral(1), self.variable("p", "moved"),
+                                      self.variable("q"))
+    self.assertEqual(self.lowered("array"), [
+      "array_of_tuple_0_ts_adopt(&queue, 1, p, copy_payload(q));"
+    ])
+
+if __name__ == '__main__':
+  suite = unittest.TestLoader().loadTestsFromTestCase(TestOwnership)
+  unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,114 @@
+# passes.py
+# tests Pass Manager functionality
+# author: Christophe VG
+
+import unittest
+
+from codecanvas.structure import Unit, Module
+
+import codecanvas.instructions as code
+import codecanvas.passes       as passes
+import codecanvas.languages.C  as C
+
+class Counter(passes.Pass):
+  """
+  Counts the nodes it handles and the number of traversals it was part of.
+  """
+  def __init__(self, handles, name=None, after=None, before=None):
+    super(Counter, self).__init__(name, after, before)
+    self.handles = handles
+    self.count   = 0
+    self.runs    = 0
+  def prepare(self, tree): self.runs += 1
+  def visit_Code(self, node): self.count += 1
+
+class Negate(passes.Pass):
+  handles = [ code.BooleanLiteral ]
+  def visit_BooleanLiteral(self, literal):
+    return code.BooleanLiteral(not literal.value)
+
+class Tracer(passes.Pass):
+  def __init__(self, name, trace, after=None, before=None):
+    super(Tracer, self).__init__(name, after, before)
+    self.trace = trace
+  def run(self, tree): self.trace.append(self.name)
+
+class Unfusable(Tracer):
+  fusable = False
+
+class TestPasses(unittest.TestCase):
+
+  def setUp(self):
+    self.unit = Unit()
+    self.unit.append(Module("test"))
+    self.unit.select("test", "dec").append(code.Function("main")).contains(
+      code.WhileDo(code.BooleanLiteral(True)).contains(
+        code.Assign("a", code.Plus(code.IntegerLiteral(1),
+                                   code.IntegerLiteral(2))),
+        code.Assign("b", code.BooleanLiteral(True))
+      ),
+      code.Return(code.BooleanLiteral(False))
+    )
+
+  def test_handled_classes_and_subclasses(self):
+    literals = Counter([code.Literal], name="literals")
+    binops   = Counter([code.Plus],    name="binops")
+    passes.Manager(literals, binops).run(self.unit)
+    self.assertEqual(literals.count, 5)
+    self.assertEqual(binops.count,   1)
+
+  def test_independent_passes_are_fused(self):
+    counters = [ Counter([code.Literal], name="counter_" + str(index))
+                 for index in range(10) ]
+    manager  = passes.Manager(*counters)
+    manager.run(self.unit)
+    self.assertEqual(manager.traversals, 1)
+    self.assertEqual([counter.runs  for counter in counters], [1] * 10)
+    self.assertEqual([counter.count for counter in counters], [5] * 10)
+    self.assertEqual(sorted(manager.timings.keys()),
+                     sorted([counter.name for counter in counters]))
+
+  def test_dependent_passes_are_not_fused(self):
+    first   = Counter([code.Literal], name="first")
+    second  = Counter([code.Literal], name="second", after=["first"])
+    manager = passes.Manager(second, first)
+    self.assertEqual([[p.name for p in group] for group in manager.schedule()],
+                     [["first"], ["second"]])
+    manager.run(self.unit)
+    self.assertEqual(manager.traversals, 2)
+
+  def test_ordering_constraints(self):
+    trace   = []
+    manager = passes.Manager(Unfusable("c", trace, after=["b"]),
+                             Unfusable("b", trace),
+                             Unfusable("a", trace, before=["b"]))
+    manager.run(self.unit)
+    self.assertEqual(trace, ["a", "b", "c"])
+
+  def test_unfusable_passes_split_fusion(self):
+    manager = passes.Manager(Counter([code.Literal], name="one"),
+                             Unfusable("two", []),
+                             Counter([code.Literal], name="three"))
+    self.assertEqual([[p.name for p in group] for group in manager.schedule()],
+                     [["one"], ["two"], ["three"]])
+
+  def test_cyclic_constraints(self):
+    manager = passes.Manager(Unfusable("a", [], after=["b"]),
+                             Unfusable("b", [], after=["a"]))
+    self.assertRaises(RuntimeError, manager.schedule)
+
+  def test_handlers_can_replace_nodes(self):
+    passes.Manager(Negate()).run(self.unit)
+    loop = self.unit.select("test", "dec")[0][0]
+    self.assertTrue(loop[1].expression.value is False)
+
+  def test_emitter_runs_additional_passes(self):
+    emitter = C.Emitter().add_pass(Negate())
+    self.assertIn("b = FALSE;", emitter.emit(self.unit))
+    self.assertEqual(emitter.passes.traversals, 2)
+    self.assertEqual(sorted(emitter.passes.timings.keys()),
+                     ["Negate", "transform"])
+
+if __name__ == '__main__':
+  suite = unittest.TestLoader().loadTestsFromTestCase(TestPasses)
+  unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,104 @@
+# platform.py
+# tests platform capabilities and type selection
+# author: Christophe VG
+
+import unittest
+
+from codecanvas.structure import Unit, Module
+
+import codecanvas.instructions as code
+import codecanvas.passes       as passes
+import codecanvas.languages.C  as C
+
+from codecanvas.optimizations.layout import StructLayout
+
+class TestPlatform(unittest.TestCase):
+
+  def setUp(self):
+    self.unit = Unit()
+    self.unit.append(Module("test"))
+
+  def test_type_table(self):
+    platform = C.Generic()
+    self.assertEqual(platform.type(code.IntegerType()), "int")
+    self.assertEqual(platform.type(code.UnsignedLongType()), "unsigned long")
+    self.assertEqual(platform.type(code.BooleanType()), "int")
+    self.assertEqual(platform.type("tuple_0_t"), "tuple_0_t")
+
+  def test_instances_do_not_share_state(self):
+    [one, other] = [ C.Generic(), C.Generic() ]
+    one.pools["tuple_0"] = 8
+    one.sizes["IntegerType"] = (2, 2)
+    self.assertEqual(other.pools, {})
+    self.assertEqual(other.sizes["IntegerType"], (4, 4))
+
+  def test_capabilities(self):
+    platform = C.Generic()
+    self.assertEqual(platform.pointer(), (8, 8))
+    platform.pointer_size = 2
+    platform.alignment    = 1
+    self.assertEqual(platform.pointer(), (2, 1))
+
+  def test_widths(self):
+    platform = C.Generic()
+    self.assertEqual(platform.width((0, 255)),    8)
+    self.assertEqual(platform.width((-128, 127)), 8)
+    self.assertEqual(platform.width((0, 256)),    16)
+    self.assertEqual(platform.width((-129, 0)),   16)
+    self.assertEqual(platform.width((0, 2 ** 32 - 1)), 32)
+    self.assertEqual(platform.width((-1, 2 ** 31)),    64)
+    self.assertRaises(ValueError, platform.width, (0, 2 ** 64))
+    self.assertEqual(platform.integer((0, 100)),            "uint8_t")
+    self.assertEqual(platform.integer((-1, 1000), fast=True), "int_fast16_t")
+
+  def test_ranged_integers(self):
+    self.assertEqual(repr(code.IntegerType((0, 10))), "int[0..10]")
+    self.assertEqual(repr(code.UnsignedIntegerType()), "unsigned int")
+    self.assertRaises(AssertionError, code.IntegerType, (10, 0))
+
+  def test_storage_and_locals(self):
+    counter = code.IntegerType((0, 1000))
+    struct  = self.unit.select("test", "def").append(code.StructuredType("thing"))
+    struct.append(code.Property("count", counter))
+    self.unit.select("test", "dec").append(code.VariableDecl("total", counter))
+    self.unit.select("test", "dec").append(
+      code.Function("step", type=counter, params=[code.Parameter("n", counter)])
+    ).contains(
+      code.Assign(code.VariableDecl("i", counter), code.IntegerLiteral(0)),
+      code.VariableDecl("history", code.AmountType(counter, 4)),
+      code.Return(code.SimpleVariable("n"))
+    )
+    self.assertEqual(C.Emitter().emit(self.unit),
+      "#include <stdint.h>\n" +
+      "typedef struct thing_t {\nuint16_t count;\n} thing_t;\n" +
+      "uint_fast16_t step(uint_fast16_t n);" +
+      "#include <stdint.h>\n" +
+      "uint16_t total;\n" +
+      "uint_fast16_t step(uint_fast16_t n) {\n" +
+      "uint_fast16_t i = 0;\nuint16_t history[4];\nreturn n;\n}"
+    )
+
+  def test_stdint_is_imported_once(self):
+    self.unit.select("test", "dec").append(code.Import("<stdint.h>"))
+    self.unit.select("test", "dec").append(
+      code.VariableDecl("total", code.IntegerType((0, 10)))
+    )
+    self.unit.select("test", "def").append(
+      code.VariableDecl("other", code.IntegerType())
+    )
+    self.assertEqual(C.Emitter().emit(self.unit),
+                     "int other;#include <stdint.h>\nuint8_t total;")
+
+  def test_layout_of_ranged_integers(self):
+    struct = self.unit.select("test", "def").append(code.StructuredType("thing"))
+    struct.append(code.Property("a", code.IntegerType((0, 10))),
+                  code.Property("b", code.LongType()),
+                  code.Property("c", code.IntegerType((-1000, 1000))))
+    layout = StructLayout(C.Generic())
+    passes.Manager(layout).run(self.unit)
+    self.assertEqual([ prop.name.name for prop in struct ], ["b", "c", "a"])
+    self.assertEqual(layout.sizes, { "thing": (24, 16) })
+
+if __name__ == '__main__':
+  suite = unittest.TestLoader().loadTestsFromTestCase(TestPlatform)
+  unittest.TextTestRunner(verbosity=2).run(suite)
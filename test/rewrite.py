@@ -0,0 +1,101 @@
+# rewrite.py
+# tests rewrite rules functionality
+# author: Christophe VG
+
+import unittest
+
+from codecanvas.structure import Unit, Module
+
+import codecanvas.instructions as code
+import codecanvas.rewrite      as rewrite
+import codecanvas.passes       as passes
+import codecanvas.languages.C  as C
+
+class TestRewrite(unittest.TestCase):
+
+  def setUp(self):
+    self.rules = rewrite.Rules()
+
+    @self.rules.rule(code.Not, operand=code.Not)
+    def double_negation(node):
+      return node.operand.operand
+
+    @self.rules.rule(code.Plus, left=rewrite.Pattern(code.IntegerLiteral,
+                                                     value=0),
+                                right=rewrite.Pattern().bind("right"))
+    def zero_plus(node, right):
+      return right
+
+    @self.rules.rule(code.BinOp, left=code.IntegerLiteral,
+                                 right=code.IntegerLiteral)
+    def integers(node):
+      return "integers"
+
+    @self.rules.rule(code.BinOp)
+    def binop(node):
+      return "binop"
+
+  def test_nested_class_patterns(self):
+    var = code.SimpleVariable("a")
+    self.assertIs(self.rules.apply(code.Not(code.Not(var))), var)
+    self.assertIsNone(self.rules.apply(code.Not(var)))
+
+  def test_values_and_captures(self):
+    var = code.SimpleVariable("a")
+    self.assertIs(self.rules.apply(code.Plus(code.IntegerLiteral(0), var)), var)
+    self.assertEqual(
+      self.rules.apply(code.Plus(code.IntegerLiteral(1), var)), "binop"
+    )
+
+  def test_first_matching_rule_wins(self):
+    zero  = code.IntegerLiteral(0)
+    three = code.IntegerLiteral(3)
+    self.assertIs(self.rules.apply(code.Plus(zero, three)), three)
+    self.assertEqual(self.rules.apply(code.Minus(zero, three)), "integers")
+    self.assertEqual(self.rules.apply(code.Minus(three, zero)), "integers")
+
+  def test_unmatched_classes(self):
+    self.assertIsNone(self.rules.apply(code.IntegerLiteral(1)))
+    self.assertIsNone(self.rules.apply(code.Print("hello")))
+
+  def test_decision_tree_only_retains_relevant_rules(self):
+    self.rules.match(code.Minus(code.IntegerLiteral(1), code.IntegerLiteral(2)))
+    branch = self.rules.tree.branches[code.Minus]
+    self.assertEqual([rule.replacement.__name__ for rule, pending in branch.entries],
+                     ["integers", "binop"])
+
+  def test_context_is_passed(self):
+    rules = rewrite.Rules()
+    rules.add(rewrite.Pattern(code.BooleanLiteral),
+              lambda context, literal: context)
+    self.assertEqual(rules.apply(code.BooleanLiteral(True), "context"),
+                     "context")
+
+  def test_rewriter_pass(self):
+    var  = code.SimpleVariable("a")
+    unit = Unit()
+    unit.append(Module("test"))
+    unit.select("test", "dec").append(code.Function("main")).contains(
+      code.Assign("b", code.Not(code.Not(code.Not(code.Not(var)))))
+    )
+    rules = rewrite.Rules()
+    rules.add(rewrite.Pattern(code.Not, operand=code.Not),
+              lambda context, node: node.operand.operand)
+    passes.Manager(rewrite.Rewriter(rules)).run(unit)
+    self.assertIs(unit.select("test", "dec")[0][0].expression, var)
+
+  def test_transformer_lowers_atoms(self):
+    unit = Unit()
+    unit.append(Module("test"))
+    unit.select("test", "dec").append(code.Function("main")).contains(
+      code.FunctionCall("send", [code.ListLiteral().contains(
+        code.AtomLiteral("hello"), code.IntegerLiteral(1)
+      )])
+    )
+    result = C.Emitter().emit(unit)
+    self.assertIn('#include "atoms.h"', result)
+    self.assertIn("send(2, atom_hello, 1);", result)
+
+if __name__ == '__main__':
+  suite = unittest.TestLoader().loadTestsFromTestCase(TestRewrite)
+  unittest.TextTestRunner(verbosity=2).run(suite)
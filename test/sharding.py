@@ -0,0 +1,124 @@
+# sharding.py
+# tests splitting generated modules into multiple translation units
+# author: Christophe VG
+
+import os
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+from distutils.spawn import find_executable
+
+from codecanvas.structure import Unit, Module
+
+import codecanvas.instructions as code
+import codecanvas.languages.C  as C
+
+class TestSharding(unittest.TestCase):
+
+  def setUp(self):
+    self.output = tempfile.mkdtemp(prefix="codecanvas-test-")
+
+  def tearDown(self):
+    shutil.rmtree(self.output)
+
+  def unit(self, functions):
+    """
+    A module with a counter, functions f_0, f_1, ... that increment it and a
+    function returning it, and a main module calling all of them.
+    """
+    unit = Unit()
+    lib  = unit.append(Module("lib"))
+    lib.select("dec").append(code.Import("lib"))
+    lib.select("dec").append(code.VariableDecl("counter", code.IntegerType()))
+    lib.select("dec").append(
+      code.Function("total", type=code.IntegerType())
+    ).contains(code.Return(code.SimpleVariable("counter")))
+    for index in functions:
+      lib.select("dec").append(code.Function("f_" + str(index))).contains(
+        code.Inc(code.SimpleVariable("counter"))
+      )
+    lib.select("def").append(code.Constant("STEP", code.IntegerLiteral(1)))
+    app = unit.append(Module("app"))
+    app.select("dec").append(code.Import("lib"))
+    app.select("dec").append(
+      code.Function("main", type=code.IntegerType())
+    ).contains(*[ code.FunctionCall("f_" + str(index)) for index in functions ] +
+                [ code.Return(code.FunctionCall("total",
+                                                type=code.IntegerType())) ])
+    return unit
+
+  def emit(self, unit, budget=4, by="functions"):
+    C.Emitter().output_to(self.output).shard(budget, by).emit(unit)
+    return self.contents()
+
+  def contents(self):
+    contents = {}
+    for name in os.listdir(self.output):
+      file = open(os.path.join(self.output, name))
+      contents[name] = file.read()
+      file.close()
+    return contents
+
+  def shards(self, contents, module="lib"):
+    return dict([ (name, content) for name, content in contents.items()
+                  if name.startswith(module) and name.endswith(".c") ])
+
+  def functions(self, sections):
+    return [ [ function.name for function, content in section ]
+             for section in sections ]
+
+  def test_split(self):
+    functions = [ (code.Function("f_" + str(index)), "x;") for index in range(40) ]
+    shards    = C.Sharding(4).split(functions)
+    self.assertEqual(sum(self.functions(shards), []),
+                     [ "f_" + str(index) for index in range(40) ])
+    self.assertTrue(len(shards) > 1)
+    self.assertTrue(all([ len(shard) <= 8 for shard in shards ]))
+    self.assertEqual(self.functions(C.Sharding(40).split(functions)),
+                     [ [ "f_" + str(index) for index in range(40) ] ])
+
+  def test_split_by_lines(self):
+    functions = [ (code.Function("f_" + str(index)), "x;\ny;\nz;")
+                  for index in range(40) ]
+    shards    = C.Sharding(12, "lines").split(functions)
+    self.assertTrue(len(shards) > 1)
+    self.assertTrue(all([ len(shard) * 3 <= 24 for shard in shards ]))
+
+  def test_shards_share_the_header(self):
+    contents = self.emit(self.unit(range(20)))
+    shards   = self.shards(contents)
+    self.assertIn("lib.c", shards)
+    self.assertTrue(len(shards) > 1)
+    self.assertIn("lib.h", contents)
+    for name, content in shards.items():
+      self.assertTrue(content.startswith('#include "lib.h"\n'))
+      if name == "lib.c": self.assertIn("\nint counter;\n", content)
+      else:               self.assertIn("\nextern int counter;\n", content)
+
+  def test_small_modules_are_not_split(self):
+    self.assertEqual(self.shards(self.emit(self.unit(range(3)))).keys(),
+                     ["lib.c"])
+    self.assertEqual(self.shards(self.emit(self.unit(range(20))), "app").keys(),
+                     ["app.c"])
+
+  def test_unchanged_shards_are_kept(self):
+    before = self.shards(self.emit(self.unit(range(20))))
+    after  = self.shards(self.emit(self.unit(range(10) + [ 99 ] + range(10, 20))))
+    changed = [ name for name in after if before.get(name, None) != after[name] ]
+    self.assertTrue(0 < len(changed) <= 2)
+    self.assertTrue(len(set(before) & set(after)) >= len(before) - 2)
+    self.assertEqual(sorted(self.shards(self.contents())), sorted(after))
+
+  @unittest.skipUnless(find_executable("gcc"), "requires gcc")
+  def test_compiles(self):
+    contents = self.emit(self.unit(range(20)))
+    sources  = sorted([ name for name in contents if name.endswith(".c") ])
+    subprocess.check_output(["gcc", "-std=gnu99", "-o", "app"] + sources,
+                            cwd=self.output, stderr=subprocess.STDOUT)
+    self.assertEqual(subprocess.call([os.path.join(self.output, "app")]), 20)
+
+if __name__ == '__main__':
+  suite = unittest.TestLoader().loadTestsFromTestCase(TestSharding)
+  unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,123 @@
+# sorting.py
+# tests lowering of lists that are queried with ranges to sorted arrays
+# author: Christophe VG
+
+import unittest
+
+from codecanvas.structure import Unit, Module
+
+import codecanvas.instructions as code
+import codecanvas.languages.C  as C
+
+class SortedPlatform(C.Generic):
+  sorting = True
+
+class TestSortedLists(unittest.TestCase):
+
+  def setUp(self):
+    self.unit = Unit()
+    self.unit.append(Module("includes"))
+    self.unit.append(Module("test"))
+    self.unit.select("test", "dec").append(code.Import("includes")) \
+                                   .tag("requires-tuples")
+    self.function = self.unit.select("test", "dec").append(
+      code.Function("main")
+    )
+    self.type = code.ManyType(code.TupleType([
+      code.IntegerType(), code.ObjectType("payload")
+    ]))
+    self.list = code.Object("queue", self.type)
+
+  def call(self, method, *arguments):
+    self.function.append(
+      code.MethodCall(self.list, method,
+                      [code.ListLiteral().contains(*arguments)],
+                      type=code.BooleanType())
+    )
+
+  def now(self, operator):
+    return code.Match(operator, code.FunctionCall("now", type=code.IntegerType()))
+
+  def functions(self):
+    return [ child.name for child in self.unit.select("lists", "dec")
+                        if isinstance(child, code.Function) ]
+
+  def usage(self):
+    return C.Usage(self.unit, C.Transformer().matchers_of)
+
+  def test_usage(self):
+    self.call("contains", self.now(">"), code.Match("*"))
+    self.call("remove", self.now("<="), code.Match("*"))
+    self.call("contains", code.Match("*"), code.Match("*"))
+    self.assertEqual(self.usage().ranges("queue"), [0])
+
+  def test_usage_of_other_queries(self):
+    self.call("contains", self.now(">"), code.Match("*"))
+    self.call("contains", self.now("=="), code.Match("*"))
+    self.assertIsNone(self.usage().ranges("queue"))
+    self.setUp()
+    self.call("contains", self.now(">"), self.now("<"))
+    self.assertIsNone(self.usage().ranges("queue"))
+    self.setUp()
+    self.call("contains", code.Match("*"), code.Match("*"))
+    self.assertIsNone(self.usage().ranges("queue"))
+
+  def test_objects_are_not_sorted(self):
+    self.call("contains", code.Match("*"), self.now("<"))
+    C.Emitter(platform=SortedPlatform()).passes.run(self.unit)
+    self.assertNotIn("sorted", self.type.tags)
+
+  def test_sorted_lists(self):
+    self.call("contains", self.now(">"), code.Match("*"))
+    self.call("push", code.SimpleVariable("t"),
+                      code.SimpleVariable("p", info=code.ObjectType("payload")))
+    self.call("remove", self.now("<="), code.Match("*"))
+    self.call("clear")
+    result = C.Emitter(platform=SortedPlatform()).emit(self.unit)
+    self.assertIn("sorted", self.type.tags)
+    self.assertEqual(self.functions(), [
+      "sorted_tuple_0_ts_on_0_bound",
+      "sorted_tuple_0_ts_on_0_contains_match_gt_now",
+      "sorted_tuple_0_ts_on_0_push",
+      "sorted_tuple_0_ts_on_0_remove_match_lteq_now",
+      "array_of_tuple_0_ts_clear"
+    ])
+    self.assertIn("sorted_tuple_0_ts_on_0_push(&queue, t, p);", result)
+    self.assertIn("#include <string.h>", result)
+    self.assertIn("while((low < high)) {\n" +
+                  "int middle = ((low + high) / 2);\n" +
+                  "tuple_0_t* item = &list->data[middle];\n" +
+                  "if(((item->elem_0 < value) || " +
+                  "(inclusive && (item->elem_0 == value)))){" +
+                  "low = (middle + 1);}else {high = middle;}\n}", result)
+    self.assertIn("int value = now();\n" +
+                  "int start = sorted_tuple_0_ts_on_0_bound(list, value, TRUE);\n" +
+                  "int end = list->size;\nreturn (start < end);", result)
+    self.assertIn("int index = sorted_tuple_0_ts_on_0_bound(list, elem_0, TRUE);\n" +
+                  "memmove(&list->data[(index + 1)], &list->data[index], " +
+                  "((list->size - index) * sizeof(tuple_0_t)));\n" +
+                  "tuple_0_t* item = &list->data[index];", result)
+    self.assertIn("int start = 0;\n" +
+                  "int end = sorted_tuple_0_ts_on_0_bound(list, value, TRUE);\n" +
+                  "for(int index = start; (index < end); index++) {\n" +
+                  "tuple_0_t* iter = &list->data[index];\n" +
+                  "free_payload(iter->elem_1);\n}\n" +
+                  "memmove(&list->data[start], &list->data[end], " +
+                  "((list->size - end) * sizeof(tuple_0_t)));\n" +
+                  "list->size = (list->size - (end - start));\n" +
+                  "return (end - start);", result)
+
+  def test_ranges(self):
+    for operator in [ "<", "<=", ">", ">=" ]:
+      self.call("contains", self.now(operator), code.Match("*"))
+    result = C.Emitter(platform=SortedPlatform()).emit(self.unit)
+    bound = "sorted_tuple_0_ts_on_0_bound(list, value, "
+    self.assertIn("int start = 0;\nint end = " + bound + "FALSE);", result)
+    self.assertIn("int start = 0;\nint end = " + bound + "TRUE);", result)
+    self.assertIn("int start = " + bound + "TRUE);\nint end = list->size;", result)
+    self.assertIn("int start = " + bound + "FALSE);\nint end = list->size;",
+                  result)
+
+if __name__ == '__main__':
+  suite = unittest.TestLoader().loadTestsFromTestCase(TestSortedLists)
+  unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,91 @@
+# strength.py
+# tests strength reduction functionality
+# author: Christophe VG
+
+import unittest
+
+from codecanvas.structure import Unit, Module
+
+import codecanvas.instructions as code
+import codecanvas.passes       as passes
+import codecanvas.languages.C  as C
+
+from codecanvas.optimizations.strength import StrengthReduction
+
+class TestStrengthReduction(unittest.TestCase):
+
+  def setUp(self):
+    self.unit = Unit()
+    self.unit.append(Module("test"))
+    self.function = self.unit.select("test", "dec").append(
+      code.Function("main", type=code.IntegerType(), params=[
+        code.Parameter("s", code.IntegerType()),
+        code.Parameter("u", code.UnsignedIntegerType())
+      ])
+    )
+
+  def reduced(self, expression):
+    self.function.append(code.Return(expression))
+    reducer = StrengthReduction()
+    passes.Manager(reducer).run(self.unit)
+    return self.function[-1].accept(C.Dumper())[len("return "):-1]
+
+  def var(self, name):
+    return code.SimpleVariable(name)
+
+  def literal(self, value):
+    return code.IntegerLiteral(value)
+
+  def test_multiplications(self):
+    self.assertEqual(self.reduced(code.Mult(self.var("s"), self.literal(8))),
+                     "(s << 3)")
+    self.assertEqual(self.reduced(code.Mult(self.literal(2), self.var("u"))),
+                     "(u << 1)")
+    self.assertEqual(self.reduced(code.Mult(self.var("s"), self.literal(6))),
+                     "(s * 6)")
+
+  def test_unsigned_division_and_modulo(self):
+    self.assertEqual(self.reduced(code.Div(self.var("u"), self.literal(16))),
+                     "(u >> 4)")
+    self.assertEqual(self.reduced(code.Modulo(self.var("u"), self.literal(16))),
+                     "(u & 15)")
+    self.assertEqual(
+      self.reduced(code.Div(code.Plus(self.var("u"), self.var("s")),
+                            self.literal(4))),
+      "((u + s) >> 2)"
+    )
+
+  def test_signed_division_and_modulo_are_kept(self):
+    self.assertEqual(self.reduced(code.Div(self.var("s"), self.literal(16))),
+                     "(s / 16)")
+    self.assertEqual(self.reduced(code.Modulo(self.var("s"), self.literal(16))),
+                     "(s % 16)")
+
+  def test_unknown_and_float_operands_are_kept(self):
+    self.assertEqual(self.reduced(code.Mult(self.var("x"), self.literal(4))),
+                     "(x * 4)")
+    self.function.append(
+      code.Assign(code.VariableDecl("f", code.FloatType()), code.FloatLiteral(1.0))
+    )
+    self.assertEqual(self.reduced(code.Mult(self.var("f"), self.literal(4))),
+                     "(f * 4)")
+
+  def test_local_declarations_and_typed_expressions(self):
+    self.function.append(
+      code.Assign(code.VariableDecl("l", code.UnsignedLongType()),
+                  self.literal(0))
+    )
+    self.assertEqual(self.reduced(code.Modulo(self.var("l"), self.literal(2))),
+                     "(l & 1)")
+    call = code.FunctionCall("size", type=code.UnsignedIntegerType())
+    self.assertEqual(self.reduced(code.Div(call, self.literal(2))),
+                     "(size() >> 1)")
+
+  def test_unsigned_types(self):
+    self.assertEqual(code.UnsignedIntegerType().accept(C.Dumper()), "unsigned int")
+    self.assertEqual(code.UnsignedLongType().accept(C.Dumper()), "unsigned long")
+    self.assertIsInstance(code.UnsignedIntegerType(), code.IntegerType)
+
+if __name__ == '__main__':
+  suite = unittest.TestLoader().loadTestsFromTestCase(TestStrengthReduction)
+  unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,104 @@
+# symbols.py
+# tests symbol table functionality
+# author: Christophe VG
+
+import unittest
+
+from codecanvas.structure import Unit, Module
+
+import codecanvas.instructions as code
+import codecanvas.languages.C  as C
+
+class TestSymbols(unittest.TestCase):
+
+  def setUp(self):
+    self.unit = Unit()
+    self.unit.append(Module("includes"))
+    self.unit.append(Module("test"))
+    self.anchor = self.unit.select("test", "dec").append(
+      code.Import("includes")
+    ).tag("requires-tuples")
+    self.function = self.unit.select("test", "dec").append(
+      code.Function("main")
+    )
+    self.list = code.Object("queue", code.ManyType(
+      code.TupleType([code.IntegerType(), code.ByteType()])
+    ))
+
+  def call(self, method, *arguments):
+    self.function.append(
+      code.MethodCall(self.list, method,
+                      [code.ListLiteral().contains(*arguments)],
+                      type=code.BooleanType())
+    )
+
+  def functions(self, module):
+    return [ child.name for child in self.unit.select(module, "dec")
+                        if isinstance(child, code.Function) ]
+
+  def test_table(self):
+    symbols = C.Symbols(self.unit)
+    self.assertIs(symbols.module("test"), self.unit.find("test"))
+    self.assertIsNone(symbols.module("lists"))
+    self.assertIs(symbols.declared("main"), self.function)
+    self.assertIs(symbols.tagged("requires-tuples"), self.anchor)
+
+  def test_generated_functions_are_reused(self):
+    a = code.SimpleVariable("a")
+    self.call("push", a, code.SimpleVariable("b"))
+    self.call("push", a, code.SimpleVariable("c"))
+    self.call("contains", code.Match("*"), code.Match("*"))
+    self.call("contains", code.Match("*"), code.Match("*"))
+    C.Emitter().passes.run(self.unit)
+    self.assertEqual(self.functions("lists"), [
+      "list_of_tuple_0_ts_push", "list_of_tuple_0_ts_contains"
+    ])
+    self.assertEqual(self.functions("tuples"), [
+      "make_tuple_0_t", "free_tuple_0_t", "copy_tuple_0_t"
+    ])
+
+  def test_lowering_does_not_search_the_unit(self):
+    def find(*tags): self.fail("unit searched for " + ", ".join(tags))
+    self.unit.find = find
+    self.call("push", code.SimpleVariable("a"), code.SimpleVariable("b"))
+    self.call("contains", code.Match("*"), code.Match("*"))
+    C.Emitter().passes.run(self.unit)
+    self.assertEqual(len(self.functions("lists")), 2)
+
+  def test_specializations_are_counted(self):
+    later = code.Match(">", code.FunctionCall("now", type=code.IntegerType()))
+    self.call("contains", later, code.Match("*"))
+    self.call("contains", code.Match("*"), code.Match("*"))
+    other = self.unit.append(Module("other"))
+    other.select("dec").append(code.Function("check")).contains(
+      code.MethodCall(self.list, "contains", [code.ListLiteral().contains(
+        code.Match(">", code.FunctionCall("now", type=code.IntegerType())),
+        code.Match("*")
+      )], type=code.BooleanType())
+    )
+    emitter = C.Emitter()
+    emitter.passes.run(self.unit)
+    self.assertEqual(self.functions("lists"), [
+      "list_of_tuple_0_ts_contains_match_gt_now", "list_of_tuple_0_ts_contains"
+    ])
+    self.assertEqual((emitter.context.misses, emitter.context.hits), (2, 1))
+    self.assertEqual(emitter.context.report(),
+                     "2 specialization(s) generated, 1 reused")
+
+  def test_matchers_with_equal_labels_are_specialized_separately(self):
+    def match(name):
+      return code.Match("<", code.FunctionCall("f", [code.SimpleVariable(name)],
+                                               type=code.IntegerType()))
+    self.call("contains", match("a"), code.Match("*"))
+    self.call("contains", match("b"), code.Match("*"))
+    self.call("contains", match("a"), code.Match("*"))
+    C.Emitter().passes.run(self.unit)
+    names = self.functions("lists")
+    self.assertEqual(len(names), 2)
+    self.assertEqual(names[0], "list_of_tuple_0_ts_contains_match_lt_f")
+    self.assertEqual([call.function.name for call in self.function],
+                     [names[0], names[1], names[0]])
+
+if __name__ == '__main__':
+  suite = unittest.TestLoader().loadTestsFromTestCase(TestSymbols)
+  unittest.TextTestRunner(verbosity=2).run(suite)